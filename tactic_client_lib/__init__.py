@@ -11,18 +11,74 @@
 #
 
 
-# Python3 - This is not support ... not even sure if we need this anymore
-
-import os, sys
+import sys
 if sys.version_info[0] < 3:
+    import os
     path = __file__
     path, file = os.path.split(path)
     path = '%s/tactic.zip' % path
     if path not in sys.path:
         sys.path.insert(0, path)
 
-from .tactic_server_stub import *
-from .cgapp import *
+    from .tactic_server_stub import *
+    from .snapshot_resolver import *
+    from .resource_config import *
+    from .connection_manager import *
+    from .download_cache import *
+    from .transfer_agent import *
+    from .query_mirror import *
+    from .result_set import *
+    from .search_key import *
+    from .chunked_writer import *
+    from .transaction_builder import *
+    from .expression_cache import *
+    from .cgapp import *
+
+else:
+    # Python3: nothing is imported until it is first used, so scripts which
+    # only need a few functions do not pay for the whole library (and
+    # xmlrpc, http, ...) on startup.  tactic.zip is not used.
+    from .common.lazy_module import lazy_getattr
+
+    _ATTRS = {
+        'TacticServerStub': '.tactic_server_stub',
+        'TacticApiException': '.tactic_server_stub',
+        'TACTIC': '.tactic_server_stub',
+        'Command': '.tactic_server_stub',
+        'Search': '.tactic_server_stub',
+        'SObject': '.tactic_server_stub',
+        'SnapshotResolver': '.snapshot_resolver',
+        'ResourceConfig': '.resource_config',
+        'ConnectionManager': '.connection_manager',
+        'DownloadCache': '.download_cache',
+        'TransferAgent': '.transfer_agent',
+        'TransferHandle': '.transfer_agent',
+        'QueryMirror': '.query_mirror',
+        'QueryMirrorException': '.query_mirror',
+        'ResultSet': '.result_set',
+        'RowView': '.result_set',
+        'SearchKey': '.search_key',
+        'ChunkedWriter': '.chunked_writer',
+        'ChunkedWriteException': '.chunked_writer',
+        'TransactionBuilder': '.transaction_builder',
+        'ExpressionCache': '.expression_cache',
+        'CGApp': '.cgapp',
+    }
+
+    _MODULES = ['application', 'common', 'interpreter', 'maya', 'scm',
+        'tactic_server_stub', 'snapshot_resolver', 'resource_config',
+        'connection_manager', 'download_cache', 'transfer_agent', 'query_mirror',
+        'result_set', 'search_key', 'chunked_writer', 'transaction_builder',
+        'expression_cache', 'cgapp']
+
+    __all__ = list(_ATTRS.keys())
+
+    def __getattr__(name):
+        # any other name of the stub module is available as before
+        return lazy_getattr(__name__, name, _ATTRS, _MODULES, fallback='.tactic_server_stub')
+
+    def __dir__():
+        return sorted( set(globals().keys()) | set(_ATTRS.keys()) | set(_MODULES) )
 
 
 
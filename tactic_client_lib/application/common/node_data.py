@@ -13,16 +13,50 @@
 _all__ = ["NodeData"]
 
 from xml.dom.minidom import parseString
-from xml.dom.minidom import getDOMImplementation
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+try:
+    basestring
+except NameError:
+    # Python3
+    basestring = str
 
 
 
 class NodeData(object):
-    '''class which stores tactic specific data on the node'''
+    '''class which stores tactic specific data on the node
+
+    The data is stored as compact xml:
+
+        <node><ref context='model' snapshot_code='SNAPSHOT00001'/></node>
+
+    Values are escaped so that the xml never contains newlines, double
+    quotes or backslashes, which would otherwise have to be escaped for
+    the application.  The xml is only parsed when the data is first
+    accessed and is only written back on commit() if it has changed.
+    '''
     ATTR_NAME = "tacticNodeData"
     ATTR_NAME2 = "notes"
 
-    def __init__(self, app_node_name):
+    ESCAPES = [
+        ("&", "&amp;"),
+        ("<", "&lt;"),
+        (">", "&gt;"),
+        ("'", "&apos;"),
+        ('"', "&quot;"),
+        ("\\", "&#92;"),
+        ("\n", "&#10;"),
+        ("\r", "&#13;"),
+        ("\t", "&#9;"),
+    ]
+
+    def __init__(self, app_node_name, xml=None):
+        '''xml is the value of the tacticNodeData attribute, if it has
+        already been retrieved from the application'''
         self.app_node_name = app_node_name
 
         self.data = {}
@@ -30,54 +64,119 @@ class NodeData(object):
         from application import Application
         self.app = Application.get()
 
-        self.init()
+        # set when the attributes are known to exist on the node
+        self.has_attrs = False
+
+        self.init(xml)
+
+
+    def init(self, xml=None):
+        if xml == None:
+            xml = self.app.get_attr(self.app_node_name, self.ATTR_NAME)
+
+        self.xml = xml
+        # list of (node_name, attrs) parsed on demand
+        self.nodes = None
+        self.dirty = False
 
 
-    def init(self):
-        xml = self.app.get_attr(self.app_node_name, self.ATTR_NAME)
-        if xml == "":
-            xml = "<node/>"
+    def _parse(self):
+        if self.nodes != None:
+            return
+
+        self.nodes = []
+        xml = self.xml
+        if not xml:
+            return
 
         # FIXME: this is for XSI
         xml = xml.replace("\\n", "\n")
+        if not isinstance(xml, bytes):
+            xml = xml.encode("utf-8")
 
-        self.dom = None
         try:
-            self.dom = parseString(xml)
+            root = ElementTree.fromstring(xml)
+        except Exception as e:
+            print("Warning: node '%s' has invalid tacticNodeData" % self.app_node_name)
+            return
+
+        for child in root:
+            self.nodes.append( (child.tag, dict(child.attrib)) )
+
+
+    def _quote(self, value):
+        if value == None:
+            value = ""
+        elif not isinstance(value, basestring):
+            value = str(value)
+        for char, escape in self.ESCAPES:
+            value = value.replace(char, escape)
+        return "'%s'" % value
+
+
+    def _get_element_xml(self, node_name, attrs):
+        keys = sorted(attrs.keys())
+        attr_xml = "".join( [" %s=%s" % (x, self._quote(attrs[x])) for x in keys] )
+        return "<%s%s/>" % (node_name, attr_xml)
+
+
+    def get_xml(self):
+        '''get the compact xml representing the data of this node'''
+        self._parse()
+        if not self.nodes:
+            return "<node/>"
+        xml = [ self._get_element_xml(x, y) for x, y in self.nodes ]
+        return "<node>%s</node>" % "".join(xml)
+
+
+    def get_node_xml(self, node_name, extra_attrs={}):
+        '''get the compact xml of a single node of the data
+
+        @params
+        node_name: name of the node
+        extra_attrs: attributes to add to the returned xml
+
+        @return
+        string: the xml of the node or "" if it does not exist
+        '''
+        attrs = self._get_node(node_name)
+        if attrs == None:
+            return ""
+        if extra_attrs:
+            attrs = attrs.copy()
+            attrs.update(extra_attrs)
+        return self._get_element_xml(node_name, attrs)
+
+
+    def is_dirty(self):
+        return self.dirty
 
-        except Exception, e:
-            print "Warning: node '%s' has invalid tacticNodeData" % self.app_node_name
-            self.clear()
-            
 
-    
     def clear(self):
-        '''clears the dom by creating an empty one'''
-        xml = "<node/>"
-        self.dom = parseString(xml)
+        '''clears the data'''
+        self.nodes = []
+        self.dirty = True
 
     def add_node(self, node_name):
-        root = self.dom.documentElement
-        node = self.dom.createElement(node_name)
-        root.appendChild(node)
-        return node
-        
+        self._parse()
+        attrs = {}
+        self.nodes.append( (node_name, attrs) )
+        self.dirty = True
+        return attrs
+
 
     def _get_node(self, node_name):
-        root = self.dom.documentElement
-        nodes = root.childNodes
-        for node in nodes:
-            if node.__class__.__name__ == "Text":
-                continue
-            if node.nodeName == node_name:
-                return node
+        self._parse()
+        for name, attrs in self.nodes:
+            if name == node_name:
+                return attrs
 
 
     def get_attr(self, node_name, attr):
         node = self._get_node(node_name)
-        if not node:
+        if node == None:
             return ""
-        value = node.getAttribute(attr)
+        value = node.get(attr)
         if not value:
             return ""
         else:
@@ -86,47 +185,73 @@ class NodeData(object):
 
     def set_attr(self, node_name, attr, value):
         node = self._get_node(node_name)
-        if not node:
+        if node == None:
             node = self.add_node(node_name)
-        node.setAttribute(attr,value)
+
+        if value == None:
+            value = ""
+        elif not isinstance(value, basestring):
+            value = str(value)
+
+        if node.get(attr) == value:
+            return
+        node[attr] = value
+        self.dirty = True
 
 
     def commit(self):
-        xml = self.dom.toxml()
-        xml = xml.replace("\n", "\\n")
-        xml = xml.replace('"', "'")
+        '''write the data to the node if it has changed'''
+        if not self.dirty:
+            return
+
+        xml = self.get_xml()
 
-        self.app.add_attr(self.app_node_name, self.ATTR_NAME, "string")
-        self.app.add_attr(self.app_node_name, self.ATTR_NAME2, "string")
+        if not self.has_attrs:
+            self.create_attrs()
         self.app.set_attr(self.app_node_name, self.ATTR_NAME, xml, "string" )
         self.app.set_attr(self.app_node_name, self.ATTR_NAME2, xml , "string")
 
+        self.xml = xml
+        self.dirty = False
+
 
 
     def dump(self):
-        print self.dom.toxml()
+        print(self.get_xml())
 
-   
-    def create(self):
-        '''create the necessary attributes if they do not exists'''
-        if not self.app.attr_exists(self.app_node_name, self.ATTR_NAME):
+
+    def create_attrs(self):
+        '''create the attributes if they do not exist'''
+        batch = self.app.batch()
+        batch.attr_exists(self.app_node_name, self.ATTR_NAME)
+        batch.attr_exists(self.app_node_name, self.ATTR_NAME2)
+        exists, exists2 = batch.execute()
+
+        if not exists:
             self.app.add_attr(self.app_node_name, self.ATTR_NAME, type="string")
-            
-        if not self.app.attr_exists(self.app_node_name, self.ATTR_NAME2):
+        if not exists2:
             self.app.add_attr(self.app_node_name, self.ATTR_NAME2, type="string")
+        self.has_attrs = True
 
 
+    def create(self):
+        '''create the necessary attributes if they do not exists'''
+        self.create_attrs()
+
         # initialize the data
         self.init()
 
 
 
     def get_ref_node(self):
-        node = self._get_node("ref")
-        return node
+        '''get the ref node as an xml element'''
+        xml = self.get_node_xml("ref")
+        if not xml:
+            return None
+        return parseString(xml).documentElement
+
 
 
-        
 
 
 
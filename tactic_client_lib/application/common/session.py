@@ -12,9 +12,10 @@
 
 __all__ = ['Session']
 
-import os, sys, urllib, xmlrpclib
+import os, sys, urllib, xmlrpclib, hashlib
 from xml.dom.minidom import parseString
 from xml.dom.minidom import getDOMImplementation
+from xml.sax.saxutils import quoteattr
 
 from tactic_node_util import TacticNodeUtil
 from node_data import NodeData
@@ -29,6 +30,12 @@ class Session(object):
         self.doc = None
         self.root = None
 
+        # cache of tactic node to (hash of tacticNodeData, ref xml)
+        self.ref_cache = {}
+        self.changed_nodes = []
+        self.removed_nodes = []
+        self.committed_xml = None
+
         from tactic_client_lib import TacticServerStub
         self.server = TacticServerStub.get()
 
@@ -37,28 +44,87 @@ class Session(object):
         self.app = Application.get()
 
     def introspect(self):
-        '''introspect the session and create a session xml from it'''
-        # create an xml document
-        xml_impl = getDOMImplementation()
-        self.doc = xml_impl.createDocument(None, "session", None)
-        self.root = self.doc.documentElement
-
+        '''introspect the session and create a session xml from it.  Only
+        the tactic nodes whose data has changed since the last introspect
+        are parsed again.  The nodes that have changed are available from
+        get_changes()'''
         # go through the tactic
         tactic_nodes = self.util.get_all_tactic_nodes() 
         tactic_nodes.sort()
-        for tactic_node in tactic_nodes:
 
-            node_data = NodeData(tactic_node)
-            ref_node = node_data.get_ref_node()
+        # get the data of all of the tactic nodes at once
+        batch = self.app.batch()
+        for tactic_node in tactic_nodes:
+            batch.get_attr(tactic_node, NodeData.ATTR_NAME)
+        values = batch.execute()
+
+        ref_cache = {}
+        self.changed_nodes = []
+        for tactic_node, value in zip(tactic_nodes, values):
+            if value == None:
+                value = ""
+            key = hashlib.md5(value.encode('utf-8')).hexdigest()
+
+            cached = self.ref_cache.get(tactic_node)
+            if cached and cached[0] == key:
+                ref_cache[tactic_node] = cached
+                continue
 
             # set some more info on the ref node
-            ref_node.setAttribute("tactic_node", tactic_node)
-            self.root.appendChild(ref_node)
+            node_data = NodeData(tactic_node, xml=value)
+            ref_xml = node_data.get_node_xml("ref", {"tactic_node": tactic_node})
 
-        self.xml = self.doc.toprettyxml()
+            ref_cache[tactic_node] = (key, ref_xml)
+            self.changed_nodes.append(tactic_node)
+
+        self.removed_nodes = [x for x in self.ref_cache.keys() if x not in ref_cache]
+        self.removed_nodes.sort()
+        self.ref_cache = ref_cache
+
+        refs = [ref_cache[x][1] for x in tactic_nodes]
+        self.xml = "<session>%s</session>" % "".join(refs)
+
+        # the document is only parsed when it is needed
+        self.doc = None
+        self.root = None
         return self.xml
 
 
+    def get_changes(self):
+        '''get the tactic nodes that have changed in the last introspect
+
+        @return
+        tuple: list of changed or new tactic nodes, list of removed tactic nodes
+        '''
+        return self.changed_nodes, self.removed_nodes
+
+
+    def get_diff_xml(self):
+        '''get an xml document containing only the ref entries that have
+        changed in the last introspect
+
+        <session_diff>
+          <ref tactic_node="tactic_joe" .../>
+          <remove tactic_node="tactic_bob"/>
+        </session_diff>
+        '''
+        xml = []
+        xml.append("<session_diff>")
+        for tactic_node in self.changed_nodes:
+            xml.append( self.ref_cache[tactic_node][1] )
+        for tactic_node in self.removed_nodes:
+            xml.append( '<remove tactic_node=%s/>' % quoteattr(tactic_node) )
+        xml.append("</session_diff>")
+        return "".join(xml)
+
+
+    def _get_root(self):
+        if not self.doc and self.xml:
+            self.doc = parseString(self.xml)
+            self.root = self.doc.documentElement
+        return self.root
+
+
     def get_last(self, pid=None):
         '''Get the last sesson recorded from the last session.  This is useful
         for applications that do not have direct access to the application and
@@ -98,7 +164,7 @@ class Session(object):
         '''gets the snapshots that are in the session'''
 
         # create an xml document
-        self.root = self.doc.documentElement
+        self.root = self._get_root()
 
         snapshot_codes = []
         for node in self.root.childNodes:
@@ -107,10 +173,12 @@ class Session(object):
             snapshot_code = node.getAttribute("snapshot_code")
             snapshot_codes.append(snapshot_code)
 
-        filters = []
-        filters.append( ['code', snapshot_codes] )
+        # snapshots already resolved in this session are not queried again
+        from tactic_client_lib.snapshot_resolver import SnapshotResolver
+        resolver = SnapshotResolver.get()
+        resolved = resolver.resolve_codes(snapshot_codes)
 
-        snapshots = self.server.query("sthpw/snapshot", filters )
+        snapshots = [resolved[x] for x in snapshot_codes if x in resolved]
         return snapshots
 
 
@@ -118,11 +186,17 @@ class Session(object):
 
 
     def commit(self, xml=None):
-        '''commit this to the database'''
+        '''commit this to the database.  The server replaces the
+        session contents as a whole, so the compact session xml is sent.
+        Nothing is sent if the session has not changed since the last
+        commit'''
 
         if not xml:
             xml = self.xml
 
+        if xml == self.committed_xml:
+            return
+
         # get more info
         pid = os.getpid()
         login = self.server.get_login()
@@ -131,6 +205,7 @@ class Session(object):
         #self.server.insert( search_type, data)
 
         self.server.commit_session(xml, pid)
+        self.committed_xml = xml
         
 
 
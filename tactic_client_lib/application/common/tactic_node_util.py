@@ -54,9 +54,14 @@ class TacticNodeUtil(object):
         nodes = self.app.get_nodes_by_name("tactic_*")
 
         # go through each node an make sure that the attribute
-        # exists
+        # exists.  Query all of the nodes in one go.
+        batch = self.app.batch()
         for node in nodes:
-            if self.is_tactic_node(node):
+            batch.attr_exists(node, "tacticNodeData")
+        results = batch.execute()
+
+        for node, exists in zip(nodes, results):
+            if exists:
                 tactic_nodes.append(node)
 
         return tactic_nodes
@@ -161,6 +166,54 @@ class TacticNodeUtil(object):
         return search_type
 
 
+    def get_snapshots(self, tactic_node_names):
+        '''gets the snapshots of many tactic nodes at once.  The node data
+        of all of the nodes is read in one batch and the snapshots, with
+        their paths and web paths, are resolved in as few calls as possible
+
+        @return
+        dictionary of tactic node name to snapshot (None if not found)
+        '''
+        batch = self.app.batch()
+        for tactic_node_name in tactic_node_names:
+            batch.get_attr(tactic_node_name, NodeData.ATTR_NAME)
+        values = batch.execute()
+
+        refs = {}
+        for tactic_node_name, value in zip(tactic_node_names, values):
+            node_data = NodeData(tactic_node_name, xml=value or "")
+            refs[tactic_node_name] = (
+                node_data.get_attr("ref", "snapshot_code"),
+                node_data.get_attr("ref", "search_key"),
+                node_data.get_attr("ref", "context"),
+            )
+
+        from tactic_client_lib.snapshot_resolver import SnapshotResolver
+        resolver = SnapshotResolver.get()
+
+        # nodes that know their snapshot are resolved by code
+        snapshot_codes = [x[0] for x in refs.values() if x[0]]
+        by_code = resolver.resolve_codes(snapshot_codes)
+
+        # the others get the latest snapshot of their sobject in the context
+        by_context = {}
+        for snapshot_code, search_key, context in refs.values():
+            if not snapshot_code and search_key:
+                by_context.setdefault(context or "publish", []).append(search_key)
+        by_key = {}
+        for context, search_keys in by_context.items():
+            for search_key, snapshot in resolver.resolve(search_keys, context).items():
+                by_key[(search_key, context)] = snapshot
+
+        snapshots = {}
+        for tactic_node_name, (snapshot_code, search_key, context) in refs.items():
+            if snapshot_code:
+                snapshots[tactic_node_name] = by_code.get(snapshot_code)
+            else:
+                snapshots[tactic_node_name] = by_key.get( (search_key, context or "publish") )
+        return snapshots
+
+
 
 
 
@@ -49,6 +49,16 @@ class Maya(Application):
         return maya.mel.eval(cmd)
 
 
+    def batch(self):
+        '''get a batch which executes many queries in a single round trip
+
+        @return
+        MayaBatch: an empty batch bound to this application
+        '''
+        from tactic_client_lib.common.maya_batch import MayaBatch
+        return MayaBatch(self)
+
+
     # Common maya operations
 
     #
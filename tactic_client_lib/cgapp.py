@@ -15,9 +15,11 @@
 
 __all__ = ['CGApp']
 
-import types
+import os, types
 
 from tactic_client_lib import TacticServerStub
+from tactic_client_lib.snapshot_resolver import SnapshotResolver
+from tactic_client_lib.download_cache import DownloadCache
 
 
 class CGAppException(Exception):
@@ -105,19 +107,19 @@ class CGApp(object):
         
         
         '''
-        server = TacticServerStub.get()
-
-        # FIXME: do we really need to make 2 calls?
-        snapshot = server.get_snapshot(search_key, context=context, version=version)
+        # the snapshot and its paths are resolved in a single call
+        resolver = SnapshotResolver.get()
+        snapshots = resolver.resolve([search_key], context=context, version=version)
+        snapshot = snapshots.get(search_key)
         if not snapshot:
             raise CGAppException("No snapshot found for [%s]" % search_key)
 
+        web_paths = resolver.get_web_paths(snapshot, file_type)
 
-        paths = server.get_paths(search_key, context, version, file_type)
-        web_paths = paths.get("web_paths")
-
+        # the snapshot code and version identify the contents of its files
+        version = "%s:%s" % (snapshot.get('code'), snapshot.get('version'))
         for path in web_paths:
-            to_path = self.download(path)
+            to_path = self.download(path, version=version)
             self.load_file(to_path, namespace=namespace, mode=mode)
 
 
@@ -277,8 +279,19 @@ class CGApp(object):
     #
     # Common methods
     #
-    def download(self, url, to_dir=''):
-        return self.env.download(url, to_dir)
+    def download(self, url, to_dir='', version=None):
+        cache = DownloadCache.get()
+        if not cache:
+            return self.env.download(url, to_dir)
+
+        if not to_dir:
+            to_dir = self.env.get_tmpdir()
+        if not os.path.exists(to_dir):
+            os.makedirs(to_dir)
+        to_path = "%s/%s" % (to_dir, os.path.basename(url))
+
+        server = TacticServerStub.get()
+        return cache.fetch(url, to_path, server._download_url, version=version)
 
 
 
@@ -0,0 +1,283 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ChunkedWriter', 'ChunkedWriteException']
+
+import os, time, threading
+
+import six
+
+
+class ChunkedWriteException(Exception):
+    '''raised when some of the chunks of a write failed.  The results of
+    the chunks which succeeded are in results and the failed chunks are in
+    failures as (start, end, error) ranges of the rows'''
+
+    def __init__(self, message, results=[], failures=[]):
+        super(ChunkedWriteException, self).__init__(message)
+        self.results = results
+        self.failures = failures
+
+
+
+def get_size(value):
+    '''estimate the size of a value in an xmlrpc request'''
+    if isinstance(value, dict):
+        size = 30
+        for key, item in value.items():
+            size += 30 + len(key) + get_size(item)
+        return size
+    elif isinstance(value, (list, tuple)):
+        size = 30
+        for item in value:
+            size += get_size(item)
+        return size
+    elif isinstance(value, six.string_types):
+        return 30 + len(value)
+    else:
+        return 40
+
+
+
+class ChunkedWriter(object):
+    '''Splits large insert_multiple and update_multiple calls into chunks.
+
+    A chunk has at most max_rows rows and max_bytes bytes of estimated
+    payload.  Once the throughput of the server is measured, chunks are
+    also made small enough to be sent in about target_time seconds, so
+    that slow writes do not time out.  Small writes are sent in a single
+    call as before.
+
+    The result is always a list, whatever the number of chunks: the list
+    results of the calls are joined, other results are appended and None
+    results are left out.
+
+    With parallel > 1, chunks are sent by several connections at the same
+    time.  If no transaction was started, one is started for the write,
+    which is aborted if any of the chunks fails, so that nothing is
+    written.  Sequential chunks then stop at the first failure.  In a
+    transaction of the caller, all of the chunks are sent and the caller
+    decides whether to abort.
+
+    The defaults can be set with TACTIC_WRITE_CHUNK_ROWS and
+    TACTIC_WRITE_CHUNK_BYTES.
+
+        server.set_chunked_writer( ChunkedWriter(max_rows=500, parallel=4) )
+        server.insert_multiple("prod/shot", shots)
+    '''
+
+    def __init__(self, max_rows=None, max_bytes=None, parallel=1,
+            target_time=10.0):
+        '''
+        @params
+        max_rows: the most rows in a chunk
+        max_bytes: the most estimated bytes in a chunk
+        parallel: the number of chunks sent at the same time
+        target_time: the number of seconds a chunk should take
+        '''
+        if max_rows == None:
+            max_rows = int(os.environ.get("TACTIC_WRITE_CHUNK_ROWS") or 1000)
+        if max_bytes == None:
+            max_bytes = int(os.environ.get("TACTIC_WRITE_CHUNK_BYTES") or 4*1024*1024)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.parallel = parallel
+        self.target_time = target_time
+
+        # measured bytes per second of the server
+        self.rate = None
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'chunks': 0, 'rows': 0, 'failures': 0}
+
+
+    def get_max_bytes(self):
+        max_bytes = self.max_bytes
+        if self.rate:
+            max_bytes = min(max_bytes, int(self.rate * self.target_time))
+        return max_bytes
+
+
+    def get_chunk(self, sizes, start):
+        '''get the end of the chunk beginning at a row'''
+        max_bytes = self.get_max_bytes()
+        end = start
+        total = 0
+        while end < len(sizes) and end - start < self.max_rows:
+            total += sizes[end]
+            # a chunk always has at least one row
+            if total > max_bytes and end > start:
+                break
+            end += 1
+        return end
+
+
+    def _measure(self, size, elapsed):
+        if elapsed <= 0:
+            return
+        rate = size / elapsed
+        with self.lock:
+            if self.rate:
+                self.rate = 0.7 * self.rate + 0.3 * rate
+            else:
+                self.rate = rate
+
+
+    def execute(self, stub, func, rows, parallel=None):
+        '''write rows in chunks
+
+        @params
+        stub: the server stub
+        func: function(stub, start, end) writing the rows from start to end
+        rows: the rows, used to estimate the payload size
+        parallel: the number of chunks sent at the same time
+
+        @return
+        list: the results of all of the chunks joined in a list.  See
+        join_results()
+        '''
+        if parallel == None:
+            parallel = self.parallel
+        sizes = [get_size(x) for x in rows]
+
+        with self.lock:
+            self.stats['calls'] += 1
+            self.stats['rows'] += len(rows)
+
+        end = self.get_chunk(sizes, 0)
+        if end >= len(rows):
+            with self.lock:
+                self.stats['chunks'] += 1
+            return self.join_results( [func(stub, 0, len(rows))] )
+
+        started = False
+        if stub.protocol != "local" and \
+                stub.get_transaction_ticket() == stub.get_login_ticket():
+            stub.start("Write %s rows" % len(rows))
+            started = True
+
+        results = {}
+        failures = []
+        try:
+            if parallel > 1 and stub.protocol != "local":
+                self._execute_parallel(stub, func, sizes, parallel, results, failures)
+            else:
+                start = 0
+                while start < len(rows):
+                    end = self.get_chunk(sizes, start)
+                    self._execute_chunk(stub, func, sizes, start, end, results, failures)
+                    # the chunks after a failure would be aborted
+                    if failures and started:
+                        break
+                    start = end
+        except:
+            if started:
+                self._abort(stub)
+            raise
+
+        if started:
+            if failures:
+                self._abort(stub)
+                # nothing was written
+                results = {}
+            else:
+                stub.finish()
+
+        return self._get_results(results, failures)
+
+
+    def _abort(self, stub):
+        stub.abort()
+        # abort() clears the tickets of the stub
+        stub.set_login_ticket(stub.get_login_ticket())
+
+
+    def _execute_chunk(self, stub, func, sizes, start, end, results, failures):
+        begin = time.time()
+        try:
+            result = func(stub, start, end)
+        except Exception as e:
+            with self.lock:
+                self.stats['failures'] += 1
+                failures.append( (start, end, e) )
+        else:
+            self._measure(sum(sizes[start:end]), time.time() - begin)
+            with self.lock:
+                self.stats['chunks'] += 1
+                results[start] = result
+
+
+    def _execute_parallel(self, stub, func, sizes, parallel, results, failures):
+        # the next row to be sent
+        position = [0]
+
+        def work():
+            worker = self.get_stub(stub)
+            while True:
+                with self.lock:
+                    start = position[0]
+                    if start >= len(sizes):
+                        return
+                    end = self.get_chunk(sizes, start)
+                    position[0] = end
+                self._execute_chunk(worker, func, sizes, start, end, results, failures)
+
+        threads = []
+        for i in range(parallel):
+            thread = threading.Thread(target=work)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+
+    def get_stub(self, stub):
+        '''get a stub with its own connection in the transaction of a stub'''
+        from .tactic_server_stub import TacticServerStub
+        worker = TacticServerStub(setup=False, protocol=stub.protocol, site=stub.site)
+        worker.set_server(stub.get_server_name())
+        worker.set_project(stub.get_project())
+        worker.set_ticket(stub.get_login_ticket())
+        worker.set_transaction_ticket(stub.get_transaction_ticket())
+        return worker
+
+
+    def join_results(self, results):
+        '''join the results of calls in a single list.  List results are
+        joined, other results are appended and None results are left out'''
+        joined = []
+        for result in results:
+            if isinstance(result, (list, tuple)):
+                joined.extend(result)
+            elif result != None:
+                joined.append(result)
+        return joined
+
+
+    def _get_results(self, results, failures):
+        joined = self.join_results( [results[x] for x in sorted(results.keys())] )
+
+        if failures:
+            failures.sort(key=lambda x: x[0])
+            message = "%s chunks failed: %s" % (len(failures),
+                ", ".join(["rows %s-%s: %s" % (x[0], x[1]-1, x[2]) for x in failures]))
+            raise ChunkedWriteException(message, joined, failures)
+        return joined
+
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['rate'] = self.rate
+        return stats
+
+
@@ -10,5 +10,33 @@
 #
 #
 
-from .common import *
-from .upload_multipart import *
+import sys
+if sys.version_info[0] < 3:
+    from .common import *
+    from .upload_multipart import *
+    from .instrumentation import *
+    from .transfer_scheduler import *
+    from .retry_policy import *
+    from .maya_batch import *
+
+else:
+    # the modules are only imported when first used
+    from .lazy_module import lazy_getattr
+
+    _ATTRS = {
+        'Common': '.common',
+        'UploadMultipart': '.upload_multipart',
+        'TacticUploadException': '.upload_multipart',
+        'Instrumentation': '.instrumentation',
+        'TransferScheduler': '.transfer_scheduler',
+        'RetryPolicy': '.retry_policy',
+        'RetryServerProxy': '.retry_policy',
+        'MayaBatch': '.maya_batch',
+        'MayaBatchException': '.maya_batch',
+    }
+
+    __all__ = list(_ATTRS.keys())
+
+    def __getattr__(name):
+        return lazy_getattr(__name__, name, _ATTRS)
+
@@ -42,6 +42,42 @@ class Common(object):
             object = eval("%s()" % (class_name) )
         return object
     create_from_class_path = staticmethod(create_from_class_path)
+
+
+    def check_private_path(path, is_dir=True):
+        '''check that a path holding tickets or credentials is owned by the
+        current user and not accessible by anyone else.  Another user could
+        otherwise create it first in a shared directory, ie: the temp dir,
+        and read or plant data
+
+        @params:
+        path: the path to check
+        is_dir: whether the path should be a directory or a file
+
+        @return
+        boolean: False if the path does not exist or is not private
+        '''
+        import os, stat
+        if not hasattr(os, "getuid"):
+            # Windows: there is no owner to compare with
+            return os.path.exists(path)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return False
+
+        if is_dir:
+            is_type = stat.S_ISDIR(st.st_mode)
+        else:
+            is_type = stat.S_ISREG(st.st_mode)
+        if not is_type or st.st_uid != os.getuid():
+            print("WARNING: [%s] is not a %s owned by the current user" % (path, is_dir and "directory" or "file"))
+            return False
+        if st.st_mode & int("077", 8):
+            print("WARNING: [%s] is accessible by other users" % path)
+            return False
+        return True
+    check_private_path = staticmethod(check_private_path)
  
 
 
@@ -0,0 +1,278 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['Instrumentation']
+
+import os, sys, threading, atexit
+
+
+class CallStats(object):
+    '''statistics of all of the calls to a single method'''
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.errors = 0
+
+
+    def add(self, elapsed, request_bytes, response_bytes, retries, error):
+        self.count += 1
+        self.total_time += elapsed
+        if self.min_time == None or elapsed < self.min_time:
+            self.min_time = elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        self.retries += retries
+        if error:
+            self.errors += 1
+
+        for i, bucket in enumerate(self.buckets):
+            if elapsed <= bucket:
+                self.bucket_counts[i] += 1
+                break
+
+
+    def get_data(self):
+        # cumulative counts, as in OpenMetrics
+        histogram = []
+        total = 0
+        for bucket, count in zip(self.buckets, self.bucket_counts):
+            total += count
+            histogram.append( [bucket, total] )
+
+        return {
+            'count': self.count,
+            'total_time': self.total_time,
+            'min_time': self.min_time or 0.0,
+            'max_time': self.max_time,
+            'mean_time': self.count and self.total_time / self.count or 0.0,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'retries': self.retries,
+            'errors': self.errors,
+            'histogram': histogram,
+        }
+
+
+
+
+class Instrumentation(object):
+    '''Registry recording the wall time, payload sizes, retries and errors
+    of every call the client makes to the server.  Recording is disabled
+    by default.  It is enabled by calling enable() or by setting the
+    TACTIC_API_METRICS environment variable to the path of a file where
+    the statistics are dumped at exit.
+
+        instrumentation = Instrumentation.get()
+        instrumentation.enable()
+        instrumentation.add_hook(my_callback)
+        ...
+        print(instrumentation.get_openmetrics())
+
+    Each hook is called with a dictionary describing the call: method,
+    elapsed, request_bytes, response_bytes, retries and error
+    '''
+
+    # upper bounds in seconds of the histogram buckets
+    BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+            10.0, 30.0, 60.0, float("inf")]
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.exporters = []
+
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def is_enabled(self):
+        return self.enabled
+
+
+    def add_hook(self, hook):
+        '''add a function called after every recorded call'''
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self.hooks:
+            self.hooks.remove(hook)
+
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.stats = {}
+        finally:
+            self.lock.release()
+
+
+    def record(self, method, elapsed, request_bytes=0, response_bytes=0, retries=0, error=None):
+        '''record a single call
+
+        @params
+        method: the name of the api method or transfer
+        elapsed: the wall time of the call in seconds
+        request_bytes: the number of bytes sent
+        response_bytes: the number of bytes received
+        retries: the number of times the call was retried
+        error: the exception if the call failed
+        '''
+        if not self.enabled:
+            return
+
+        self.lock.acquire()
+        try:
+            stats = self.stats.get(method)
+            if not stats:
+                stats = CallStats(self.BUCKETS)
+                self.stats[method] = stats
+            stats.add(elapsed, request_bytes, response_bytes, retries, error)
+        finally:
+            self.lock.release()
+
+        if self.hooks:
+            info = {
+                'method': method,
+                'elapsed': elapsed,
+                'request_bytes': request_bytes,
+                'response_bytes': response_bytes,
+                'retries': retries,
+                'error': error,
+            }
+            for hook in self.hooks:
+                hook(info)
+
+
+    def get_report(self):
+        '''get a dictionary of method to statistics'''
+        self.lock.acquire()
+        try:
+            report = {}
+            for method, stats in self.stats.items():
+                report[method] = stats.get_data()
+            return report
+        finally:
+            self.lock.release()
+
+
+    def _quote(self, value):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return '"%s"' % value
+
+
+    def get_openmetrics(self, prefix="tactic_api"):
+        '''get the statistics in the OpenMetrics text format'''
+        report = self.get_report()
+        methods = sorted(report.keys())
+
+        lines = []
+        name = "%s_call_seconds" % prefix
+        lines.append("# TYPE %s histogram" % name)
+        lines.append("# UNIT %s seconds" % name)
+        for method in methods:
+            data = report[method]
+            label = 'method=%s' % self._quote(method)
+            for bucket, count in data['histogram']:
+                if bucket == float("inf"):
+                    le = "+Inf"
+                else:
+                    le = repr(bucket)
+                lines.append('%s_bucket{%s,le="%s"} %s' % (name, label, le, count))
+            lines.append('%s_count{%s} %s' % (name, label, data['count']))
+            lines.append('%s_sum{%s} %r' % (name, label, data['total_time']))
+
+        for key in ['request_bytes', 'response_bytes', 'retries', 'errors']:
+            name = "%s_%s" % (prefix, key)
+            lines.append("# TYPE %s counter" % name)
+            for method in methods:
+                lines.append('%s_total{method=%s} %s' % (name, self._quote(method), report[method][key]))
+
+        lines.append("# EOF")
+        lines.append("")
+        return "\n".join(lines)
+
+
+    def export(self, path=None, format="json"):
+        '''write the statistics to a file, or to stderr if no path is
+        given
+
+        @params
+        path: the file to write to
+        format: "json" or "openmetrics"
+        '''
+        if format == "openmetrics":
+            data = self.get_openmetrics()
+        else:
+            import json
+            data = json.dumps(self.get_report(), indent=2, sort_keys=True)
+
+        if not path:
+            sys.stderr.write(data)
+            sys.stderr.write("\n")
+            return
+
+        # write and rename so that a reader never sees a partial file
+        tmp_path = "%s.%s" % (path, os.getpid())
+        f = open(tmp_path, "w")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+
+    def register_exporter(self, path=None, format="json"):
+        '''export the statistics when the process exits.  This also enables
+        recording'''
+        self.enable()
+        if not self.exporters:
+            atexit.register(self._export_all)
+        self.exporters.append( (path, format) )
+
+
+    def _export_all(self):
+        for path, format in self.exporters:
+            try:
+                self.export(path, format)
+            except Exception as e:
+                print("WARNING: could not export api metrics: %s" % e)
+
+
+
+    instrumentation = None
+    def get(cls):
+        if not cls.instrumentation:
+            cls.instrumentation = Instrumentation()
+
+            path = os.environ.get("TACTIC_API_METRICS")
+            if path:
+                format = os.environ.get("TACTIC_API_METRICS_FORMAT") or "json"
+                cls.instrumentation.register_exporter(path, format)
+
+        return cls.instrumentation
+    get = classmethod(get)
+
+
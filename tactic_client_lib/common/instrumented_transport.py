@@ -0,0 +1,140 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['InstrumentedTransport', 'InstrumentedSafeTransport']
+
+import re, time, threading
+
+try:
+    import xmlrpclib
+except:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+
+from .instrumentation import Instrumentation
+
+
+class CountingResponse(object):
+    '''wraps an http response to count the bytes read from it'''
+
+    def __init__(self, response):
+        self.response = response
+        self.bytes = 0
+
+    def read(self, *args):
+        data = self.response.read(*args)
+        self.bytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+
+METHOD_NAME_RE = re.compile(r"<methodName>(.*?)</methodName>")
+
+class InstrumentedTransportMixin(object):
+    '''Records the calls made through an xmlrpc transport in the
+    Instrumentation registry.  Retries made by the transport when the
+    connection was reset are counted as well'''
+
+    BASE = None
+
+    def __init__(self, *args, **kwargs):
+        # xmlrpclib.Transport is an old style class in Python2, so its
+        # constructor is not reached through object
+        self.BASE.__init__(self, *args, **kwargs)
+
+
+    def request(self, host, handler, request_body, verbose=False):
+        instrumentation = Instrumentation.get()
+        if not instrumentation.is_enabled():
+            return self.BASE.request(self, host, handler, request_body, verbose)
+
+        head = request_body[:256]
+        if not isinstance(head, str):
+            head = head.decode("UTF8", "ignore")
+        match = METHOD_NAME_RE.search(head)
+        if match:
+            method = match.group(1)
+        else:
+            method = "unknown"
+
+        state = self._get_state()
+        state.attempts = 0
+        state.response_bytes = 0
+
+        error = None
+        start = time.time()
+        try:
+            return self.BASE.request(self, host, handler, request_body, verbose)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.time() - start
+            instrumentation.record(method, elapsed,
+                    request_bytes=len(request_body),
+                    response_bytes=state.response_bytes,
+                    retries=max(state.attempts - 1, 0),
+                    error=error)
+
+
+    def _get_state(self):
+        # transports may be shared between threads
+        state = self.__dict__.get("_instrumentation_state")
+        if state == None:
+            state = threading.local()
+            self.__dict__["_instrumentation_state"] = state
+        return state
+
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        state = self._get_state()
+        state.attempts = getattr(state, "attempts", 0) + 1
+        return self.BASE.single_request(self, host, handler, request_body, verbose)
+
+
+    def set_columnar(self, columnar):
+        # responses of the current thread are decoded into a ResultSet
+        self._get_state().columnar = columnar
+
+
+    def getparser(self):
+        if not getattr(self._get_state(), "columnar", False):
+            return self.BASE.getparser(self)
+
+        from ..result_set import ColumnarUnmarshaller
+        kwargs = {'use_datetime': self._use_datetime}
+        if hasattr(self, "_use_builtin_types"):
+            kwargs['use_builtin_types'] = self._use_builtin_types
+        target = ColumnarUnmarshaller(**kwargs)
+        return xmlrpclib.ExpatParser(target), target
+
+
+    def parse_response(self, response):
+        response = CountingResponse(response)
+        try:
+            return self.BASE.parse_response(self, response)
+        finally:
+            state = self._get_state()
+            state.response_bytes = getattr(state, "response_bytes", 0) + response.bytes
+
+
+
+class InstrumentedTransport(InstrumentedTransportMixin, xmlrpclib.Transport):
+    BASE = xmlrpclib.Transport
+
+class InstrumentedSafeTransport(InstrumentedTransportMixin, xmlrpclib.SafeTransport):
+    BASE = xmlrpclib.SafeTransport
+
+
@@ -0,0 +1,100 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['LazyModule', 'lazy_getattr']
+
+import sys, importlib
+
+
+class LazyModule(object):
+    '''Stands in for a module which is only imported when one of its
+    attributes is first used.  Several module names can be given for
+    modules which were renamed between Python 2 and 3:
+
+        xmlrpclib = LazyModule("xmlrpclib", "xmlrpc.client")
+    '''
+
+    def __init__(self, *names):
+        self.__dict__['_names'] = names
+        self.__dict__['_module'] = None
+
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module != None:
+            return module
+
+        error = None
+        for name in self._names:
+            try:
+                module = importlib.import_module(name)
+                break
+            except ImportError as e:
+                error = e
+        else:
+            raise error
+
+        self.__dict__['_module'] = module
+        return module
+
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+
+    def __repr__(self):
+        return "<LazyModule %s>" % "|".join(self._names)
+
+
+
+def lazy_getattr(module_name, name, attrs, modules=[], fallback=None):
+    '''Resolves an attribute of a package on first access (PEP 562).  The
+    result is stored in the package so that this is only called once per
+    name.
+
+    @params
+    module_name: the name of the package, ie: __name__
+    name: the attribute being accessed
+    attrs: dictionary of attribute name to the relative module defining it
+    modules: list of relative names of modules which are imported when
+        accessed as attributes
+    fallback: relative module whose attributes are exported as well
+
+    @return
+    the value of the attribute
+    '''
+    if name.startswith("__"):
+        raise AttributeError("module '%s' has no attribute '%s'" % (module_name, name))
+
+    package = sys.modules[module_name]
+
+    if name in attrs:
+        module = importlib.import_module(attrs[name], module_name)
+        value = getattr(module, name)
+    elif name in modules:
+        value = importlib.import_module(".%s" % name, module_name)
+    elif fallback and not name.startswith("_"):
+        module = importlib.import_module(fallback, module_name)
+        try:
+            value = getattr(module, name)
+        except AttributeError:
+            raise AttributeError("module '%s' has no attribute '%s'" % (module_name, name))
+    else:
+        raise AttributeError("module '%s' has no attribute '%s'" % (module_name, name))
+
+    setattr(package, name, value)
+    return value
+
@@ -0,0 +1,182 @@
+#########################################################
+#
+# Copyright (c) 2005-2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['MayaBatch', 'MayaBatchException']
+
+
+import json
+
+
+class MayaBatchException(Exception):
+    pass
+
+
+
+class MayaBatch(object):
+    '''Collects a number of queries and executes them in Maya in a single
+    round trip.  The queries are compiled into one python script which
+    is sent through the application's mel() function, so this works for
+    any way Maya is driven, including over a command port.  It is used by
+    both the tactic_client_lib.maya and the application Maya layers.
+
+    Each query function returns the index of its result in the list
+    returned by execute().  A query that fails does not abort the batch:
+    its result is None and the error is available from get_errors()
+
+        batch = app.batch()
+        for node in nodes:
+            batch.attr_exists(node, "tacticNodeData")
+        results = batch.execute()
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self.queries = []
+        self.results = []
+        self.errors = {}
+
+
+    def _add_query(self, expr, convert=None):
+        self.queries.append( (expr, convert) )
+        return len(self.queries) - 1
+
+
+    #
+    # queries
+    #
+    def mel(self, cmd):
+        '''add an arbitrary mel command to the batch'''
+        return self._add_query("mel.eval(%r)" % cmd)
+
+
+    def node_exists(self, node_name):
+        return self._add_query("bool(cmds.ls(%r))" % node_name)
+
+
+    def attr_exists(self, node_name, attribute):
+        plug = "%s.%s" % (node_name, attribute)
+        return self._add_query("bool(cmds.objExists(%r))" % plug)
+
+
+    def get_attr(self, node_name, attribute):
+        plug = "%s.%s" % (node_name, attribute)
+        expr = "(lambda p: cmds.getAttr(p) if cmds.objExists(p) else '')(%r)" % plug
+        # never return None for an attr
+        return self._add_query(expr, self._convert_attr)
+
+
+    def get_attr_type(self, node_name, attribute):
+        plug = "%s.%s" % (node_name, attribute)
+        expr = "(lambda p: cmds.getAttr(p, type=True) if cmds.objExists(p) else '')(%r)" % plug
+        return self._add_query(expr, self._convert_attr)
+
+
+    def get_children(self, node_name, full_path=True, type='transform', recurse=False):
+        expr = "cmds.listRelatives(%r, fullPath=%r, allDescendents=%r, type=%r)" % (node_name, bool(full_path), bool(recurse), type)
+        return self._add_query(expr, self._convert_list)
+
+
+    def is_reference(self, node_name):
+        expr = "bool(cmds.referenceQuery(%r, isNodeReferenced=True))" % node_name
+        return self._add_query(expr)
+
+
+    def _convert_attr(self, value):
+        if value == None:
+            return ""
+        return value
+
+    def _convert_list(self, value):
+        if not value:
+            return []
+        return list(value)
+
+
+    #
+    # execution
+    #
+    def get_script(self):
+        '''get the python script that will be executed in Maya'''
+        lines = []
+        lines.append("import json")
+        lines.append("import maya.cmds as cmds")
+        lines.append("import maya.mel as mel")
+        lines.append("def _run(func):")
+        lines.append("    try:")
+        lines.append("        return [1, func()]")
+        lines.append("    except Exception as e:")
+        lines.append("        return [0, str(e)]")
+        lines.append("result = json.dumps([")
+        for expr, convert in self.queries:
+            lines.append("    _run(lambda: %s)," % expr)
+        lines.append("], default=str)")
+        lines.append("")
+        return "\n".join(lines)
+
+
+    def get_mel(self):
+        '''get the mel command which executes the script and returns the
+        results as a json string'''
+        script = self.get_script()
+        expr = "(lambda d: (eval(compile(%r, '<tactic_batch>', 'exec'), d), d['result'])[1])({})" % script
+        expr = expr.replace('\\', '\\\\').replace('"', '\\"')
+        return 'python("%s")' % expr
+
+
+    def execute(self):
+        '''execute all of the queries in a single round trip
+
+        @return
+        list: the result of each query in the order they were added
+        '''
+        self.results = []
+        self.errors = {}
+        if not self.queries:
+            return self.results
+
+        value = self.app.mel(self.get_mel(), verbose=False)
+        if value == None:
+            raise MayaBatchException("Batch of [%s] queries returned no result" % len(self.queries))
+
+        try:
+            values = json.loads(value)
+        except ValueError:
+            raise MayaBatchException("Batch returned an invalid result [%s]" % value)
+
+        for i, (success, result) in enumerate(values):
+            expr, convert = self.queries[i]
+            if not success:
+                self.errors[i] = result
+                self.results.append(None)
+                continue
+
+            if convert:
+                result = convert(result)
+            self.results.append(result)
+
+        return self.results
+
+
+    def get_results(self):
+        return self.results
+
+    def get_errors(self):
+        '''get a dictionary of query index to error message'''
+        return self.errors
+
+    def clear(self):
+        self.queries = []
+        self.results = []
+        self.errors = {}
+
+
+
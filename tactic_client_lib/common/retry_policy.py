@@ -0,0 +1,241 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['RetryPolicy', 'RetryServerProxy']
+
+import os, time, random, socket, errno
+
+try:
+    import httplib
+except:
+    # Python3
+    from http import client as httplib
+
+try:
+    import xmlrpclib
+except:
+    from xmlrpc import client as xmlrpclib
+
+
+# errors of the connection which are worth trying again
+RETRY_ERRNOS = set([getattr(errno, x) for x in ['ECONNRESET', 'ECONNREFUSED',
+        'ECONNABORTED', 'EPIPE', 'ETIMEDOUT', 'EHOSTUNREACH', 'ENETUNREACH',
+        'ENETRESET'] if hasattr(errno, x)])
+
+# errors of a connection which could not be opened, so nothing was sent
+UNSENT_ERRNOS = set([getattr(errno, x) for x in ['ECONNREFUSED',
+        'EHOSTUNREACH', 'ENETUNREACH'] if hasattr(errno, x)])
+
+# http status codes of a server which is temporarily unavailable
+RETRY_STATUSES = set([500, 502, 503, 504])
+
+# prefixes of the server methods which do not change anything
+READ_PREFIXES = ('get', 'query', 'fast_query', 'eval', 'ping', 'test',
+        'build_', 'split_', 'check_', 'search', 'count', 'list', 'find',
+        'has_', 'is_', 'resolve')
+
+
+class RetryPolicy(object):
+    '''Decides which errors are retried and how long to wait between tries.
+
+    Connection errors (reset, refused, ...), timeouts and 5xx responses are
+    retried.  Errors reported by the server itself (xmlrpc faults) and 4xx
+    responses are not.  The delay doubles on every try, with a random
+    jitter so that many clients do not all retry at the same moment.
+
+    A timeout, a reset connection or a 5xx response may come after the
+    server has already executed a call, so calls which change data are only
+    retried when the connection could not be opened.  retry_mutating=True
+    retries them on all of the transient errors, which may execute a call
+    twice.
+
+    A default policy is used for all of the calls, and a policy can be set
+    for a single method of the server:
+
+        RetryPolicy.set( RetryPolicy(max_tries=10, max_delay=60), method="query" )
+        RetryPolicy.set( RetryPolicy(max_tries=1), method="execute_cmd" )
+
+    The default number of tries can be set with TACTIC_RETRY_MAX_TRIES.
+    '''
+
+    def __init__(self, max_tries=None, base_delay=0.5, max_delay=30.0,
+            retry_mutating=False):
+        '''
+        @params
+        max_tries: the number of tries, including the first one
+        base_delay: the delay in seconds before the first retry
+        max_delay: the longest delay between two tries
+        retry_mutating: retry calls which change data on all of the
+            transient errors, not only when nothing was sent
+        '''
+        if max_tries == None:
+            max_tries = int(os.environ.get("TACTIC_RETRY_MAX_TRIES") or 5)
+        self.max_tries = max_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_mutating = retry_mutating
+        self.sleep = time.sleep
+
+
+    def is_retryable(self, error, mutating=False):
+        '''determine whether an error is transient.  Calls which change data
+        are only retried if the request was not sent'''
+        if mutating and not self.retry_mutating:
+            return self.is_unsent(error)
+
+        # xmlrpclib.ProtocolError has errcode, upload errors have status
+        status = getattr(error, 'errcode', None) or getattr(error, 'status', None)
+        if isinstance(status, int):
+            return status in RETRY_STATUSES
+
+        if isinstance(error, socket.timeout):
+            return True
+        if isinstance(error, (socket.error, IOError, OSError)):
+            return getattr(error, 'errno', None) in RETRY_ERRNOS
+        if isinstance(error, httplib.InvalidURL):
+            return False
+        if isinstance(error, httplib.HTTPException):
+            # ie: BadStatusLine, IncompleteRead when the server goes away
+            return True
+        return False
+
+
+    def is_unsent(self, error):
+        '''determine whether an error happened before the request was sent'''
+        if isinstance(error, socket.timeout):
+            # the timeout may be after the request was sent
+            return False
+        if isinstance(error, socket.gaierror):
+            # the host name could not be resolved
+            return True
+        if isinstance(error, (socket.error, IOError, OSError)):
+            return getattr(error, 'errno', None) in UNSENT_ERRNOS
+        return False
+
+
+    def is_mutating(cls, method):
+        '''determine whether a method of the server changes data'''
+        return not method.startswith(READ_PREFIXES)
+    is_mutating = classmethod(is_mutating)
+
+
+    def get_delay(self, tries):
+        '''get the delay after a number of failed tries'''
+        delay = min(self.max_delay, self.base_delay * (2 ** (tries - 1)))
+        # half of the delay is random
+        return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+
+    def execute(self, func, args=[], kwargs={}, on_retry=None, mutating=False):
+        '''call a function, retrying it on transient errors
+
+        @params
+        func: the function to call
+        args: the arguments of the function
+        kwargs: the keyword arguments of the function
+        on_retry: function(error, tries, delay) called before every retry
+        mutating: whether the function changes data
+
+        @return
+        the return value of the function
+        '''
+        tries = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                tries += 1
+                if tries >= self.max_tries or not self.is_retryable(e, mutating):
+                    raise
+                delay = self.get_delay(tries)
+                if on_retry:
+                    on_retry(e, tries, delay)
+                self.sleep(delay)
+
+
+
+    # method -> RetryPolicy
+    policies = {}
+    def get(cls, method=None):
+        '''get the policy of a method of the server'''
+        policy = cls.policies.get(method)
+        if not policy:
+            policy = cls.policies.get(None)
+            if not policy:
+                policy = RetryPolicy()
+                cls.policies[None] = policy
+        return policy
+    get = classmethod(get)
+
+
+    def set(cls, policy, method=None):
+        '''set the policy of a method, or the default policy if no method
+        is given.  A policy of None removes the override of a method'''
+        if policy == None:
+            if method in cls.policies:
+                del(cls.policies[method])
+        else:
+            cls.policies[method] = policy
+    set = classmethod(set)
+
+
+
+
+class RetryServerProxy(object):
+    '''Wraps an xmlrpc server proxy to retry its calls with the retry
+    policy of each method.
+
+    Calls which change data are only retried if their request was never
+    sent, ie: the connection was refused, unless the retry_mutating flag
+    of their policy allows it.
+
+    relogin is a function(fault) called when the server answers with a
+    fault.  It may return a new ticket, with which the call is sent once
+    more, ie: when a cached ticket was rejected.
+    '''
+
+    def __init__(self, proxy, relogin=None):
+        self._proxy = proxy
+        self._relogin = relogin
+
+
+    def __call__(self, attr):
+        # ie: proxy("transport") and proxy("close")
+        return self._proxy(attr)
+
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        func = getattr(self._proxy, name)
+        policy = RetryPolicy.get(name)
+
+        mutating = RetryPolicy.is_mutating(name)
+
+        def call(*args):
+            try:
+                return policy.execute(func, args, mutating=mutating)
+            except xmlrpclib.Fault as e:
+                if not self._relogin or not args or not isinstance(args[0], dict) \
+                        or 'ticket' not in args[0]:
+                    raise
+                new_ticket = self._relogin(e)
+                if not new_ticket:
+                    raise
+                # the call was rejected before it was executed
+                ticket = dict(args[0])
+                ticket.update(new_ticket)
+                args = (ticket,) + tuple(args[1:])
+                return policy.execute(func, args, mutating=mutating)
+        return call
+
+
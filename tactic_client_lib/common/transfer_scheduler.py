@@ -0,0 +1,392 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['TransferScheduler', 'Transfer']
+
+import os, time, threading, itertools
+from collections import deque
+
+
+# lower ranks go first
+PRIORITIES = {
+    'urgent': 0,
+    'high': 1,
+    'normal': 2,
+    'bulk': 3,
+}
+
+
+class TokenBucket(object):
+    '''limits a rate in bytes per second, allowing bursts of up to one
+    second of transfer'''
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def get_delay(self, amount, now):
+        '''seconds to wait before amount bytes can be transferred'''
+        if not self.rate:
+            return 0
+        self._refill(now)
+        amount = min(amount, self.rate)
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / float(self.rate)
+
+    def consume(self, amount):
+        if self.rate:
+            self.tokens -= min(amount, self.rate)
+
+
+
+class Transfer(object):
+    '''A slot given by the scheduler to a single upload or download.
+
+        transfer = TransferScheduler.get().acquire(host, priority='urgent')
+        try:
+            for buffer in buffers:
+                transfer.throttle(len(buffer))
+                ...
+        finally:
+            transfer.release()
+    '''
+
+    def __init__(self, scheduler, id, host, kind, priority, size):
+        self.scheduler = scheduler
+        self.id = id
+        self.host = host
+        self.kind = kind
+        self.priority = priority
+        self.rank = PRIORITIES.get(priority, PRIORITIES['normal'])
+        self.size = size
+        self.bytes = 0
+        self.start = time.time()
+        self.released = False
+
+    def throttle(self, nbytes):
+        '''wait until nbytes can be transferred within the rate limits'''
+        self.scheduler.throttle(self, nbytes)
+
+    def release(self):
+        self.scheduler.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def get_data(self):
+        elapsed = time.time() - self.start
+        return {
+            'id': self.id,
+            'host': self.host,
+            'kind': self.kind,
+            'priority': self.priority,
+            'bytes': self.bytes,
+            'size': self.size,
+            'elapsed': elapsed,
+            'rate': elapsed and self.bytes / elapsed or 0.0,
+        }
+
+
+
+class TransferScheduler(object):
+    '''Schedules all of the uploads and downloads of a process.
+
+    Every transfer first gets a slot for its host.  The number of slots is
+    limited per host (TACTIC_TRANSFER_CONCURRENCY, 4 by default), and
+    waiting transfers get them in the order of their priority class:
+    urgent, high, normal and bulk.
+
+    The bytes of a transfer go through token buckets, one for the whole
+    process (TACTIC_TRANSFER_RATE) and one per host
+    (TACTIC_TRANSFER_HOST_RATE), in bytes per second.  Tokens are handed
+    out in small quanta, so concurrent transfers of the same priority
+    share the bandwidth evenly while a higher priority transfer is always
+    served first.  No rate is limited by default.
+
+        scheduler = TransferScheduler.get()
+        scheduler.set_host_limits("render01", max_transfers=2, rate=50*1024*1024)
+        print(scheduler.get_stats())
+    '''
+
+    QUANTUM = 64*1024
+
+    # seconds over which the throughput is measured
+    WINDOW = 5.0
+
+    def __init__(self, max_per_host=None, rate=None, host_rate=None):
+        if max_per_host == None:
+            max_per_host = int(os.environ.get("TACTIC_TRANSFER_CONCURRENCY") or 4)
+        if rate == None:
+            rate = int(os.environ.get("TACTIC_TRANSFER_RATE") or 0)
+        if host_rate == None:
+            host_rate = int(os.environ.get("TACTIC_TRANSFER_HOST_RATE") or 0)
+        self.max_per_host = max_per_host
+        self.host_rate = host_rate
+        self.bucket = TokenBucket(rate)
+
+        # host -> {'max_transfers': int, 'bucket': TokenBucket}
+        self.hosts = {}
+
+        self.active = {}
+        self.slot_waiters = []
+        self.token_waiters = []
+        self.ids = itertools.count(1)
+        self.seqs = itertools.count()
+        self.condition = threading.Condition(threading.Lock())
+
+        # statistics
+        self.history = deque()
+        self.host_bytes = {}
+        self.completed = 0
+
+
+    def _get_host(self, host):
+        data = self.hosts.get(host)
+        if not data:
+            data = {
+                'max_transfers': self.max_per_host,
+                'bucket': TokenBucket(self.host_rate),
+            }
+            self.hosts[host] = data
+        return data
+
+
+    def set_host_limits(self, host, max_transfers=None, rate=None):
+        '''set the number of concurrent transfers and the rate in bytes per
+        second for a host'''
+        self.condition.acquire()
+        try:
+            data = self._get_host(host)
+            if max_transfers != None:
+                data['max_transfers'] = max_transfers
+            if rate != None:
+                data['bucket'] = TokenBucket(rate)
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+
+    def set_rate(self, rate):
+        '''set the rate of the whole process in bytes per second'''
+        self.condition.acquire()
+        try:
+            self.bucket = TokenBucket(rate)
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+
+
+    #
+    # slots
+    #
+    def _count_active(self, host):
+        return len([x for x in self.active.values() if x.host == host])
+
+
+    def acquire(self, host, kind='upload', priority='normal', size=0):
+        '''wait for a slot to transfer to or from a host
+
+        @params
+        host: the host of the server
+        kind: upload|download
+        priority: urgent|high|normal|bulk
+        size: the number of bytes to transfer, if known
+
+        @return
+        Transfer
+        '''
+        self.condition.acquire()
+        try:
+            transfer = Transfer(self, next(self.ids), host, kind, priority, size)
+            entry = (transfer.rank, next(self.seqs), transfer)
+            self.slot_waiters.append(entry)
+            self.slot_waiters.sort(key=lambda x: x[:2])
+            try:
+                while not self._is_next_slot(transfer):
+                    self.condition.wait()
+            finally:
+                self.slot_waiters.remove(entry)
+
+            transfer.start = time.time()
+            self.active[transfer.id] = transfer
+            self.condition.notify_all()
+            return transfer
+        finally:
+            self.condition.release()
+
+
+    def _is_next_slot(self, transfer):
+        '''a transfer gets a slot if it is the first one waiting for a host
+        with a free slot'''
+        blocked = set()
+        for rank, seq, waiter in self.slot_waiters:
+            if waiter.host in blocked:
+                continue
+            max_transfers = self._get_host(waiter.host)['max_transfers']
+            if max_transfers and self._count_active(waiter.host) >= max_transfers:
+                blocked.add(waiter.host)
+                continue
+            if waiter is transfer:
+                return True
+            blocked.add(waiter.host)
+        return False
+
+
+    def release(self, transfer):
+        self.condition.acquire()
+        try:
+            if transfer.released:
+                return
+            transfer.released = True
+            if transfer.id in self.active:
+                del(self.active[transfer.id])
+            self.completed += 1
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+
+
+    #
+    # rates
+    #
+    def _get_buckets(self, transfer):
+        buckets = [self.bucket, self._get_host(transfer.host)['bucket']]
+        return [x for x in buckets if x.rate]
+
+
+    def throttle(self, transfer, nbytes):
+        '''wait until the rate limits allow nbytes to be transferred'''
+        remaining = nbytes
+        while remaining > 0:
+            amount = min(remaining, self.QUANTUM)
+            self._take(transfer, amount)
+            remaining -= amount
+
+
+    def _take(self, transfer, amount):
+        self.condition.acquire()
+        try:
+            if self._get_buckets(transfer):
+                entry = (transfer.rank, next(self.seqs), transfer, amount)
+                self.token_waiters.append(entry)
+                self.token_waiters.sort(key=lambda x: x[:2])
+                try:
+                    while True:
+                        delay = self._get_token_delay(entry)
+                        if delay == 0:
+                            break
+                        self.condition.wait(delay)
+                finally:
+                    self.token_waiters.remove(entry)
+
+                for bucket in self._get_buckets(transfer):
+                    bucket.consume(amount)
+                self.condition.notify_all()
+
+            self._add_bytes(transfer, amount)
+        finally:
+            self.condition.release()
+
+
+    def _get_token_delay(self, entry):
+        '''get the time to wait for the tokens of a waiter.  A waiter never
+        takes tokens from a bucket that a waiter ahead of it is waiting for,
+        so the queue order is respected for each bucket'''
+        now = time.time()
+        blocked = set()
+        for waiter in self.token_waiters:
+            buckets = self._get_buckets(waiter[2])
+            if [x for x in buckets if id(x) in blocked]:
+                if waiter is entry:
+                    # woken up when the waiters ahead take their tokens
+                    return 1.0
+                continue
+
+            delay = max([x.get_delay(waiter[3], now) for x in buckets] + [0])
+            if waiter is entry:
+                return delay
+            for bucket in buckets:
+                blocked.add(id(bucket))
+        return 0
+
+
+    def _add_bytes(self, transfer, amount):
+        now = time.time()
+        transfer.bytes += amount
+        self.host_bytes[transfer.host] = self.host_bytes.get(transfer.host, 0) + amount
+        self.history.append( (now, transfer.host, amount) )
+        while self.history and self.history[0][0] < now - self.WINDOW:
+            self.history.popleft()
+
+
+
+    #
+    # statistics
+    #
+    def get_stats(self):
+        '''get the live statistics of the transfers
+
+        @return
+        dictionary: active and waiting transfers, throughput in bytes per
+            second over the last few seconds, per host and in total
+        '''
+        self.condition.acquire()
+        try:
+            now = time.time()
+            while self.history and self.history[0][0] < now - self.WINDOW:
+                self.history.popleft()
+
+            host_rates = {}
+            total = 0
+            for timestamp, host, amount in self.history:
+                host_rates[host] = host_rates.get(host, 0) + amount
+                total += amount
+
+            hosts = {}
+            for host in set(list(self.host_bytes.keys()) + [x.host for x in self.active.values()]):
+                hosts[host] = {
+                    'active': self._count_active(host),
+                    'bytes': self.host_bytes.get(host, 0),
+                    'throughput': host_rates.get(host, 0) / self.WINDOW,
+                }
+
+            return {
+                'active': [x.get_data() for x in sorted(self.active.values(), key=lambda x: x.id)],
+                'waiting': len(self.slot_waiters),
+                'completed': self.completed,
+                'throughput': total / self.WINDOW,
+                'hosts': hosts,
+            }
+        finally:
+            self.condition.release()
+
+
+
+    scheduler = None
+    def get(cls):
+        if not cls.scheduler:
+            cls.scheduler = TransferScheduler()
+        return cls.scheduler
+    get = classmethod(get)
+
+
@@ -22,10 +22,17 @@ except:
     from http import client as httplib
 
 
-import os, sys
+import os, sys, time
+
+from .instrumentation import Instrumentation
+from .transfer_scheduler import TransferScheduler
+from .retry_policy import RetryPolicy
 
 class TacticUploadException(Exception):
-    pass
+    def __init__(self, message, status=None):
+        super(TacticUploadException, self).__init__(message)
+        # the http status of a failed upload
+        self.status = status
 
 class UploadMultipart(object):
     '''Handles the multipart content type for uploading files.  Will break up
@@ -40,6 +47,7 @@ class UploadMultipart(object):
         self.server_url = None
 
         self.offset = 0
+        self.priority = 'normal'
 
 
     def set_offset(self, offset):
@@ -61,6 +69,11 @@ class UploadMultipart(object):
     def set_subdir(self, subdir):
         self.subdir = subdir
 
+    def set_priority(self, priority):
+        '''set the priority class of the upload in the transfer scheduler:
+        urgent, high, normal or bulk'''
+        self.priority = priority
+
 
     def execute(self, path):
         assert self.server_url
@@ -73,6 +86,17 @@ class UploadMultipart(object):
         else:
             self.offset = 0
 
+        host = urlparse.urlsplit(self.server_url)[1]
+        transfer = TransferScheduler.get().acquire(host, kind='upload',
+                priority=self.priority, size=os.path.getsize(path))
+        try:
+            self._execute(f, path, transfer)
+        finally:
+            transfer.release()
+            f.close()
+
+
+    def _execute(self, f, path, transfer):
         while 1:
             buffer = f.read(self.chunk_size)
             if not buffer:
@@ -112,6 +136,7 @@ class UploadMultipart(object):
             if self.subdir:
                 fields.append(("subdir", self.subdir))
 
+            transfer.throttle(len(buffer))
             files = [("file", path, buffer)]
             (status, reason, content) = self.upload(self.server_url, fields, files)
 
@@ -120,33 +145,36 @@ class UploadMultipart(object):
 
             self.offset += 1
 
-        f.close()
-
 
 
     def upload(self, url, fields, files):
+        '''post a chunk, retrying transient errors with the retry policy of
+        "upload_chunk"'''
+        # the first chunk creates the file again, but an appended chunk
+        # which is sent twice is appended twice
+        mutating = ("action", "create") not in fields
 
-        try:
-            ret_value = self.posturl(url, fields, files)
-
-            if ret_value[0] != 200:
-                raise Exception(ret_value[1])
-
-            return ret_value
-
-        except Exception as e:
-            print("Error: ", e)
-
-            # retry about 5 times
-            print("... trying again")
-            self.tries += 1
-            if self.tries < 5:
-                self.upload(url, fields, files)
+        def on_retry(error, tries, delay):
+            print("Error: ", error)
+            print("... trying again in %0.1fs" % delay)
+            self.tries = tries
 
+        self.tries = 0
+        try:
+            policy = RetryPolicy.get("upload_chunk")
+            return policy.execute(self._post, [url, fields, files],
+                    on_retry=on_retry, mutating=mutating)
         finally:
             self.tries = 0
 
 
+    def _post(self, url, fields, files):
+        ret_value = self.posturl(url, fields, files)
+        if ret_value[0] != 200:
+            raise TacticUploadException("Upload failed: %s %s" % (ret_value[0], ret_value[1]), status=ret_value[0])
+        return ret_value
+
+
 
     # Repurposed from:
     # http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/146306
@@ -179,9 +207,24 @@ class UploadMultipart(object):
         # prevent upgrading the method + url in the httplib module to turn it 
         # into a unicode string before sending the request
         selector = str(selector)
-        h.request('POST', selector, body, headers)
-        res = h.getresponse()
-        return res.status, res.reason, res.read()    
+
+        error = None
+        content = ""
+        start = time.time()
+        try:
+            h.request('POST', selector, body, headers)
+            res = h.getresponse()
+            content = res.read()
+            if res.status != 200:
+                error = res.reason
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            Instrumentation.get().record("upload_chunk", time.time() - start,
+                    request_bytes=len(body), response_bytes=len(content),
+                    retries=self.tries, error=error)
+        return res.status, res.reason, content
 
 
     def encode_multipart_formdata(self, fields, files):
@@ -0,0 +1,272 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ConnectionManager']
+
+import os, time, threading, weakref, tempfile, getpass, hashlib, json
+
+
+class ConnectionManager(object):
+    '''Shares tickets and manages the connections of the server stubs of a
+    process.
+
+    Tickets obtained with a login and password are cached in memory, in
+    the environment (for child processes) and in a file readable only by
+    the current user (for unrelated processes on the same machine), so
+    that many workers started at the same time do not all authenticate
+    with the server.  Cached tickets expire after ticket_ttl seconds,
+    which can be set with the TACTIC_TICKET_TTL environment variable.
+    A cached ticket which is rejected by the server is invalidated and
+    the stub gets a new one once.
+
+    The open connections of all of the stubs are reset in a forked child
+    process, so that the child never shares a socket with its parent.
+    '''
+
+    ENV_NAME = "TACTIC_CACHED_TICKET"
+
+    # faults of the server rejecting a ticket
+    TICKET_FAULTS = ["Cannot login with key"]
+
+    def __init__(self, ticket_ttl=None):
+        if ticket_ttl == None:
+            ticket_ttl = int(os.environ.get("TACTIC_TICKET_TTL") or 3600)
+        self.ticket_ttl = ticket_ttl
+
+        # key -> (ticket, expiry)
+        self.tickets = {}
+        self.lock = threading.Lock()
+
+        self.stubs = weakref.WeakSet()
+        self.pid = os.getpid()
+
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+
+    #
+    # connections
+    #
+    def register(self, stub):
+        '''register a stub so that its connection is reset after a fork'''
+        self.check_fork()
+        self.stubs.add(stub)
+
+
+    def check_fork(self):
+        '''reset the connections if this process is a fork which was not
+        reported by os.register_at_fork (ie: Python 2)'''
+        if self.pid != os.getpid():
+            self._after_fork()
+
+
+    def _after_fork(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        for stub in list(self.stubs):
+            self.reset_connection(stub)
+
+
+    def reset_connection(self, stub):
+        '''close the persistent connection of a stub.  A new one is opened
+        on the next call'''
+        server = stub.get_server()
+        if not server:
+            return
+        try:
+            transport = server("transport")
+        except Exception:
+            # local protocol or an old xmlrpclib
+            return
+        try:
+            transport.close()
+        except Exception:
+            pass
+
+
+
+    #
+    # tickets
+    #
+    def get_key(self, server_name, login, password, site=None):
+        '''the key under which a ticket is cached.  The password is part of
+        the key so that a ticket is only shared with callers that know it'''
+        data = "%s|%s|%s|%s" % (server_name, login, site or "", password or "")
+        return hashlib.sha1(data.encode("UTF8")).hexdigest()
+
+
+    def get_cache_dir(self):
+        try:
+            user = getpass.getuser()
+        except Exception:
+            user = "default"
+        return "%s/tactic_tickets_%s" % (tempfile.gettempdir(), user)
+
+
+    def check_cache_dir(self, dir):
+        '''make sure that the ticket cache dir is a directory owned by the
+        current user and not accessible by anyone else.  Another user could
+        otherwise create it in the shared temp dir and read or plant
+        tickets'''
+        from .common.common import Common
+        return Common.check_private_path(dir)
+
+
+    def get_ticket(self, stub, login, password, site=None):
+        '''get a ticket for a login, authenticating with the server only if
+        there is no valid cached ticket
+
+        @params
+        stub: the server stub used to authenticate
+        login: the login
+        password: the password of the login
+        site: the site in a portal setup
+
+        @return
+        string: ticket
+        '''
+        key = self.get_key(stub.get_server_name(), login, password, site)
+
+        ticket = self._get_cached(key)
+        if ticket:
+            # set_site() is done by get_ticket() as well
+            stub.set_site(site)
+            return ticket
+
+        ticket = stub.get_ticket(login, password, site)
+        if ticket:
+            self._set_cached(key, ticket, time.time() + self.ticket_ttl)
+        return ticket
+
+
+    def invalidate(self, stub, login, password, site=None):
+        '''forget the cached ticket of a login, ie: when the server has
+        rejected it'''
+        key = self.get_key(stub.get_server_name(), login, password, site)
+        self.lock.acquire()
+        try:
+            if key in self.tickets:
+                del(self.tickets[key])
+        finally:
+            self.lock.release()
+
+        value = os.environ.get(self.ENV_NAME)
+        if value and value.startswith("%s:" % key):
+            del(os.environ[self.ENV_NAME])
+
+        path = "%s/%s.json" % (self.get_cache_dir(), key)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+    def is_ticket_fault(cls, fault):
+        '''determine whether a fault of the server rejected the ticket'''
+        message = str(getattr(fault, "faultString", "") or "")
+        for ticket_fault in cls.TICKET_FAULTS:
+            if message.find(ticket_fault) != -1:
+                return True
+        return False
+    is_ticket_fault = classmethod(is_ticket_fault)
+
+
+    def _get_cached(self, key):
+        now = time.time()
+
+        # memory
+        self.lock.acquire()
+        try:
+            cached = self.tickets.get(key)
+        finally:
+            self.lock.release()
+        if cached and cached[1] > now:
+            return cached[0]
+
+        # environment, set by a parent process
+        value = os.environ.get(self.ENV_NAME)
+        if value:
+            parts = value.split(":")
+            if len(parts) == 3 and parts[0] == key:
+                try:
+                    expiry = float(parts[2])
+                except ValueError:
+                    expiry = 0
+                if expiry > now:
+                    self._remember(key, parts[1], expiry)
+                    return parts[1]
+
+        # file
+        dir = self.get_cache_dir()
+        if not os.path.exists(dir) or not self.check_cache_dir(dir):
+            return None
+        path = "%s/%s.json" % (dir, key)
+        try:
+            f = open(path, "r")
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return None
+
+        if data.get("expiry", 0) > now and data.get("ticket"):
+            self._remember(key, data.get("ticket"), data.get("expiry"))
+            return data.get("ticket")
+        return None
+
+
+    def _remember(self, key, ticket, expiry):
+        self.lock.acquire()
+        try:
+            self.tickets[key] = (ticket, expiry)
+        finally:
+            self.lock.release()
+
+
+    def _set_cached(self, key, ticket, expiry):
+        self._remember(key, ticket, expiry)
+        os.environ[self.ENV_NAME] = "%s:%s:%s" % (key, ticket, expiry)
+
+        # write and rename so that a reader never sees a partial file
+        dir = self.get_cache_dir()
+        path = "%s/%s.json" % (dir, key)
+        tmp_path = "%s.%s" % (path, os.getpid())
+        try:
+            if not os.path.exists(dir):
+                os.makedirs(dir, int("700", 8))
+            if not self.check_cache_dir(dir):
+                return
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, int("600", 8))
+            f = os.fdopen(fd, "w")
+            try:
+                json.dump( {'ticket': ticket, 'expiry': expiry}, f )
+            finally:
+                f.close()
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            # the file is only an optimization
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+
+    manager = None
+    def get(cls):
+        if not cls.manager:
+            cls.manager = ConnectionManager()
+        return cls.manager
+    get = classmethod(get)
+
+
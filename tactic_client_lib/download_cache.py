@@ -0,0 +1,388 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['DownloadCache']
+
+import os, re, time, stat, shutil, hashlib, threading
+
+try:
+    from urllib.parse import urlsplit, unquote
+except ImportError:
+    from urlparse import urlsplit
+    from urllib import unquote
+
+
+# version in a file name, ie: chr001_model_v003.ma
+VERSION_RE = re.compile(r"[_.]v\d{2,}")
+
+
+class DownloadCache(object):
+    '''A cache of downloaded files shared by all of the processes of a
+    machine.  Files are stored under a key made of their repository path
+    and their checksum or version, and cache hits are linked into the
+    destination instead of being downloaded again.
+
+    Entries are written to a temporary file and renamed into place, and a
+    lock file per entry makes sure that only one process downloads a
+    file while the others wait for it.  When the cache grows over its
+    byte budget, the least recently used entries are removed.
+
+    The cache is enabled by setting TACTIC_DOWNLOAD_CACHE_DIR, with the
+    budget in bytes in TACTIC_DOWNLOAD_CACHE_SIZE, or with:
+
+        DownloadCache.set( DownloadCache("/local/cache", max_bytes=50*1024**3) )
+
+    Files without a checksum or a version are only cached if their name
+    contains a version (ie: _v001), because an unversioned repository path
+    may point to different contents over time.
+
+    Entries are reflinked where the file system supports it and copied
+    otherwise.  With link_mode="hardlink", the destination and the entry
+    are the same file: they are read-only, and a file which is made
+    writable and edited in place changes the cache for everyone.
+    '''
+
+    DEFAULT_MAX_BYTES = 10*1024*1024*1024
+
+    # seconds after which a lock is considered abandoned
+    LOCK_TIMEOUT = 600
+
+    # FICLONE ioctl on Linux
+    FICLONE = 0x40049409
+
+    def __init__(self, cache_dir, max_bytes=None, link_mode="auto"):
+        '''
+        @params
+        cache_dir: the directory of the cache
+        max_bytes: the byte budget of the cache
+        link_mode: auto|reflink|hardlink|copy.  auto tries a reflink and
+            copies if it is not supported.  Hard links are only used when
+            asked for
+        '''
+        self.cache_dir = cache_dir.replace("\\", "/").rstrip("/")
+        if not max_bytes:
+            max_bytes = self.DEFAULT_MAX_BYTES
+        self.max_bytes = max_bytes
+        self.link_mode = link_mode
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+    #
+    # keys
+    #
+    def is_cacheable(self, url, checksum=None, version=None):
+        if checksum or version not in [None, '', -1, '-1']:
+            return True
+        path = urlsplit(url)[2]
+        return bool(VERSION_RE.search(os.path.basename(path)))
+
+
+    def get_key(self, url, checksum=None, version=None):
+        '''the key of a file.  The host is not part of the key, so the same
+        file downloaded through different server names is shared'''
+        path = unquote(urlsplit(url)[2])
+        data = "%s|%s|%s" % (path, checksum or "", version or "")
+        return hashlib.sha1(data.encode("UTF8")).hexdigest()
+
+
+    def get_entry_path(self, key):
+        return "%s/objects/%s/%s" % (self.cache_dir, key[:2], key)
+
+
+    #
+    # locks
+    #
+    def _acquire(self, lock_path, wait=True):
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+                os.write(fd, str(os.getpid()).encode("UTF8"))
+                os.close(fd)
+                return True
+            except OSError:
+                pass
+
+            # remove locks abandoned by a process that died
+            try:
+                if time.time() - os.path.getmtime(lock_path) > self.LOCK_TIMEOUT:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+
+            if not wait:
+                return False
+            time.sleep(0.1)
+
+
+    def _release(self, lock_path):
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+    #
+    # linking
+    #
+    def _reflink(self, src, dst):
+        import fcntl
+        src_f = open(src, "rb")
+        try:
+            dst_f = open(dst, "wb")
+            try:
+                fcntl.ioctl(dst_f.fileno(), self.FICLONE, src_f.fileno())
+            finally:
+                dst_f.close()
+        except Exception:
+            if os.path.exists(dst):
+                os.remove(dst)
+            raise
+        finally:
+            src_f.close()
+
+
+    def link(self, src, dst):
+        '''put a cached file at the destination'''
+        if os.path.lexists(dst):
+            os.remove(dst)
+
+        modes = [self.link_mode]
+        if self.link_mode == "auto":
+            modes = ["reflink"]
+
+        for mode in modes:
+            try:
+                if mode == "reflink":
+                    self._reflink(src, dst)
+                    # reflinks are independent copies
+                    os.chmod(dst, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+                    return "reflink"
+                elif mode == "hardlink":
+                    os.link(src, dst)
+                    return "hardlink"
+            except Exception:
+                continue
+
+        shutil.copyfile(src, dst)
+        return "copy"
+
+
+    #
+    # operations
+    #
+    def get_file(self, key, to_path):
+        '''put a cached file at to_path
+
+        @return
+        boolean: False if the file is not in the cache
+        '''
+        entry_path = self.get_entry_path(key)
+        try:
+            self.link(entry_path, to_path)
+        except (IOError, OSError):
+            return False
+
+        # the modification time of an entry is its last use
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return True
+
+
+    def fetch(self, url, to_path, fetch, checksum=None, version=None):
+        '''get a file through the cache
+
+        @params
+        url: the url of the file
+        to_path: the destination of the file
+        fetch: function(url, path) which downloads the file to a path
+        checksum: md5 checksum of the file, if known.  A download which does
+            not match it is not cached
+        version: version of the file, if known
+
+        @return
+        string: to_path
+        '''
+        if not self.is_cacheable(url, checksum, version):
+            fetch(url, to_path)
+            return to_path
+
+        key = self.get_key(url, checksum, version)
+        if self.get_file(key, to_path):
+            self._count("hits")
+            return to_path
+
+        entry_path = self.get_entry_path(key)
+        entry_dir = os.path.dirname(entry_path)
+        if not os.path.exists(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                if not os.path.isdir(entry_dir):
+                    raise
+
+        lock_path = "%s.lock" % entry_path
+        self._acquire(lock_path)
+        try:
+            # another process may have downloaded it while waiting
+            if self.get_file(key, to_path):
+                self._count("hits")
+                return to_path
+
+            self._count("misses")
+            tmp_path = "%s.%s.%s.tmp" % (entry_path, os.getpid(), threading.current_thread().ident)
+            try:
+                fetch(url, tmp_path)
+                if checksum and self.get_md5(tmp_path) != checksum:
+                    # icons and web versions do not match the checksum of
+                    # their file, so the download is kept but not cached
+                    print("WARNING: Downloaded file [%s] does not match checksum [%s]" % (url, checksum))
+                    if os.path.lexists(to_path):
+                        os.remove(to_path)
+                    shutil.move(tmp_path, to_path)
+                    return to_path
+
+                # entries are read-only because they may be hard linked
+                os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                if os.path.exists(entry_path):
+                    os.remove(entry_path)
+                os.rename(tmp_path, entry_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.chmod(tmp_path, stat.S_IWUSR | stat.S_IRUSR)
+                    os.remove(tmp_path)
+
+            # the entry is linked while it is locked, so that it can not
+            # be evicted before it gets to the destination
+            if not self.get_file(key, to_path):
+                raise IOError("Could not get [%s] from the download cache" % url)
+        finally:
+            self._release(lock_path)
+
+        self.evict()
+        return to_path
+
+
+    def _count(self, name):
+        self.lock.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self.lock.release()
+
+
+    def get_md5(cls, path):
+        md5 = hashlib.md5()
+        f = open(path, "rb")
+        try:
+            while True:
+                buffer = f.read(1024*1024)
+                if not buffer:
+                    break
+                md5.update(buffer)
+        finally:
+            f.close()
+        return md5.hexdigest()
+    get_md5 = classmethod(get_md5)
+
+
+    def get_entries(self):
+        '''get a list of (last use, size, path) of all of the entries'''
+        entries = []
+        objects_dir = "%s/objects" % self.cache_dir
+        if not os.path.exists(objects_dir):
+            return entries
+        for dir in os.listdir(objects_dir):
+            dir = "%s/%s" % (objects_dir, dir)
+            try:
+                names = os.listdir(dir)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".lock") or name.endswith(".tmp"):
+                    continue
+                path = "%s/%s" % (dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append( (st.st_mtime, st.st_size, path) )
+        return entries
+
+
+    def evict(self):
+        '''remove the least recently used entries until the cache is within
+        its budget.  Only one process evicts at a time'''
+        lock_path = "%s/evict.lock" % self.cache_dir
+        if not self._acquire(lock_path, wait=False):
+            return
+        try:
+            entries = self.get_entries()
+            total = sum([x[1] for x in entries])
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                # do not remove an entry which is being used
+                entry_lock = "%s.lock" % path
+                if not self._acquire(entry_lock, wait=False):
+                    continue
+                try:
+                    # the mode is shared with hard linked destinations, so
+                    # it is not changed
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+                finally:
+                    self._release(entry_lock)
+        finally:
+            self._release(lock_path)
+
+
+
+    cache = None
+    def get(cls):
+        '''get the download cache of this process, or None if it is not
+        enabled'''
+        if cls.cache:
+            return cls.cache
+
+        cache_dir = os.environ.get("TACTIC_DOWNLOAD_CACHE_DIR")
+        if not cache_dir:
+            return None
+        max_bytes = int(os.environ.get("TACTIC_DOWNLOAD_CACHE_SIZE") or 0)
+        cls.cache = DownloadCache(cache_dir, max_bytes=max_bytes)
+        return cls.cache
+    get = classmethod(get)
+
+
+    def set(cls, cache):
+        cls.cache = cache
+    set = classmethod(set)
+
+
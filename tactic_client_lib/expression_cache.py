@@ -0,0 +1,164 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ExpressionCache']
+
+import re, time, json, copy, threading
+from collections import OrderedDict
+
+import six
+
+
+# quoted strings in an expression, in which spaces are kept
+QUOTED_RE = re.compile(r'''('[^']*'|"[^"]*")''')
+SPACE_RE = re.compile(r"\s+")
+OPEN_SPACE_RE = re.compile(r"([(\[,])\s+")
+CLOSE_SPACE_RE = re.compile(r"\s+([)\],])")
+
+# search types named in an expression, ie: @GET(sthpw/task.status)
+SEARCH_TYPE_RE = re.compile(r"\b([A-Za-z_]\w*/[A-Za-z_]\w*)")
+
+
+def get_base_type(search_type):
+    return search_type.split("?")[0]
+
+
+
+class ExpressionCache(object):
+    '''Caches the results of eval() calls of a server stub.
+
+    Results are keyed by the expression with its spaces normalized, the
+    search keys, vars, mode, single, show_retired and the project.  An
+    entry is dropped when a call of the stub changes one of its related
+    search types: the search types named in the expression and the search
+    types of its search keys.  Entries with no related search types are
+    dropped on every change.  All of the entries are dropped on finish(),
+    abort(), undo() and redo(), and after ttl seconds, since other users
+    may change the same sobjects.
+
+        server.set_expression_cache( ExpressionCache(ttl=30) )
+        server.eval("@GET(prod/shot.code)")
+        server.eval("@GET( prod/shot.code )")   # answered by the cache
+        print(server.get_expression_cache().get_stats())
+    '''
+
+    def __init__(self, max_entries=1000, ttl=60):
+        '''
+        @params
+        max_entries: the number of results kept.  The results used the
+            least recently are dropped first
+        ttl: the number of seconds a result is kept, or None to keep it
+            until it is invalidated
+        '''
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # key -> (results, base search types, expiry)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+    def normalize(cls, expression):
+        '''collapse the spaces of an expression outside of quoted strings
+        and remove the spaces inside of brackets and after commas'''
+        parts = QUOTED_RE.split(expression.strip())
+        for i in range(0, len(parts), 2):
+            part = SPACE_RE.sub(" ", parts[i])
+            part = OPEN_SPACE_RE.sub(r"\1", part)
+            parts[i] = CLOSE_SPACE_RE.sub(r"\1", part)
+        return "".join(parts)
+    normalize = classmethod(normalize)
+
+
+    def get_key(self, expression, search_keys=[], mode=None, single=False,
+            vars={}, show_retired=False, project=None):
+        if isinstance(search_keys, six.string_types):
+            search_keys = [search_keys]
+        search_keys = json.dumps(search_keys, sort_keys=True, default=str)
+        vars = json.dumps(vars, sort_keys=True, default=str)
+        return (self.normalize(expression), search_keys, mode, bool(single),
+                vars, bool(show_retired), project)
+
+
+    def get_search_types(self, expression, search_keys=[]):
+        '''get the base search types related to an expression'''
+        search_types = set(SEARCH_TYPE_RE.findall(expression))
+        if isinstance(search_keys, six.string_types):
+            search_keys = [search_keys]
+        for search_key in search_keys or []:
+            if isinstance(search_key, dict):
+                search_key = search_key.get("__search_key__")
+            if isinstance(search_key, six.string_types):
+                search_types.add(get_base_type(search_key))
+        return search_types
+
+
+    def get(self, key):
+        '''get the cached results of a key, or None'''
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry and self.ttl and entry[2] < time.time():
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            # most recently used
+            self.entries[key] = entry
+            self.hits += 1
+        return copy.deepcopy(entry[0])
+
+
+    def set(self, key, results, search_types):
+        expiry = self.ttl and time.time() + self.ttl or None
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (copy.deepcopy(results), search_types, expiry)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+    def invalidate(self, search_types=[], search_keys=[]):
+        '''drop the results related to search types or to the search types
+        of search keys'''
+        changed = set([get_base_type(x) for x in search_types])
+        for search_key in search_keys:
+            changed.add(get_base_type(search_key))
+
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if not entry[1] or entry[1].intersection(changed):
+                    del(self.entries[key])
+                    self.invalidations += 1
+
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': total and float(self.hits) / total or 0.0,
+                'invalidations': self.invalidations,
+                'entries': len(self.entries),
+            }
+
+
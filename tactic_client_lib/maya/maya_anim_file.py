@@ -10,6 +10,7 @@
 #
 #
 
+import os, json, mmap
 
 from .maya_environment import *
 
@@ -17,81 +18,206 @@ from .maya_environment import *
 class MayaAnimFile:
     '''Provides ability to extract some limited information from the file
     generated from the mayaImport/mayaExport plugin that is shipped with Maya
+
+    The file is indexed in a single pass which records the byte offsets of
+    the ANIM and STATIC blocks of every instance.  The actual contents are
+    only read from a memory map when requested, so large set files can be
+    handled without loading them into memory.
     '''
 
+    INDEX_VERSION = 1
+
     def __init__(self, path):
         self.path = path
-        self.buffers = {}
-        self.static_buffers = {}
+        self.anim_index = {}
+        self.static_index = {}
+
+        self.file = None
+        self.map = None
+
+
+    def get_index_path(self):
+        '''the sidecar file where the index is persisted'''
+        return "%s.idx" % self.path
+
+
+    def parse(self, use_index_file=False):
+        '''index the file.  If use_index_file is True, a valid sidecar index
+        is reused and a new one is written if it is missing or stale'''
+        self.close()
+        if use_index_file and self.load_index():
+            return
 
-    def parse(self):
         self.parse_v01()
-        self.parse_v01('STATIC')
 
+        if use_index_file:
+            self.save_index()
+
+
+    def parse_v01(self):
+        self.anim_index = {}
+        self.static_index = {}
 
-    def parse_v01(self, file_type='ANIM'):
-        file = open(self.path, "r")
-        buffer = None
+        file_type = None
         instance = None
+        start = 0
+        offset = 0
+
+        file = open(self.path, "rb")
+        try:
+            for line in file:
+                line_start = offset
+                offset += len(line)
+
+                if not line.startswith(b"//"):
+                    continue
+
+                line = line.rstrip().decode('utf-8', 'replace')
+                if line.startswith("//START_ANIM=") or \
+                        line.startswith("//START_STATIC=") or \
+                        line.startswith("//START="): # backward-compatibility
+                    if instance != None:
+                        # unterminated block
+                        self._add_block(file_type, instance, start, line_start)
+
+                    tag, instance = line[2:].split("=", 1)
+                    if tag == "START":
+                        file_type = None
+                    else:
+                        file_type = tag[6:]
+                    start = line_start
+
+                    # maintain backwards compatibility with old maya instances
+                    if instance.find(":") != -1:
+                        instance, tmp = instance.split(":",1)
+
+                elif line.startswith("//END_ANIM=") or \
+                        line.startswith("//END_STATIC=") or \
+                        line.startswith("//END="): # backward-compatibility
+                    if instance != None:
+                        self._add_block(file_type, instance, start, offset)
+                    instance = None
 
-        # parse the file and store by instance
-        for line in file.readlines():
-            line = line.rstrip()
-            # //END is not needed for parsing, a visual indicator only
-            if line.startswith("//START_%s="%file_type)\
-                or line.startswith("//START="): # backward-compatibility
-
-                index = line.index("=")
-                instance = line[index+1:]
-                import cStringIO
-                buffer = cStringIO.StringIO()
-
-                # maintain backwards compatibility with old maya instances
-                if instance.find(":") != -1:
-                    instance, tmp = instance.split(":",1)
-                
-                if file_type=='STATIC':
-                    self.static_buffers[instance] = buffer
-                else:
-                    self.buffers[instance] = buffer
-            
-            #if line.startswith("// POS:  <tx>34.43</tx><ty>
-
-        
             if instance != None:
-                buffer.write(line)
-                buffer.write("\n")
-            
-            if line.startswith("//END_%s="%file_type)\
-                or line.startswith("//END="): # backward-compatibility
-                instance == None
-                
-        file.close()
+                self._add_block(file_type, instance, start, offset)
+        finally:
+            file.close()
+
+
+    def _add_block(self, file_type, instance, start, end):
+        # old style blocks without a type are both anim and static
+        if file_type in (None, 'ANIM'):
+            self.anim_index[instance] = (start, end)
+        if file_type in (None, 'STATIC'):
+            self.static_index[instance] = (start, end)
+
+
+    def _get_stat(self):
+        stat = os.stat(self.path)
+        return stat.st_size, stat.st_mtime
+
+
+    def load_index(self):
+        '''load the sidecar index.  Returns False if it does not exist or
+        if it is out of date with respect to the anim file'''
+        index_path = self.get_index_path()
+        if not os.path.exists(index_path):
+            return False
+
+        try:
+            f = open(index_path, "r")
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return False
+
+        size, mtime = self._get_stat()
+        if data.get('version') != self.INDEX_VERSION or \
+                data.get('size') != size or data.get('mtime') != mtime:
+            return False
+
+        self.anim_index = dict( [(x, tuple(y)) for x, y in data.get('anim', {}).items()] )
+        self.static_index = dict( [(x, tuple(y)) for x, y in data.get('static', {}).items()] )
+        return True
+
+
+    def save_index(self):
+        '''write the sidecar index next to the anim file'''
+        size, mtime = self._get_stat()
+        data = {
+            'version': self.INDEX_VERSION,
+            'size': size,
+            'mtime': mtime,
+            'anim': self.anim_index,
+            'static': self.static_index,
+        }
+
+        # write to a temp file first so that readers never see a partial index
+        index_path = self.get_index_path()
+        tmp_path = "%s.%s.tmp" % (index_path, os.getpid())
+        try:
+            f = open(tmp_path, "w")
+            try:
+                json.dump(data, f)
+            finally:
+                f.close()
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(tmp_path, index_path)
+        except (IOError, OSError):
+            # the index is only an optimization
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
 
     def write_v01(self, buffer):
         pass
 
 
+    def close(self):
+        '''release the memory map on the anim file'''
+        if self.map:
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+    def _get_block(self, index, instance):
+        offsets = index.get(instance)
+        if not offsets:
+            return ""
+
+        start, end = offsets
+        if end <= start:
+            return ""
+
+        if not self.map:
+            self.file = open(self.path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = self.map[start:end].decode('utf-8', 'replace')
+        lines = [x.rstrip() for x in buffer.splitlines()]
+        lines.append("")
+        return "\n".join(lines)
 
 
+    def get_instances(self):
+        instances = set(self.anim_index.keys())
+        instances.update(self.static_index.keys())
+        return sorted(instances)
 
 
     def get_anim(self, instance):
+        return self._get_block(self.anim_index, instance)
 
-        try:
-            return self.buffers[instance].getvalue()
-        except KeyError as e:
-            return ""
 
     def get_static(self, instance):
+        return self._get_block(self.static_index, instance)
 
-        try:
-            return self.static_buffers[instance].getvalue()
-        except KeyError as e:
-            return ""
-         
-       
 
 
 
@@ -102,5 +228,3 @@ if __name__ == '__main__':
     anim_file.parse()
 
     print(anim_file.get_anim( "alarm_clock_C:product202"))
-
-
@@ -145,6 +145,12 @@ class Maya(Application):
             return pymel.mel(cmd)
 
 
+    def batch(self):
+        '''get a batch which executes many queries in a single round trip'''
+        from ..common.maya_batch import MayaBatch
+        return MayaBatch(self)
+
+
 
     def cleanup(self):
         exec("import pymel as pymel")
@@ -515,27 +521,35 @@ class Maya(Application):
         
     # set functions
     def get_sets(self):
+        batch = self.batch()
+        self._add_set_queries(batch)
+        return self._get_sets_from_batch(batch.execute())
+
+
+    def _add_set_queries(self, batch):
         #all_sets = mel('listSets -allSets')
         # change to this.  The above does not give the full namespace name
-        all_sets = set(mel('ls -type objectSet'))
+        batch.mel('ls -type objectSet')
+        # this fails if the delight plugin is not loaded
+        batch.mel('ls -type delightShapeSet')
+        # shadingEngine is strangely a subset of -type objectSet in Maya 7 at least
+        batch.mel('ls -type shadingEngine')
+        batch.mel('listSets -type 2')
+
+
+    def _get_sets_from_batch(self, results):
+        all_set_list, delight_list, render_set_list, deformer_set_list = results[-4:]
+
+        all_sets = set(all_set_list or [])
         delight_set = set() 
-        try:
-            delight_list = mel('ls -type delightShapeSet')
-            if delight_list:
-                delight_set = set(delight_list)
-        except Exception as e:
-            pass
+        if delight_list:
+            delight_set = set(delight_list)
 
         ignore_set = set(['defaultLightSet', 'defaultObjectSet']).union(delight_set)
         #ignore_set = set(['defaultLightSet', 'defaultObjectSet'])
         render_set = set()
         deformer_set = set()
 
-
-        # shadingEngine is strangely a subset of -type objectSet in Maya 7 at least
-        render_set_list = mel('ls -type shadingEngine')
-        deformer_set_list = mel('listSets -type 2')
-        
         if render_set_list:
             render_set = set(render_set_list)
         if deformer_set_list:
@@ -627,6 +641,12 @@ class Maya(Application):
     def get_top_nodes(self):
         # maya 7.0 bug: "ls -as" produces garbage
         nodes  = mel("ls -tr -l")
+        return self._get_top_nodes_from_list(nodes)
+
+
+    def _get_top_nodes_from_list(self, nodes):
+        if not nodes:
+            return []
 
         top_level = []
         for node in nodes:
@@ -644,6 +664,28 @@ class Maya(Application):
         return top_level
 
 
+    def get_session_contents(self):
+        '''get all of the namespaces and all of the top nodes and sets
+        in the session in a single round trip.  Used to find out what an
+        import has added to the session
+
+        @return
+        tuple: list of namespaces, list of top nodes and sets
+        '''
+        batch = self.batch()
+        batch.mel('namespaceInfo -listOnlyNamespaces')
+        batch.mel("ls -tr -l")
+        self._add_set_queries(batch)
+        results = batch.execute()
+
+        namespaces = results[0]
+        if not namespaces:
+            namespaces = []
+        nodes = self._get_top_nodes_from_list(results[1])
+        nodes.extend( self._get_sets_from_batch(results) )
+        return namespaces, nodes
+
+
 
 
     def get_tactic_nodes(self, top_node=None):
@@ -701,9 +743,12 @@ class Maya(Application):
 
         # look through transforms
         node_type = "transform"
-        nodes = []
+        batch = self.batch()
         for node in top_nodes:
-            tmp_nodes = mel('ls -type %s -recursive true -dag -allPaths "%s"' % (node_type, node) )
+            batch.mel('ls -type %s -recursive true -dag -allPaths "%s"' % (node_type, node) )
+
+        nodes = []
+        for tmp_nodes in batch.execute():
             if not tmp_nodes:
                 continue
 
@@ -716,6 +761,7 @@ class Maya(Application):
         if not nodes:
             return references
 
+        candidates = []
         for node in nodes:
             # only consider nodes that have one namespace greater than the
             # top node.
@@ -723,14 +769,21 @@ class Maya(Application):
                 parts = node.split(":")
                 if len(parts) > num_parts + 1:
                     continue
+            candidates.append(node)
 
+        # query all of the candidates at once
+        batch = self.batch()
+        for node in candidates:
             # sub refs are always maya references
-            is_ref = mel('reference -q -isNodeReferenced "%s"' % node)
-            if is_ref:
-                # found a potential node ...
-                # make sure this has a tacticNodeData attribute
-                if self.attr_exists(node, "tacticNodeData"):
-                    references.append(node)
+            batch.mel('reference -q -isNodeReferenced "%s"' % node)
+            # make sure this has a tacticNodeData attribute
+            batch.attr_exists(node, "tacticNodeData")
+        results = batch.execute()
+
+        for i, node in enumerate(candidates):
+            is_ref = results[2*i]
+            if is_ref and results[2*i+1]:
+                references.append(node)
 
 
         return references
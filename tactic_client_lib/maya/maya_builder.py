@@ -78,12 +78,8 @@ class MayaBuilder(SessionBuilder):
             if contents == None:
                 self.app.remove_namespace(namespace)
 
-            # get all of the namespaces
-            old = self.app.get_all_namespaces()
-            old_nodes = self.app.get_top_nodes()
-            sets = self.app.get_sets()
-            if sets:
-                old_nodes.extend(sets)
+            # get all of the namespaces, top nodes and sets
+            old, old_nodes = self.app.get_session_contents()
 
             # import file into namespace
             if instantiation == 'reference':
@@ -101,16 +97,11 @@ class MayaBuilder(SessionBuilder):
 
 
             # get the two differences to find out which namespace was created
-            new = self.app.get_all_namespaces()
+            new, new_nodes = self.app.get_session_contents()
             diff = [val for val in new if val not in old]
             if not diff:
                 raise Exception("No namespaces created")
 
-
-            new_nodes = self.app.get_top_nodes()
-            sets = self.app.get_sets()
-            if sets:
-                new_nodes.extend(sets)
             created_nodes = [val for val in new_nodes if val not in old_nodes]
 
             # get the top node for this asset
@@ -160,6 +151,7 @@ class MayaBuilder(SessionBuilder):
         # import the file just created
         self.app.import_anim(tmp)
         self.app.import_static(anim.get_static(instance), node_name)
+        anim.close()
 
        
 
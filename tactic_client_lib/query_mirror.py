@@ -0,0 +1,523 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['QueryMirror', 'QueryMirrorException']
+
+import time, json, hashlib, threading, sqlite3
+
+try:
+    string_types = basestring
+except NameError:
+    # Python3
+    string_types = str
+
+
+class QueryMirrorException(Exception):
+    '''raised for a query which cannot be answered by the mirror.  These
+    queries are sent to the server instead'''
+    pass
+
+
+# operators of the filters which are answered locally
+COMPARE_OPS = ['=', '!=', '<>', '<', '<=', '>', '>=']
+
+
+class QueryMirror(object):
+    '''A local sqlite copy of the sobjects of some search types, used to
+    answer queries which accept slightly stale results:
+
+        mirror = QueryMirror(server, path="/tmp/tactic_mirror_%s.db" % login)
+        mirror.configure("sthpw/task", ttl=30, indexes=['assigned', 'status'])
+        server.set_query_mirror(mirror)
+
+        tasks = server.query("sthpw/task", [('assigned', 'joe')], stale_ok=True)
+
+    The first query of a search type copies all of its sobjects.  After
+    ttl seconds, the next query only asks the server for the sobjects of
+    which the timestamp column is newer than the newest one in the copy.
+    Since a change to an existing sobject does not always change its
+    timestamp, the whole search type is copied again every full_ttl
+    seconds.  The sobjects changed through the server stub are refreshed on
+    the next query.
+
+    Filters with =, !=, <, <=, >, >=, like, ilike, in, not in and is, and
+    order_bys on columns are answered with sqlite, with an index on every
+    column used.  Any other query raises QueryMirrorException and is sent to
+    the server by the stub.
+
+    A mirror stored in a file should not be shared between logins, since
+    each login may see different sobjects.
+    '''
+
+    DEFAULTS = {
+        'ttl': 60,
+        'full_ttl': 3600,
+        'timestamp_column': 'timestamp',
+        'indexes': [],
+    }
+
+    def __init__(self, stub, path=":memory:"):
+        self.stub = stub
+        self.path = path
+        self.configs = {}
+
+        # table key -> set of search keys to refresh
+        self.pending = {}
+        # table keys to copy again
+        self.stale = set()
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS mirror_state (
+            key TEXT PRIMARY KEY, table_name TEXT, types TEXT,
+            last_sync REAL, last_full REAL, max_timestamp TEXT)''')
+        self.conn.commit()
+
+        self.hits = 0
+        self.syncs = 0
+
+
+    def configure(self, search_type, **kwargs):
+        '''configure the mirror of a search type
+
+        @keyparam
+        ttl: seconds during which the copy is used without asking the
+            server for newer sobjects
+        full_ttl: seconds after which the search type is copied again
+        timestamp_column: column with the time of the last change, or of
+            the creation, of the sobjects
+        indexes: columns to index
+        '''
+        config = self.configs.get(search_type)
+        if not config:
+            config = dict(self.DEFAULTS)
+            self.configs[search_type] = config
+        config.update(kwargs)
+
+
+    def get_config(self, search_type):
+        base_type = search_type.split("?")[0]
+        return self.configs.get(search_type) or self.configs.get(base_type) or self.DEFAULTS
+
+
+    def get_key(self, search_type):
+        '''the key of the copy of a search type.  Project types are copied
+        separately for each project'''
+        base_type = search_type.split("?")[0]
+        if base_type.startswith("sthpw/") or search_type.find("?") != -1:
+            return search_type
+        return "%s?project=%s" % (base_type, self.stub.get_project())
+
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'syncs': self.syncs,
+        }
+
+
+
+    #
+    # invalidation
+    #
+    def mark_stale(self, search_type, search_keys=None):
+        '''mark sobjects of a search type which have changed.  If no search
+        keys are given, newer sobjects are fetched on the next query'''
+        self.lock.acquire()
+        try:
+            key = self.get_key(search_type)
+            if search_keys == None:
+                self.stale.add(key)
+            else:
+                if not isinstance(search_keys, (list, tuple)):
+                    search_keys = [search_keys]
+                self.pending.setdefault(key, set()).update(search_keys)
+        finally:
+            self.lock.release()
+
+
+    def mark_keys_stale(self, search_keys):
+        '''mark the sobjects of a list of search keys which have changed'''
+        if not isinstance(search_keys, (list, tuple)):
+            search_keys = [search_keys]
+        for search_key in search_keys:
+            search_type = search_key.split("?")[0]
+            for param in search_key.split("?")[-1].split("&"):
+                if param.startswith("project="):
+                    search_type = "%s?%s" % (search_type, param)
+            self.mark_stale(search_type, [search_key])
+
+
+    def invalidate(self, search_type=None):
+        '''drop the copy of a search type, or of all of them'''
+        self.lock.acquire()
+        try:
+            if search_type:
+                keys = [self.get_key(search_type)]
+            else:
+                keys = [x[0] for x in self.conn.execute("SELECT key FROM mirror_state")]
+            for key in keys:
+                row = self.conn.execute("SELECT table_name FROM mirror_state WHERE key = ?", [key]).fetchone()
+                if row:
+                    self.conn.execute('DROP TABLE IF EXISTS "%s"' % row[0])
+                    self.conn.execute("DELETE FROM mirror_state WHERE key = ?", [key])
+                self.pending.pop(key, None)
+                self.stale.discard(key)
+            self.conn.commit()
+        finally:
+            self.lock.release()
+
+
+
+    #
+    # population
+    #
+    def _get_state(self, key):
+        row = self.conn.execute('''SELECT table_name, types, last_sync,
+                last_full, max_timestamp FROM mirror_state WHERE key = ?''', [key]).fetchone()
+        if not row:
+            return None
+        return {
+            'table_name': row[0],
+            'types': json.loads(row[1]),
+            'last_sync': row[2],
+            'last_full': row[3],
+            'max_timestamp': row[4],
+        }
+
+
+    def _save_state(self, key, state):
+        self.conn.execute('''INSERT OR REPLACE INTO mirror_state (key,
+                table_name, types, last_sync, last_full, max_timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)''', [key, state['table_name'],
+                json.dumps(state['types']), state['last_sync'],
+                state['last_full'], state['max_timestamp']])
+
+
+    def _get_type(self, value):
+        if isinstance(value, bool):
+            return 'bool'
+        if isinstance(value, (int, float)):
+            return 'number'
+        if isinstance(value, (dict, list, tuple)):
+            return 'json'
+        return 'text'
+
+
+    def _store(self, state, sobjects):
+        '''insert or replace sobjects in the table of a state'''
+        table = state['table_name']
+        types = state['types']
+        for sobject in sobjects:
+            for name, value in sobject.items():
+                if name not in types:
+                    self.conn.execute('ALTER TABLE "%s" ADD COLUMN "%s"' % (table, name.replace('"', '')))
+                    types[name] = None
+                if types[name] == None and value != None:
+                    types[name] = self._get_type(value)
+
+        for sobject in sobjects:
+            names = [x for x in sobject.keys() if x in types]
+            values = []
+            for name in names:
+                value = sobject.get(name)
+                if types[name] == 'json' and value != None:
+                    value = json.dumps(value)
+                values.append(value)
+            self.conn.execute('INSERT OR REPLACE INTO "%s" (%s) VALUES (%s)' % (
+                    table, ", ".join(['"%s"' % x for x in names]),
+                    ", ".join(["?"] * len(names))), values)
+
+
+    def sync(self, search_type, full=False):
+        '''bring the copy of a search type up to date'''
+        self.lock.acquire()
+        try:
+            key = self.get_key(search_type)
+            config = self.get_config(search_type)
+            state = self._get_state(key)
+            now = time.time()
+
+            if state and not full and config.get('full_ttl') and \
+                    now - state['last_full'] > config.get('full_ttl'):
+                full = True
+
+            if not state or full:
+                if state:
+                    self.conn.execute('DROP TABLE IF EXISTS "%s"' % state['table_name'])
+                state = {
+                    'table_name': "m_%s" % hashlib.sha1(key.encode("UTF8")).hexdigest()[:16],
+                    'types': {'__search_key__': 'text'},
+                    'last_sync': now,
+                    'last_full': now,
+                    'max_timestamp': None,
+                }
+                self.conn.execute('CREATE TABLE "%s" ("__search_key__" TEXT PRIMARY KEY)' % state['table_name'])
+                self.pending.pop(key, None)
+                filters = []
+            else:
+                filters = []
+                if state['max_timestamp']:
+                    filters.append( (config.get('timestamp_column'), '>=', state['max_timestamp']) )
+
+            sobjects = self.stub.query(key, filters, show_retired=True)
+            self._store(state, sobjects)
+
+            timestamp_column = config.get('timestamp_column')
+            for sobject in sobjects:
+                timestamp = sobject.get(timestamp_column)
+                if timestamp and (not state['max_timestamp'] or str(timestamp) > state['max_timestamp']):
+                    state['max_timestamp'] = str(timestamp)
+
+            self._refresh_pending(key, state)
+
+            for column in config.get('indexes') or []:
+                self._add_index(state, column)
+
+            state['last_sync'] = now
+            self._save_state(key, state)
+            self.conn.commit()
+            self.stale.discard(key)
+            self.syncs += 1
+            return state
+        finally:
+            self.lock.release()
+
+
+    def _refresh_pending(self, key, state):
+        '''fetch the sobjects which were changed through the stub again'''
+        search_keys = self.pending.pop(key, None)
+        if not search_keys:
+            return
+
+        # group the keys by the column that identifies them (code or id)
+        columns = {}
+        for search_key in search_keys:
+            param = search_key.split("?")[-1].split("&")[-1]
+            if param.find("=") == -1:
+                continue
+            column, value = param.split("=", 1)
+            columns.setdefault(column, []).append(value)
+
+        for column, values in columns.items():
+            sobjects = self.stub.query(key, [(column, 'in', values)], show_retired=True)
+            self._store(state, sobjects)
+
+            # the sobjects which were not returned have been deleted
+            found = set([str(x.get(column)) for x in sobjects])
+            for value in values:
+                if value not in found and column in state['types']:
+                    self.conn.execute('DELETE FROM "%s" WHERE CAST("%s" AS TEXT) = ?' % (state['table_name'], column), [value])
+
+
+    def _add_index(self, state, column):
+        if column not in state['types']:
+            return
+        table = state['table_name']
+        self.conn.execute('CREATE INDEX IF NOT EXISTS "%s_%s" ON "%s" ("%s")' % (table, column, table, column))
+
+
+
+    #
+    # queries
+    #
+    def _get_value(self, types, column, value):
+        '''convert a filter value to the type stored in a column, since
+        values of filters are often given as strings'''
+        if types.get(column) == 'number' and isinstance(value, string_types):
+            try:
+                if value.find(".") != -1:
+                    return float(value)
+                return int(value)
+            except ValueError:
+                return value
+        if types.get(column) == 'bool' and isinstance(value, string_types):
+            return value.lower() in ['true', 't', '1']
+        return value
+
+
+    def _get_column(self, types, column):
+        if not isinstance(column, string_types) or column not in types:
+            raise QueryMirrorException("Column [%s] is not in the mirror" % column)
+        return '"%s"' % column
+
+
+    def _like_to_glob(self, pattern):
+        '''sqlite LIKE is not case sensitive, so like filters are done with
+        GLOB'''
+        glob = []
+        for char in pattern:
+            if char == "%":
+                glob.append("*")
+            elif char == "_":
+                glob.append("?")
+            elif char in "*?[":
+                glob.append("[%s]" % char)
+            else:
+                glob.append(char)
+        return "".join(glob)
+
+
+    def _get_where(self, types, filters, show_retired):
+        wheres = []
+        params = []
+        for filter in filters or []:
+            if not isinstance(filter, (list, tuple)) or len(filter) not in [2, 3]:
+                raise QueryMirrorException("Filter [%s] is not supported by the mirror" % str(filter))
+
+            if len(filter) == 2:
+                column, value = filter
+                if isinstance(value, (list, tuple)):
+                    op = 'in'
+                else:
+                    op = '='
+            else:
+                column, op, value = filter
+                op = op.lower().strip()
+
+            name = self._get_column(types, column)
+
+            if op in ['in', 'not in']:
+                values = [self._get_value(types, column, x) for x in value]
+                if not values:
+                    wheres.append(op == 'in' and "0" or "1")
+                    continue
+                wheres.append("%s %s (%s)" % (name, op.upper(), ", ".join(["?"] * len(values))))
+                params.extend(values)
+            elif op == 'is' or (op == '=' and value == None):
+                if value not in [None, 'NULL']:
+                    raise QueryMirrorException("Filter [%s] is not supported by the mirror" % str(filter))
+                wheres.append("%s IS NULL" % name)
+            elif op == 'is not':
+                if value not in [None, 'NULL']:
+                    raise QueryMirrorException("Filter [%s] is not supported by the mirror" % str(filter))
+                wheres.append("%s IS NOT NULL" % name)
+            elif op in COMPARE_OPS:
+                if op == '<>':
+                    op = '!='
+                wheres.append("%s %s ?" % (name, op))
+                params.append(self._get_value(types, column, value))
+            elif op == 'like':
+                wheres.append("%s GLOB ?" % name)
+                params.append(self._like_to_glob(value))
+            elif op == 'ilike':
+                wheres.append("%s LIKE ?" % name)
+                params.append(value)
+            else:
+                raise QueryMirrorException("Operator [%s] is not supported by the mirror" % op)
+
+        if not show_retired and 's_status' in types:
+            wheres.append("(\"s_status\" IS NULL OR \"s_status\" != 'retired')")
+
+        return wheres, params
+
+
+    def _get_order(self, types, order_bys):
+        orders = []
+        for order_by in order_bys or []:
+            parts = order_by.split()
+            if len(parts) == 1:
+                direction = "ASC"
+            elif len(parts) == 2 and parts[1].lower() in ['asc', 'desc']:
+                direction = parts[1].upper()
+            else:
+                raise QueryMirrorException("Order by [%s] is not supported by the mirror" % order_by)
+            orders.append("%s %s" % (self._get_column(types, parts[0]), direction))
+        return orders
+
+
+    def _check(self, filters, order_bys):
+        '''check that a query can be answered before bringing the copy up
+        to date'''
+        for filter in filters or []:
+            if not isinstance(filter, (list, tuple)) or len(filter) not in [2, 3]:
+                raise QueryMirrorException("Filter [%s] is not supported by the mirror" % str(filter))
+            if len(filter) == 3:
+                op = filter[1].lower().strip()
+                if op not in COMPARE_OPS + ['in', 'not in', 'is', 'is not', 'like', 'ilike']:
+                    raise QueryMirrorException("Operator [%s] is not supported by the mirror" % op)
+        for order_by in order_bys or []:
+            if len(order_by.split()) > 2:
+                raise QueryMirrorException("Order by [%s] is not supported by the mirror" % order_by)
+
+
+    def query(self, search_type, filters=[], columns=[], order_bys=[],
+            show_retired=False, limit=None, offset=None, single=False):
+        '''query the copy of a search type.  The arguments are the same as
+        the query() method of the server stub
+
+        @return
+        list of dictionaries
+        '''
+        self._check(filters, order_bys)
+
+        self.lock.acquire()
+        try:
+            key = self.get_key(search_type)
+            config = self.get_config(search_type)
+            state = self._get_state(key)
+            ttl = config.get('ttl')
+            if not state or key in self.stale or key in self.pending or \
+                    (ttl != None and time.time() - state['last_sync'] > ttl):
+                state = self.sync(search_type)
+            else:
+                self.hits += 1
+
+            types = state['types']
+            wheres, params = self._get_where(types, filters, show_retired)
+            orders = self._get_order(types, order_bys)
+
+            if columns:
+                names = [x for x in columns if x in types]
+                if '__search_key__' not in names:
+                    names.append('__search_key__')
+            else:
+                names = list(types.keys())
+
+            # columns used in the query are indexed
+            for filter in filters or []:
+                self._add_index(state, filter[0])
+            for order_by in order_bys or []:
+                self._add_index(state, order_by.split()[0])
+
+            sql = "SELECT %s FROM \"%s\"" % (", ".join(['"%s"' % x for x in names]), state['table_name'])
+            if wheres:
+                sql = "%s WHERE %s" % (sql, " AND ".join(wheres))
+            if orders:
+                sql = "%s ORDER BY %s" % (sql, ", ".join(orders))
+            if single:
+                limit = 1
+            if limit or offset:
+                sql = "%s LIMIT ? OFFSET ?" % sql
+                params.extend([limit or -1, offset or 0])
+
+            results = []
+            for row in self.conn.execute(sql, params):
+                sobject = {}
+                for name, value in zip(names, row):
+                    if value != None:
+                        if types.get(name) == 'bool':
+                            value = bool(value)
+                        elif types.get(name) == 'json':
+                            value = json.loads(value)
+                    sobject[name] = value
+                results.append(sobject)
+        finally:
+            self.lock.release()
+
+        if single:
+            if results:
+                return results[0]
+            return {}
+        return results
+
+
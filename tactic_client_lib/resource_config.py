@@ -0,0 +1,169 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ResourceConfig']
+
+import os, threading
+
+
+class ResourceConfig(object):
+    '''The parsed contents of a resource (.tacticrc) file.  Resource files
+    are cached for the whole process and are only read again when their
+    modification time or size changes, so creating many server stubs only
+    costs a stat of the file.
+
+        config = ResourceConfig.get(resolve=server.get_resource_path)
+        if config.exists():
+            server_name = config.get_value("server")
+    '''
+
+    # login -> path of the resource file that was found for that login
+    paths = {}
+    # path -> ResourceConfig
+    configs = {}
+    lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.size = None
+        self.data = None
+
+
+    def exists(self):
+        return self.data != None
+
+
+    def get_value(self, name, default=None):
+        if not self.data:
+            return default
+        return self.data.get(name, default)
+
+
+    def get_data(self):
+        '''get a copy of all of the values of the resource file'''
+        return dict(self.data or {})
+
+
+    def get_path(self):
+        return self.path
+
+
+    def parse(cls, lines):
+        '''parse the lines of a resource file.  Only the first "=" separates
+        the name from the value, so values may contain "="
+
+        @return
+        dictionary: name to value
+        '''
+        data = {}
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.find("=") == -1:
+                continue
+            name, value = line.split("=", 1)
+            data[name.strip()] = value.strip()
+        return data
+    parse = classmethod(parse)
+
+
+    def _load(self, st):
+        f = open(self.path)
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+
+        self.data = self.parse(lines)
+        self.mtime = st.st_mtime
+        self.size = st.st_size
+
+
+
+    def get_by_path(cls, path):
+        '''get the config of a resource file, reading it only if it has
+        changed since it was last read
+
+        @return
+        ResourceConfig: exists() is False if the file does not exist
+        '''
+        try:
+            st = os.stat(path)
+        except OSError:
+            cls.lock.acquire()
+            try:
+                if path in cls.configs:
+                    del(cls.configs[path])
+            finally:
+                cls.lock.release()
+            return ResourceConfig(path)
+
+        cls.lock.acquire()
+        try:
+            config = cls.configs.get(path)
+            if config and config.mtime == st.st_mtime and config.size == st.st_size:
+                return config
+
+            config = ResourceConfig(path)
+            try:
+                config._load(st)
+            except IOError:
+                return config
+            cls.configs[path] = config
+            return config
+        finally:
+            cls.lock.release()
+    get_by_path = classmethod(get_by_path)
+
+
+
+    def get(cls, resolve, login=None):
+        '''get the config of the resource file of a login.  The location of
+        the file is remembered once it has been found, so it is only
+        resolved again if the file disappears.
+
+        @params
+        resolve: function taking the login and returning the path of the
+            resource file
+        login: the login, or None for the current user
+
+        @return
+        ResourceConfig
+        '''
+        path = cls.paths.get(login)
+        if path:
+            config = cls.get_by_path(path)
+            if config.exists():
+                return config
+
+        path = resolve(login)
+        config = cls.get_by_path(path)
+        if config.exists():
+            cls.paths[login] = path
+        return config
+    get = classmethod(get)
+
+
+
+    def clear(cls):
+        '''forget all of the cached resource files'''
+        cls.lock.acquire()
+        try:
+            cls.paths = {}
+            cls.configs = {}
+        finally:
+            cls.lock.release()
+    clear = classmethod(clear)
+
+
@@ -0,0 +1,256 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['ResultSet', 'RowView']
+
+try:
+    import xmlrpclib
+except:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+
+
+class RowView(object):
+    '''A read only view on a row of a ResultSet.  It behaves like the
+    dictionary of an sobject without holding its own copy of the values'''
+
+    __slots__ = ['result_set', 'index']
+
+    def __init__(self, result_set, index):
+        self.result_set = result_set
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.result_set.columns[name][self.index]
+
+    def get(self, name, default=None):
+        column = self.result_set.columns.get(name)
+        if column == None:
+            return default
+        return column[self.index]
+
+    def __contains__(self, name):
+        return name in self.result_set.columns
+
+    def keys(self):
+        return list(self.result_set.names)
+
+    def values(self):
+        return [self.result_set.columns[x][self.index] for x in self.result_set.names]
+
+    def items(self):
+        return [(x, self.result_set.columns[x][self.index]) for x in self.result_set.names]
+
+    def __iter__(self):
+        return iter(self.result_set.names)
+
+    def __len__(self):
+        return len(self.result_set.names)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, RowView):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+
+class ResultSet(object):
+    '''The results of a query stored as one list per column, instead of one
+    dictionary per sobject.
+
+        results = server.query("prod/shot", result_format='columnar')
+        for shot in results:
+            print(shot.get('code'))
+        codes = results.get_column('code')
+        arrays = results.to_numpy(['frame_start', 'frame_end'])
+
+    Columns missing in some of the sobjects have None in those rows.
+    '''
+
+    __slots__ = ['names', 'columns', 'count']
+
+    def __init__(self, names=None, columns=None, count=0):
+        self.names = names or []
+        self.columns = columns or {}
+        self.count = count
+
+
+    def from_rows(cls, rows):
+        '''build a result set from a list of dictionaries'''
+        builder = ColumnBuilder()
+        for row in rows or []:
+            builder.add_row(row.items())
+        return builder.get_result_set()
+    from_rows = classmethod(from_rows)
+
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield RowView(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            columns = dict([(x, self.columns[x][index]) for x in self.names])
+            count = len(range(*index.indices(self.count)))
+            return ResultSet(list(self.names), columns, count)
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("ResultSet index out of range")
+        return RowView(self, index)
+
+    def __repr__(self):
+        return "<ResultSet %s rows, columns %s>" % (self.count, self.names)
+
+
+    def get_names(self):
+        return list(self.names)
+
+    def get_column(self, name):
+        '''get the list of the values of a column'''
+        return self.columns[name]
+
+    def to_dicts(self):
+        '''get the rows as a list of dictionaries'''
+        return [row.to_dict() for row in self]
+
+
+    def is_numeric(self, name):
+        for value in self.columns[name]:
+            if value != None and not isinstance(value, (int, float)):
+                return False
+        return True
+
+
+    def to_numpy(self, names=None):
+        '''export numeric columns as numpy arrays.  Integer columns with
+        missing values are exported as floats with NaN
+
+        @params
+        names: the columns to export.  By default, all of the numeric
+            columns are exported
+
+        @return
+        dictionary: column name to numpy array
+        '''
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("ResultSet.to_numpy() requires numpy")
+
+        if names == None:
+            names = [x for x in self.names if self.is_numeric(x)]
+
+        arrays = {}
+        for name in names:
+            if not self.is_numeric(name):
+                raise ValueError("Column [%s] is not numeric" % name)
+            column = self.columns[name]
+            if None in column:
+                column = [x == None and float("nan") or x for x in column]
+                arrays[name] = numpy.array(column, dtype=float)
+            else:
+                arrays[name] = numpy.array(column)
+        return arrays
+
+
+
+class ColumnBuilder(object):
+    '''appends rows of (name, value) pairs to columns'''
+
+    def __init__(self):
+        self.names = []
+        self.columns = {}
+        self.count = 0
+
+    def add_row(self, items):
+        count = self.count
+        for name, value in items:
+            column = self.columns.get(name)
+            if column == None:
+                column = [None] * count
+                self.columns[name] = column
+                self.names.append(name)
+            column.append(value)
+        self.count = count + 1
+
+        # pad the columns missing in this row
+        if len(self.columns) != len(items):
+            for column in self.columns.values():
+                if len(column) == count:
+                    column.append(None)
+
+    def get_result_set(self):
+        return ResultSet(self.names, self.columns, self.count)
+
+
+
+class ColumnarUnmarshaller(xmlrpclib.Unmarshaller):
+    '''Unmarshaller which decodes a response made of a list of structs
+    directly into a ResultSet.  The values of each struct are appended to
+    the columns as soon as the struct is parsed, so no dictionary is built
+    per row.  Any other response is decoded as usual.
+    '''
+
+    dispatch = dict(xmlrpclib.Unmarshaller.dispatch)
+
+    def __init__(self, *args, **kwargs):
+        xmlrpclib.Unmarshaller.__init__(self, *args, **kwargs)
+        self.builder = ColumnBuilder()
+        self.top_array = False
+
+
+    def start(self, tag, attrs):
+        if not self._marks and (tag == "array" or tag == "struct"):
+            self.top_array = tag == "array"
+        return xmlrpclib.Unmarshaller.start(self, tag, attrs)
+
+
+    def end_struct(self, data):
+        # only structs directly in the top level array are rows
+        if len(self._marks) != 2 or not self.top_array:
+            return xmlrpclib.Unmarshaller.end_struct(self, data)
+
+        mark = self._marks.pop()
+        items = self._stack[mark:]
+        self.builder.add_row( [(items[i], items[i+1]) for i in range(0, len(items), 2)] )
+        del self._stack[mark:]
+        self._value = 0
+    dispatch["struct"] = end_struct
+
+
+    def end_array(self, data):
+        if len(self._marks) != 1:
+            return xmlrpclib.Unmarshaller.end_array(self, data)
+
+        mark = self._marks.pop()
+        if self._stack[mark:]:
+            # not a list of structs
+            self._stack[mark:] = [self._stack[mark:]]
+        else:
+            self._stack[mark:] = [self.builder.get_result_set()]
+        self._value = 0
+    dispatch["array"] = end_array
+
+
@@ -13,3 +13,4 @@ from delegate import *
 from subversion import *
 from perforce import *
 
+from delegate_server import *
@@ -24,10 +24,13 @@ import pprint
 
 from subversion import Subversion
 from perforce import PerforceImpl
+from scm_impl import ScmException
 
 class BaseCmd():
 
-    def __init__(self, **kwargs):
+    def __init__(self, scm=None, **kwargs):
+        '''scm is an already connected scm implementation to use instead
+        of connecting a new one'''
         self.kwargs = kwargs
         self.ret_val = {}
 
@@ -40,8 +43,10 @@ class BaseCmd():
 
         sync_path = self.kwargs.get("sync_path")
 
-        #self.scm = Subversion(user=user, password=password)
-        self.scm = PerforceImpl(**kwargs)
+        if not scm:
+            #scm = Subversion(user=user, password=password)
+            scm = PerforceImpl(**kwargs)
+        self.scm = scm
         self.scm.set_root(root)
         self.scm.set_branch(branch)
         self.scm.set_sync_dir(sync_dir)
@@ -55,10 +60,18 @@ class DelegateCmd(BaseCmd):
     def execute(self):
         method = self.kwargs.get("method")
         args = self.kwargs.get("args")
+
+        # only public methods of the scm can be called
+        if not method or method.startswith("_"):
+            raise ScmException("Invalid method [%s]" % method)
+        func = getattr(self.scm, method, None)
+        if not callable(func):
+            raise ScmException("Method [%s] does not exist" % method)
+
         if args:
-            ret_val = eval("self.scm.%s(*args)" % method)
+            ret_val = func(*args)
         else:
-            ret_val = eval("self.scm.%s()" % method)
+            ret_val = func()
 
         return {
            "value": ret_val,
@@ -79,12 +92,21 @@ class CmdWrapper():
 
 
 
-def run(kwargs=None):
-
+def get_tactic_data_dir():
     if os.name == "nt":
-        tactic_data = "C:/ProgramData/Tactic"
+        return "C:/ProgramData/Tactic"
     else:
-        tactic_data = "/tmp/perforce"
+        return "/tmp/perforce"
+
+
+
+def run(kwargs=None, job_id=None):
+    '''Run a single command with the kwargs in kwargs.json and write the
+    result to output.json.  If a job_id is given, the files are in a
+    directory of their own so that concurrent callers do not overwrite
+    each other's files.'''
+
+    tactic_data = get_tactic_data_dir()
 
     cmd = None
 
@@ -93,8 +115,11 @@ def run(kwargs=None):
 
 
         base = "%s/temp/output" % tactic_data
+        if job_id:
+            base = "%s/%s" % (base, job_id)
         if not os.path.exists(base):
-            os.makedirs(base)
+            # the kwargs hold the scm password
+            os.makedirs(base, int("700", 8))
 
         kwargs_path = "%s/kwargs.json" % base
         output_path = "%s/output.json" % base
@@ -178,4 +203,7 @@ def run(kwargs=None):
 
 
 if __name__ == '__main__':
-    run()
+    if len(sys.argv) > 1:
+        run(job_id=sys.argv[1])
+    else:
+        run()
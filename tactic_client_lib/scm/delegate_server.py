@@ -0,0 +1,317 @@
+############################################################
+#
+#    Copyright (c) 2012, Southpaw Technology
+#                        All Rights Reserved
+#
+#    PROPRIETARY INFORMATION.  This software is proprietary to
+#    Southpaw Technology, and is not to be reproduced, transmitted,
+#    or disclosed in any way without written permission.
+#
+#
+__all__ = ['DelegateServer', 'DelegateClient']
+
+import os, sys, socket, threading, traceback, hashlib, hmac, binascii
+try:
+    import json
+except:
+    import simplejson as json
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    # Python3
+    import socketserver
+
+from perforce import PerforceImpl
+from scm_impl import ScmException
+from delegate import DelegateCmd, get_tactic_data_dir
+
+from tactic_client_lib.common.common import Common
+
+
+def get_proof(token, challenge):
+    '''the answer of a server holding the token to a client's challenge'''
+    return hmac.new(token.encode("UTF8"), challenge.encode("UTF8"), hashlib.sha256).hexdigest()
+
+
+
+class DelegateRequestHandler(socketserver.StreamRequestHandler):
+    '''Each line sent by the client is a json request and the result of each
+    request is sent back as a json line as soon as it is done'''
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                request = json.loads(line.decode("UTF8"))
+            except ValueError as e:
+                ret_val = { "status": "error", "msg": "Invalid request: %s" % e }
+            else:
+                ret_val = self.server.execute(request)
+
+            data = "%s\n" % json.dumps(ret_val)
+            self.wfile.write(data.encode("UTF8"))
+            self.wfile.flush()
+
+
+
+class DelegateServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    '''Long lived delegate which keeps the connections to the scm servers
+    open between commands.  It listens on the local machine only.  Every
+    request must carry the token that is written, readable only by this
+    user, in the tactic data directory.
+
+    Any process may listen on the port, so a client first sends a
+    challenge and the server proves that it holds the token before any
+    credentials are sent:
+
+        {"challenge": "..."} -> {"proof": "..."}
+
+    Requests have the same kwargs as DelegateCmd:
+
+        {"id": 1, "token": "...", "kwargs": {"method": "status", ...}}
+
+    Commands on the same connection are executed one after the other.
+    Commands from different clients run in parallel.
+    '''
+
+    DEFAULT_PORT = 9191
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    CMD_CLASSES = {
+        'DelegateCmd': DelegateCmd,
+    }
+
+    def __init__(self, port=None, token=None):
+        if not port:
+            port = self.DEFAULT_PORT
+        socketserver.TCPServer.__init__(self, ("127.0.0.1", port), DelegateRequestHandler)
+
+        if not token:
+            token = binascii.hexlify(os.urandom(16)).decode("UTF8")
+            self.write_token(token)
+        self.token = token
+
+        # key -> (scm implementation, lock)
+        self.scms = {}
+        self.scms_lock = threading.Lock()
+
+
+    def get_token_path(cls):
+        return "%s/temp/delegate.token" % get_tactic_data_dir()
+    get_token_path = classmethod(get_token_path)
+
+
+    def write_token(self, token):
+        path = self.get_token_path()
+        dir = os.path.dirname(path)
+        if not os.path.exists(dir):
+            os.makedirs(dir, int("700", 8))
+        # the temp dir may be shared, so another user could read or
+        # replace the token
+        if not Common.check_private_path(dir):
+            raise ScmException("Token directory [%s] is not private" % dir)
+        if os.path.lexists(path):
+            os.remove(path)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, int("600", 8))
+        f = os.fdopen(fd, 'w')
+        f.write(token)
+        f.close()
+
+
+    def get_scm_key(self, kwargs):
+        password = kwargs.get("password") or ""
+        password_hash = hashlib.sha1(password.encode("UTF8")).hexdigest()
+        return (
+            kwargs.get("port"),
+            kwargs.get("user"),
+            kwargs.get("client"),
+            kwargs.get("depot"),
+            kwargs.get("sync_dir"),
+            password_hash,
+        )
+
+
+    def get_scm(self, kwargs):
+        '''get a connected scm implementation for these kwargs, creating it
+        if necessary'''
+        key = self.get_scm_key(kwargs)
+        self.scms_lock.acquire()
+        try:
+            item = self.scms.get(key)
+            if not item:
+                item = (PerforceImpl(**kwargs), threading.Lock())
+                self.scms[key] = item
+            return item
+        finally:
+            self.scms_lock.release()
+
+
+    def execute(self, request):
+        request_id = request.get("id")
+        if "challenge" in request:
+            return {
+                "id": request_id,
+                "proof": get_proof(self.token, "%s" % request.get("challenge"))
+            }
+
+        if request.get("token") != self.token:
+            return {
+                "id": request_id,
+                "status": "error",
+                "msg": "Invalid token"
+            }
+
+        kwargs = request.get("kwargs") or {}
+        kwargs2 = {}
+        for key, value in kwargs.items():
+            kwargs2[str(key)] = value
+
+        cmd = None
+        try:
+            class_name = kwargs2.get("class_name") or "DelegateCmd"
+            cmd_class = self.CMD_CLASSES.get(class_name)
+            if not cmd_class:
+                raise ScmException("Command [%s] is not supported" % class_name)
+
+            scm, lock = self.get_scm(kwargs2)
+            lock.acquire()
+            try:
+                scm.check_connection()
+                # keep the log of each command separate
+                scm.log = []
+                cmd = cmd_class(scm=scm, **kwargs2)
+                ret_val = cmd.execute()
+            finally:
+                lock.release()
+
+            ret_val['status'] = 'OK'
+
+        except Exception as e:
+            tb = sys.exc_info()[2]
+            stacktrace = traceback.format_tb(tb)
+            stacktrace_str = "".join(stacktrace)
+
+            ret_val = {
+                "status": "error" ,
+                "msg": "%s" % e,
+                "stack_trace": stacktrace_str
+            }
+            if cmd:
+                ret_val['log'] = cmd.get_log()
+
+        ret_val['id'] = request_id
+        return ret_val
+
+
+
+
+class DelegateClient(object):
+    '''Sends commands to a running DelegateServer.  The server has to
+    prove that it holds the token before any command is sent
+
+        client = DelegateClient()
+        ret_val = client.execute(method="status", port="perforce:1666", ...)
+    '''
+
+    def __init__(self, port=None, token=None, timeout=None):
+        if not port:
+            port = DelegateServer.DEFAULT_PORT
+        if not token:
+            path = DelegateServer.get_token_path()
+            if not Common.check_private_path(os.path.dirname(path)) or \
+                    not Common.check_private_path(path, is_dir=False):
+                raise ScmException("Token [%s] is not private" % path)
+            f = open(path, 'r')
+            token = f.read().strip()
+            f.close()
+        self.token = token
+
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout)
+        self.rfile = self.sock.makefile('rb')
+        self.count = 0
+
+        try:
+            self.check_server()
+        except:
+            self.close()
+            raise
+
+
+    def check_server(self):
+        '''make sure that the server listening on the port holds the token'''
+        challenge = binascii.hexlify(os.urandom(16)).decode("UTF8")
+        data = "%s\n" % json.dumps({"challenge": challenge})
+        self.sock.sendall(data.encode("UTF8"))
+
+        proof = ("%s" % self._receive().get("proof")).encode("UTF8")
+        expected = get_proof(self.token, challenge).encode("UTF8")
+        if hasattr(hmac, "compare_digest"):
+            is_valid = hmac.compare_digest(proof, expected)
+        else:
+            is_valid = proof == expected
+        if not is_valid:
+            raise ScmException("Delegate server does not hold the token")
+
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+    def _send(self, kwargs):
+        self.count += 1
+        request = {
+            "id": self.count,
+            "token": self.token,
+            "kwargs": kwargs
+        }
+        data = "%s\n" % json.dumps(request)
+        self.sock.sendall(data.encode("UTF8"))
+
+
+    def _receive(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ScmException("Delegate server closed the connection")
+        return json.loads(line.decode("UTF8"))
+
+
+    def execute(self, **kwargs):
+        '''execute a single command and return its result'''
+        self._send(kwargs)
+        return self._receive()
+
+
+    def execute_many(self, kwargs_list):
+        '''send many commands at once.  The results are yielded as they
+        come back from the server, in the same order as the commands'''
+        for kwargs in kwargs_list:
+            self._send(kwargs)
+        for kwargs in kwargs_list:
+            yield self._receive()
+
+
+
+def serve(port=None):
+    server = DelegateServer(port=port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        serve(int(sys.argv[1]))
+    else:
+        serve()
+
@@ -14,6 +14,7 @@ __all__ = ['PerforceImpl']
 import os
 
 from scm_impl import ScmImpl, ScmException
+from perforce_status import PerforceStatus
 
 try:
     from P4 import P4, P4Exception
@@ -22,6 +23,47 @@ except Exception, e:
     HAS_PERFORCE = False
     P4 = None
 
+try:
+    from P4 import Progress as P4Progress
+except Exception, e:
+    P4Progress = object
+
+
+
+class PerforceProgress(P4Progress):
+    '''Collects the progress reported by Perforce for the current command so
+    that it can be summarized in the log'''
+
+    def __init__(self):
+        self.description = None
+        self.units = None
+        self.total = 0
+        self.position = 0
+        self.failed = False
+
+    def init(self, type):
+        self.total = 0
+        self.position = 0
+        self.failed = False
+
+    def setDescription(self, description, units):
+        self.description = description
+        self.units = units
+
+    def setTotal(self, total):
+        self.total = total
+
+    def update(self, position):
+        self.position = position
+
+    def done(self, fail):
+        self.failed = bool(fail)
+
+    def get_summary(self):
+        if not self.description:
+            return None
+        return "%s: %s/%s (%s)%s" % (self.description, self.position, self.total, self.units, self.failed and " FAILED" or "")
+
 
 class PerforceImpl(ScmImpl):
 
@@ -36,6 +78,14 @@ class PerforceImpl(ScmImpl):
 
         self.sync_dir = self.kwargs.get("sync_dir")
 
+        # number of threads used to scan the workspace
+        self.threads = self.kwargs.get("threads") or 8
+
+        # number of threads Perforce uses to transfer files on sync and
+        # submit.  The server must have net.parallel.max set for this to
+        # have an effect
+        self.parallel = self.kwargs.get("parallel") or 0
+
 
         if not self.depot:
             self.depot = "depot"
@@ -68,6 +118,10 @@ class PerforceImpl(ScmImpl):
         if client:
             self.p4.client = str(client)
 
+        self.progress = PerforceProgress()
+        if P4Progress is not object:
+            self.p4.progress = self.progress
+
         self.p4.connect()
         #self.log.append(str(self.p4.run("info")))
 
@@ -79,6 +133,12 @@ class PerforceImpl(ScmImpl):
         return "OK"
 
 
+    def check_connection(self):
+        if not self.p4.connected():
+            self.log.append("p4 reconnect")
+            self.p4.connect()
+
+
     #
     # user specific functions
     #
@@ -195,53 +255,122 @@ class PerforceImpl(ScmImpl):
         self.p4.save_client(clientspec)
 
 
-    def add(self, path, changelist="default"):
+    def _get_paths(self, paths):
+        if isinstance(paths, basestring):
+            return [paths]
+        return list(paths)
+
+
+    def _log_paths(self, cmd, paths):
+        if len(paths) == 1:
+            self.log.append("%s %s" % (cmd, paths[0]))
+        else:
+            self.log.append("%s (%s files)" % (cmd, len(paths)))
+
 
+    def add(self, paths, changelist="default"):
+        '''add one or a list of files in a single command'''
         if not changelist:
             changelist = "default"
 
+        paths = self._get_paths(paths)
+        if not paths:
+            return []
 
-        self.log.append("p4 add -c %s %s" % (changelist, path))
-        self.p4.run("add", "-c", changelist, path)
+        self._log_paths("p4 add -c %s" % changelist, paths)
+        return self.p4.run("add", "-c", changelist, paths)
 
 
-    def checkout(self, repo_dir, recurse=None, depth=None):
+    def _get_parallel_args(self, parallel=None):
+        if parallel == None:
+            parallel = self.parallel
+        if parallel and int(parallel) > 1:
+            return ["--parallel=threads=%s" % int(parallel)]
+        return []
+
+
+    def _log_progress(self):
+        summary = self.progress.get_summary()
+        if summary:
+            self.log.append(summary)
+        self.progress.description = None
 
-        if not repo_dir.startswith("//"):
-            repo_dir = "//%s/%s" % (self.depot, repo_dir)
-        if not repo_dir.endswith("/..."):
-            repo_dir = "%s/..." % repo_dir
 
-        self.log.append("sync -f %s" % repo_dir)
+    def sync(self, paths, force=False, parallel=None):
+        '''sync one or a list of depot paths in a single command
+
+        @params
+          paths: a depot path or a list of depot paths
+          force: resync files even if they are up-to-date
+          parallel: the number of threads to transfer the files.  Defaults
+            to the "parallel" the implementation was created with
+
+        @return
+          dictionary: "value" of client file to action and "error" list
+        '''
+        paths = self._get_paths(paths)
+
+        args = ["sync"]
+        if force:
+            args.append("-f")
+        args.extend( self._get_parallel_args(parallel) )
+
+        self._log_paths("p4 %s" % " ".join(args), paths)
         try:
-            #print "sync", "-f", repo_dir
-            sync_data = self.p4.run("sync", "-f", repo_dir)
+            sync_data = self.p4.run(args, paths)
         except Exception, e:
-            if str(e).find("up-to-date") == -1:
+            # files which are up-to-date or are not in the depot yet, ie:
+            # new files being delivered, are only warnings
+            if getattr(self.p4, "errors", None):
+                raise
+            if str(e).find("up-to-date") == -1 and str(e).find("no such file") == -1:
                 raise
             else:
                 sync_data = []
-
-
-        #print "sync: ", sync_data
+        self._log_progress()
 
         data = {}
         error = []
+        total_size = 0
         for entry in sync_data:
             if isinstance(entry, basestring):
                 # if the entry is a string, then it is likely an error
                 error.append(entry)
             else:
                 data[entry.get("clientFile")] = entry.get("action")
+                total_size += int(entry.get("fileSize") or 0)
+
+        self.log.append("synced %s files (%s bytes)" % (len(data), total_size))
 
         return {
             "value": data,
             "error": error
         }
 
+
+    def checkout(self, repo_dir, recurse=None, depth=None, parallel=None):
+
+        if not repo_dir.startswith("//"):
+            repo_dir = "//%s/%s" % (self.depot, repo_dir)
+        if not repo_dir.endswith("/..."):
+            repo_dir = "%s/..." % repo_dir
+
+        return self.sync(repo_dir, force=True, parallel=parallel)
+
+
     def checkout_file(self, repo_path):
-        # ????
-        self.p4.run("sync", "-f", repo_path)
+        return self.checkout_files([repo_path])
+
+
+    def checkout_files(self, repo_paths, parallel=None):
+        '''force sync a list of files in a single command.  Files which
+        are not in the depot are skipped'''
+        paths = []
+        for repo_path in self._get_paths(repo_paths):
+            if not repo_path.startswith("//") and not os.path.isabs(repo_path):
+                repo_path = "//%s/%s" % (self.depot, repo_path)
+            paths.append(repo_path)
+        return self.sync(paths, force=True, parallel=parallel)
 
 
     def revert(self, sync_path):
@@ -255,11 +384,17 @@ class PerforceImpl(ScmImpl):
         return self.p4.run("revert", sync_path)
 
 
-    def edit(self, repo_path, changelist="default"):
+    def edit(self, repo_paths, changelist="default"):
+        '''open one or a list of files for edit in a single command'''
         if not changelist:
             changelist = 'default'
-        self.log.append("p4 edit -c %s %s" % (changelist, repo_path))
-        return self.p4.run("edit", "-c", changelist, repo_path )
+
+        repo_paths = self._get_paths(repo_paths)
+        if not repo_paths:
+            return []
+
+        self._log_paths("p4 edit -c %s" % changelist, repo_paths)
+        return self.p4.run("edit", "-c", changelist, repo_paths)
 
 
 
@@ -279,149 +414,160 @@ class PerforceImpl(ScmImpl):
 
 
     def commit_file(self, path, description, keep_editable=False):
-        '''Commit a bunch of files'''
-
+        '''Commit a single file'''
+        return self.commit_files([path], description, keep_editable=keep_editable)
+
+
+    def commit_files(self, paths, description, keep_editable=False, parallel=None):
+        '''Commit a bunch of files in a single changelist.  The files are
+        added or opened for edit in batches depending on their status and
+        are then submitted with one command
+
+        @params
+          paths: list of paths, absolute or relative to the sync dir
+          description: the description of the changelist
+          keep_editable: keep the files open after submitting
+          parallel: the number of threads to transfer the files
+        '''
+        paths = self._get_paths(paths)
+        if not paths:
+            return []
+
+        full_paths = []
+        for path in paths:
+            path = path.replace("\\", "/")
+            if not path.startswith(self.sync_dir):
+                path = "%s/%s" % (self.sync_dir, path)
+            full_paths.append(path)
+
+        # get the status of all of the files at once
+        dirs = {}
+        for path in full_paths:
+            dirs[os.path.dirname(path)] = True
+        if len(full_paths) == 1:
+            status = self.status(full_paths[0])
+        elif len(dirs) == 1:
+            status = self.status(list(dirs.keys())[0])
+        else:
+            status = self.status()
+
+        to_add = []
+        to_edit = []
+        to_sync = []
+        to_reopen = []
+        for path in full_paths:
+            file_status = status.get(path)
+            if file_status in [None, 'unversioned']:
+                # if this file is unknown, then add it.
+                to_add.append(path)
+            elif file_status == 'missing':
+                to_sync.append(path)
+            elif file_status in ['modified', 'same']:
+                # not really sure how it can be "modified" without having
+                # edited it.
+                to_edit.append(path)
+            elif file_status in ['added', 'editable']:
+                # already opened, possibly in another changelist.  p4 edit
+                # would raise a warning for these
+                to_reopen.append(path)
+
+        # put everything in a new changelist so that the files can be
+        # submitted with one command
+        changelist = self.get_change_number( self.add_changelist(description) )
 
-        if not path.startswith(self.sync_dir):
-            path = "%s/%s" % (self.sync_dir, path)
+        try:
+            if to_sync:
+                self.checkout_files(to_sync, parallel=parallel)
+            self.add(to_add, changelist)
+            self.edit(to_edit, changelist)
 
-        status = self.status(path).get(path)
+            if to_reopen:
+                self._log_paths("p4 reopen -c %s" % changelist, to_reopen)
+                self.p4.run("reopen", "-c", changelist, to_reopen)
 
-        if status == 'unversioned':
-            self.add(path)
-        elif status == 'missing':
-            self.checkout_file(path)
+            return self.commit_changelist(changelist, description, keep_editable=keep_editable, parallel=parallel)
+        except:
+            self.delete_changelist(changelist)
+            raise
 
-        elif status == 'modified':
-            # not really sure how it can be "modified" without having
-            # edited it.
-            self.edit(path)
-        elif status == 'same':
-            self.edit(path)
-        elif status == None:
-            # if this file is unknown, then add it.
-            self.add(path)
 
-        # first create a new changelist
-        #changelist = self.add_changelist(description)
+    def commit_changelist(self, changelist="default", description="", keep_editable=None, parallel=None):
+        '''submit a whole changelist in one command.  By default, files
+        of numbered changelists are kept open (-r)'''
+        if keep_editable == None:
+            keep_editable = changelist not in [None, 'default']
 
-        # NOTE: you can only submit individual file to check-in
-        # from the default changelist
-        self.log.append("p4 submit -r -d \"%s\" \"%s\"" % (description, path))
+        args = ["submit"]
         if keep_editable:
-            ret_val = self.p4.run("submit", "-r", "-d", description, path)
-        else:
-            ret_val = self.p4.run("submit", "-d", description, path)
-        return ret_val
+            args.append("-r")
+        args.extend( self._get_parallel_args(parallel) )
 
-
-    def commit_changelist(self, changelist="default", description=""):
-        keep_open = False       # -r option
         if changelist in [None, 'default']:
-            self.log.append("p4 submit -d \"%s\"" % description)
-            ret_val = self.p4.run("submit", "-d", description)
+            self.log.append("p4 %s -d \"%s\"" % (" ".join(args), description))
+            ret_val = self.p4.run(args, "-d", description)
         else:
-            self.log.append("p4 submit -r -c %s" % changelist)
-            ret_val = self.p4.run("submit", "-r", "-c", changelist)
+            self.log.append("p4 %s -c %s" % (" ".join(args), changelist))
+            ret_val = self.p4.run(args, "-c", changelist)
+        self._log_progress()
+
+        for entry in ret_val:
+            if isinstance(entry, dict) and entry.get("submittedChange"):
+                self.log.append("submitted change %s" % entry.get("submittedChange"))
         return ret_val
 
 
 
 
     def status(self, sync_dir=None):
-
-        if not sync_dir:
-            sync_dir = self.sync_dir
-
-
-        sync_expr = sync_dir
-        if sync_expr:
-            if os.path.isdir(sync_expr) and not sync_expr.endswith("/..."):
-                sync_expr = "%s/..." % sync_expr
-
-        # FIXME: this might be slow on huge repositories
-
-        try:
-            if sync_expr:
-                self.log.append("p4 diff -sl -f %s"  % sync_expr)
-                diff = self.p4.run("diff", "-sl", "-f", sync_expr)
-            else:
-                self.log.append("p4 diff -sl -f")
-                diff = self.p4.run("diff", "-sl", "-f")
-
-        except Exception, e:
-            # if there is an exception, likely this is because there are 
-            # no files on the client and Perforce does not like this
-            print "WARNING: ", e
-            print self.p4.run("info")
-            diff = []
-
-
-        info = {}
-        for entry in diff:
-            client_file = entry.get("clientFile")
-            client_file = client_file.replace("\\", "/")
-            if not client_file.startswith(sync_dir):
-                client_file = "%s/%s" % (sync_dir, client_file)
-            status = entry.get("status")
-            if status == 'diff':
-                info[client_file] = 'modified'
-            else:
-                info[client_file] = status
-
-
-        # find opened files
-        opened_files = self.p4.run("opened")
-        new_files = {} 
-        for opened_file in opened_files:
-            if opened_file['action'] != 'add':
-                continue
-            path = opened_file['depotFile']
-            path = path.replace("//%s" % self.depot, self.sync_dir)
-            new_files[path] = 'add'
-
-        for root, dirnames, basenames in os.walk(sync_dir):
-            for dirname in dirnames:
-                client_path = "%s/%s" % (root, dirname)
-                client_path = "%s/%s" % (root, dirname)
-                client_path = client_path.replace("\\", "/")
-
-                if client_path.find("/.tactic") != -1:
-                    continue
-
-                info[client_path] = 'directory'
-
-            for basename in basenames:
-                client_path = "%s/%s" % (root, basename)
-                client_path = client_path.replace("\\", "/")
-
-                # ignore .tactic directory
-                if client_path.find("/.tactic") != -1:
-                    continue
-
-                status = info.get(client_path)
-
-                if new_files.get(client_path):
-                    info[client_path] = 'added'
-                elif not status:
-                    info[client_path] = 'unversioned'
-                elif status == 'same' and os.access(client_path, os.W_OK):
-                    info[client_path] = 'editable'
-
-
-        return info
-
+        '''get the status of all of the files in the sync dir.  See
+        PerforceStatus'''
+        status = PerforceStatus(self, threads=self.threads)
+        return status.execute(sync_dir)
 
 
 
     def add_changelist(self, description, changelist=None):
+        '''create a new, empty, numbered changelist
+
+        @return
+          the info returned by Perforce, ie: ["Change 1234 created."].  See
+          get_change_number()
+        '''
         changespec = self.p4.fetch_change()
         changespec['Description'] = description
         changespec['User'] = self.user
+        # do not move the files of the default changelist
+        changespec['Files'] = []
         info = self.p4.save_change(changespec)
+        self.log.append("p4 change: %s" % self.get_change_number(info))
         return info
 
 
+    def get_change_number(self, info):
+        '''get the number of a changelist from the info returned when it
+        was saved'''
+        # info is of the form ["Change 1234 created."]
+        if isinstance(info, list):
+            info = info[0]
+        return str(info).split()[1]
+
+
+    def delete_changelist(self, changelist):
+        '''delete a pending changelist.  Its opened files are moved back to
+        the default changelist'''
+        try:
+            files = self.get_changelist_files(changelist)
+            paths = [x.get("depotFile") for x in files if isinstance(x, dict)]
+            if paths:
+                self._log_paths("p4 reopen -c default", paths)
+                self.p4.run("reopen", "-c", "default", paths)
+            self.log.append("p4 change -d %s" % changelist)
+            self.p4.run("change", "-d", changelist)
+        except Exception as e:
+            # the changelist may have been submitted
+            print("WARNING: %s" % e)
+
+
     def get_changelist_files(self, changelist='default'):
         files = self.p4.run("opened", "-c", changelist)
         return files
@@ -0,0 +1,366 @@
+############################################################
+#
+#    Copyright (c) 2012, Southpaw Technology
+#                        All Rights Reserved
+#
+#    PROPRIETARY INFORMATION.  This software is proprietary to
+#    Southpaw Technology, and is not to be reproduced, transmitted,
+#    or disclosed in any way without written permission.
+#
+#
+
+__all__ = ['PerforceStatus', 'scan_dir', 'escape_path']
+
+import os, stat
+from multiprocessing.pool import ThreadPool
+
+from scm_impl import ScmException
+
+try:
+    import json
+except:
+    import simplejson as json
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+
+# characters which are wildcards or revision specifiers in Perforce.  The
+# percent sign has to be escaped first
+P4_ESCAPES = [('%', '%25'), ('@', '%40'), ('#', '%23'), ('*', '%2A')]
+
+def escape_path(path):
+    '''escape the characters of a file name which Perforce would otherwise
+    take as a wildcard or a revision, like p4 add -f does'''
+    for char, escape in P4_ESCAPES:
+        path = path.replace(char, escape)
+    return path
+
+
+
+def _scan_one_dir(dir):
+    '''list a single directory.  Returns a list of sub directories and a list
+    of (path, size, mtime, writable) for the files'''
+    dirs = []
+    files = []
+
+    if scandir:
+        try:
+            entries = list(scandir(dir))
+        except OSError:
+            return dirs, files
+
+        for entry in entries:
+            path = "%s/%s" % (dir, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files.append( (path, st.st_size, st.st_mtime, bool(st.st_mode & stat.S_IWUSR)) )
+
+    else:
+        try:
+            names = os.listdir(dir)
+        except OSError:
+            return dirs, files
+
+        for name in names:
+            path = "%s/%s" % (dir, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append(path)
+            else:
+                files.append( (path, st.st_size, st.st_mtime, bool(st.st_mode & stat.S_IWUSR)) )
+
+    return dirs, files
+
+
+
+def scan_dir(root, threads=8, ignore=None):
+    '''Recursively scan a directory tree.  Each level of the tree is listed
+    in parallel over a pool of threads.
+
+    @params
+      root: the directory to scan
+      threads: the number of threads listing directories
+      ignore: function which returns True for directories to skip
+
+    @return
+      tuple: list of directories, dictionary of file path to
+        (size, mtime, writable)
+    '''
+    root = root.replace("\\", "/").rstrip("/")
+
+    all_dirs = []
+    all_files = {}
+
+    pool = None
+    if threads > 1:
+        pool = ThreadPool(threads)
+
+    try:
+        level = [root]
+        while level:
+            if pool and len(level) > 1:
+                results = pool.map(_scan_one_dir, level)
+            else:
+                results = [_scan_one_dir(x) for x in level]
+
+            level = []
+            for dirs, files in results:
+                for dir in dirs:
+                    if ignore and ignore(dir):
+                        continue
+                    all_dirs.append(dir)
+                    level.append(dir)
+                for path, size, mtime, writable in files:
+                    all_files[path] = (size, mtime, writable)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return all_dirs, all_files
+
+
+
+
+
+class PerforceStatus(object):
+    '''Determines the status of the files in a Perforce workspace.
+
+    A single "p4 fstat" gives the have revision and open action of every
+    file.  The local files are scanned in parallel and compared by size and
+    modification time with an index, persisted in the .tactic directory of
+    the sync dir, of files that were previously found to be the same or
+    modified.  Only files which do not match the index are diffed by
+    Perforce.
+    '''
+
+    INDEX_VERSION = 1
+    DIFF_CHUNK_SIZE = 500
+
+    def __init__(self, impl, threads=8):
+        self.impl = impl
+        self.p4 = impl.p4
+        self.log = impl.log
+        self.threads = threads
+
+        self.index_path = None
+        self.index = {}
+
+
+    def _ignore(self, path):
+        return path.find("/.tactic") != -1
+
+
+    #
+    # index functions
+    #
+    def get_index_path(self, sync_dir):
+        base_dir = self.impl.sync_dir or sync_dir
+        if not base_dir or os.path.isfile(base_dir):
+            return None
+        return "%s/.tactic/p4_status.json" % base_dir
+
+
+    def load_index(self):
+        self.index = {}
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+
+        try:
+            f = open(self.index_path, 'r')
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return
+
+        if data.get("version") == self.INDEX_VERSION:
+            self.index = data.get("files") or {}
+
+
+    def save_index(self):
+        if not self.index_path:
+            return
+
+        data = {
+            'version': self.INDEX_VERSION,
+            'files': self.index
+        }
+
+        tmp_path = "%s.%s" % (self.index_path, os.getpid())
+        try:
+            dir = os.path.dirname(self.index_path)
+            if not os.path.exists(dir):
+                os.makedirs(dir)
+            f = open(tmp_path, 'w')
+            try:
+                json.dump(data, f)
+            finally:
+                f.close()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(tmp_path, self.index_path)
+        except (IOError, OSError):
+            # the index is only an optimization
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+    #
+    # perforce functions
+    #
+    def fstat(self, sync_expr):
+        '''get the have revision and the open action of all the files'''
+        # only the needed fields are requested.  File digests are not
+        # needed because local files are compared with the index
+        fields = "clientFile,haveRev,action"
+        if not sync_expr:
+            sync_expr = "//%s/..." % self.impl.depot
+        try:
+            self.log.append("p4 fstat -T %s %s" % (fields, sync_expr))
+            return self.p4.run("fstat", "-T", fields, sync_expr)
+        except Exception as e:
+            # if there is an exception, likely this is because there are
+            # no files on the client and Perforce does not like this
+            print("WARNING: %s" % e)
+            return []
+
+
+    def diff(self, paths):
+        '''diff the given local files against their have revision'''
+        info = {}
+        for i in range(0, len(paths), self.DIFF_CHUNK_SIZE):
+            chunk = [escape_path(x) for x in paths[i:i+self.DIFF_CHUNK_SIZE]]
+            self.log.append("p4 diff -sl -f (%s files)" % len(chunk))
+            try:
+                diff = self.p4.run("diff", "-sl", "-f", chunk)
+            except Exception as e:
+                print("WARNING: %s" % e)
+                continue
+
+            for entry in diff:
+                if not isinstance(entry, dict):
+                    continue
+                client_file = entry.get("clientFile").replace("\\", "/")
+                status = entry.get("status")
+                if status == 'diff':
+                    status = 'modified'
+                info[client_file] = status
+        return info
+
+
+
+    def execute(self, sync_dir=None):
+
+        if not sync_dir:
+            sync_dir = self.impl.sync_dir
+        if not sync_dir:
+            raise ScmException("No sync dir to get the status of")
+        sync_dir = sync_dir.replace("\\", "/")
+
+        # Perforce reports the local files unescaped
+        sync_expr = escape_path(sync_dir)
+        if os.path.isdir(sync_dir) and not sync_expr.endswith("/..."):
+            sync_expr = "%s/..." % sync_expr
+
+        self.index_path = self.get_index_path(sync_dir)
+        self.load_index()
+
+        # scan the local files
+        if os.path.isdir(sync_dir):
+            dirs, files = scan_dir(sync_dir, self.threads, ignore=self._ignore)
+        elif os.path.isfile(sync_dir):
+            st = os.stat(sync_dir)
+            dirs, files = [], { sync_dir: (st.st_size, st.st_mtime, bool(st.st_mode & stat.S_IWUSR)) }
+        else:
+            dirs, files = [], {}
+
+
+        info = {}
+        new_files = {}
+        have_revs = {}
+        suspects = []
+        for entry in self.fstat(sync_expr):
+            if not isinstance(entry, dict):
+                continue
+
+            client_file = entry.get("clientFile")
+            if not client_file:
+                continue
+            client_file = client_file.replace("\\", "/")
+            if not client_file.startswith(sync_dir):
+                client_file = "%s/%s" % (sync_dir, client_file)
+
+            if entry.get("action") == 'add':
+                new_files[client_file] = 'add'
+                continue
+
+            have_rev = entry.get("haveRev")
+            if not have_rev:
+                # not synced to this workspace
+                continue
+            have_revs[client_file] = have_rev
+
+            local = files.get(client_file)
+            if not local:
+                info[client_file] = 'missing'
+                continue
+
+            size, mtime, writable = local
+            cached = self.index.get(client_file)
+            if cached and cached[0] == size and cached[1] == mtime and cached[2] == have_rev:
+                info[client_file] = cached[3]
+            else:
+                suspects.append(client_file)
+
+
+        # only diff the files that might have changed
+        if suspects:
+            info.update( self.diff(suspects) )
+
+        # remember the files that have been compared
+        index = {}
+        for client_file, have_rev in have_revs.items():
+            status = info.get(client_file)
+            local = files.get(client_file)
+            if local and status in ['same', 'modified']:
+                index[client_file] = [local[0], local[1], have_rev, status]
+        if sync_dir == self.impl.sync_dir or not self.index_path:
+            self.index = index
+        else:
+            self.index.update(index)
+        self.save_index()
+
+
+        for dir in dirs:
+            info[dir] = 'directory'
+
+        for client_path, (size, mtime, writable) in files.items():
+            status = info.get(client_path)
+
+            if new_files.get(client_path):
+                info[client_path] = 'added'
+            elif not status:
+                info[client_path] = 'unversioned'
+            elif status == 'same' and writable:
+                info[client_path] = 'editable'
+
+        return info
+
+
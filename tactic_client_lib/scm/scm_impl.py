@@ -11,7 +11,8 @@
 
 __all__ = ['ScmImpl', 'ScmException']
 
-import os, shutil
+import os, shutil, stat
+from multiprocessing.pool import ThreadPool
 
 
 class ScmException(Exception):
@@ -55,6 +56,12 @@ class ScmImpl(object):
         return self.log
 
 
+    def check_connection(self):
+        '''make sure that a long lived implementation is still connected
+        to the server'''
+        pass
+
+
 
     def checkout(self, repo_dir, sync_dir, depth=None):
         '''Method to check out some root from the repository to a destination
@@ -69,6 +76,13 @@ class ScmImpl(object):
 
 
 
+    def update(self, sync_paths, recurse=None, depth=None):
+        '''Method to update one or a list of paths of the sync dir.  A depth
+        sets the depth of the paths in a sparse checkout'''
+        pass
+
+
+
     def commit(self, sync_path):
         '''Method to check-in a list of files
 
@@ -78,42 +92,153 @@ class ScmImpl(object):
 
 
 
+    def commit_files(self, paths, description):
+        '''Method to check-in a list of files in a single commit'''
+        return self.commit(paths, description)
+
+
+    def add_dirs(self, sync_dirs):
+        '''Method to add new directories, parents first, before the files
+        in them are added.  Scms which do not version directories have
+        nothing to do
+
+        @return
+          list: the directories which have to be committed with the files
+        '''
+        return []
+
+
+    def checkout_files(self, repo_paths):
+        '''Check out a list of files into a sparse checkout.  The root of
+        the branch is checked out once, empty, into the sync dir and the
+        directories and files are then brought in with an update of their
+        depth.  Files that do not exist in the repository are skipped'''
+        dirs = {}
+        for repo_path in repo_paths:
+            repo_dir = os.path.dirname(repo_path)
+            while repo_dir and not dirs.get(repo_dir):
+                dirs[repo_dir] = True
+                repo_dir = os.path.dirname(repo_dir)
+
+        self.checkout("", depth="empty")
+
+        # parents have to be updated before their children
+        dirs = list(dirs.keys())
+        dirs.sort(key=lambda x: (x.count("/"), x))
+        self._update_paths(dirs)
+        self._update_paths(repo_paths)
+
+
+    def _update_paths(self, repo_paths):
+        '''update paths with an empty depth in a single call'''
+        if not repo_paths:
+            return
+        sync_paths = ["%s/%s" % (self.sync_dir, x) for x in repo_paths]
+        try:
+            self.update(sync_paths, depth="empty")
+        except Exception, e:
+            # a path which is not in the repository fails the whole call
+            for sync_path in sync_paths:
+                try:
+                    self.update(sync_path, depth="empty")
+                except Exception, e:
+                    print "WARNING: ", e
+
+
+
     #
     # Higher level functions
     #
 
-    def deliver_file(self, src_path, repo_path):
+    def deliver_file(self, src_path, repo_path, description=None):
+        return self.deliver_files( [(src_path, repo_path)], description)
 
-        repo_dir = os.path.dirname(repo_path)
 
-        sync_path = "%s/%s" % (self.sync_dir, repo_path)
-        sync_dir = os.path.dirname(sync_path)
+    def deliver_files(self, pairs, description=None, threads=8):
+        '''Deliver many files to the repository in a single commit
 
-        # Trick to checkout a single file.  Not sure if this works
-        self.checkout(repo_dir, sync_dir, depth="empty")
-        try:
-            self.export(repo_path, sync_path)
-        except Exception, e:
-            print "WARNING: ", e
-            exists = False
-        else:            
-            exists = os.path.exists( sync_path )
-            if exists:
-                return
+        @params
+          pairs: list of (src_path, repo_path) tuples
+          description: the description of the commit
+          threads: the number of threads copying the files
 
+        @return
+          dictionary: "added" and "updated" lists of sync paths and the
+            "value" returned by the commit
+        '''
+        if not pairs:
+            return { "added": [], "updated": [], "value": None }
+
+        if not description:
+            description = "Delivered %s files" % len(pairs)
+
+        # the directories are grouped so that each one is only checked
+        # out once
+        repo_paths = [x[1] for x in pairs]
+        self.checkout_files(repo_paths)
+
+        copies = []
+        added = []
+        updated = []
+        new_dirs = {}
+        for src_path, repo_path in pairs:
+            sync_path = "%s/%s" % (self.sync_dir, repo_path)
+            if os.path.exists(sync_path):
+                updated.append(sync_path)
+            else:
+                added.append(sync_path)
+            copies.append( (src_path, sync_path) )
+
+            # directories which are not in the repository were not
+            # checked out and are created by the copy
+            sync_dir = os.path.dirname(sync_path)
+            while len(sync_dir) > len(self.sync_dir) and not new_dirs.get(sync_dir) \
+                    and not os.path.exists(sync_dir):
+                new_dirs[sync_dir] = True
+                sync_dir = os.path.dirname(sync_dir)
+
+        self.log.append("copy %s files" % len(copies))
+        if threads > 1 and len(copies) > 1:
+            pool = ThreadPool( min(threads, len(copies)) )
+            try:
+                pool.map(self._copy_file, copies)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for copy in copies:
+                self._copy_file(copy)
 
-        # create a dummy file
-        shutil.copy(src_path, sync_path)
+        dirs = []
+        if new_dirs:
+            new_dirs = list(new_dirs.keys())
+            new_dirs.sort(key=lambda x: (x.count("/"), x))
+            dirs = self.add_dirs(new_dirs)
+        if added:
+            self.add(added)
 
-        # if it doesn't exist, add it
-        if not exists:
-            print "--> add"
-            self.add(sync_path)
-        else:
-            print "--> update"
-            self.update(sync_path)
+        value = self.commit_files(dirs + added + updated, description)
 
-        self.commit(sync_path, "this is a test")
+        return {
+            "added": added,
+            "updated": updated,
+            "value": value
+        }
 
 
+    def _copy_file(self, copy):
+        src_path, sync_path = copy
+        sync_dir = os.path.dirname(sync_path)
+        if not os.path.exists(sync_dir):
+            try:
+                os.makedirs(sync_dir)
+            except OSError:
+                # another thread may have created it
+                if not os.path.isdir(sync_dir):
+                    raise
+        elif os.path.exists(sync_path) and not os.access(sync_path, os.W_OK):
+            # synced files may be read-only
+            os.chmod(sync_path, os.stat(sync_path).st_mode | stat.S_IWUSR)
+        shutil.copy(src_path, sync_path)
+
 
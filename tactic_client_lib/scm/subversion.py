@@ -18,17 +18,27 @@ try:
 except Exception, e:
     HAS_SVN = False
 
-import getpass, os
+import getpass, os, time
 
 from scm_impl import ScmImpl
 
 
 class Subversion(ScmImpl):
 
+    # repository url -> (time, list of entries).  Shared between instances
+    # because branches and tags rarely change
+    LIST_CACHE = {}
+
     def __init__(self, **kwargs):
         super(Subversion, self).__init__(**kwargs)
 
         self.client = pysvn.Client()
+        self.add_default_callbacks()
+
+        # number of seconds the branch and tag listings are cached
+        self.cache_ttl = self.kwargs.get("cache_ttl")
+        if self.cache_ttl == None:
+            self.cache_ttl = 300
 
 
     def get_login( self, realm, username, may_save):
@@ -58,59 +68,93 @@ class Subversion(ScmImpl):
 
 
     def get_repo_url(self, repo_path):
+        if not repo_path:
+            return '%s/branches/%s' % (self.root, self.branch)
         repo_url = '%s/branches/%s/%s' % (self.root, self.branch, repo_path)
         return repo_url
 
 
+    def _get_depth(self, depth):
+        if depth == None:
+            return None
+        return getattr(pysvn.depth, depth)
 
 
-    def add(self, sync_path):
-        self.client.add(sync_path)
+    def _get_paths(self, paths):
+        if isinstance(paths, basestring):
+            paths = [paths]
+        full_paths = []
+        for path in paths:
+            path = path.replace("\\", "/")
+            if not path.startswith(self.sync_dir):
+                path = "%s/%s" % (self.sync_dir, path)
+            full_paths.append(path)
+        return full_paths
 
 
-    def checkout(self, repo_dir, recurse=None, depth='empty'):
-        self.add_default_callbacks()
+    def add(self, sync_paths, depth=None):
+        '''add one or a list of paths in a single call'''
+        sync_paths = self._get_paths(sync_paths)
+        if not sync_paths:
+            return
+        self.log.append("svn add (%s paths)" % len(sync_paths))
+        if depth:
+            self.client.add(sync_paths, depth=self._get_depth(depth))
+        else:
+            self.client.add(sync_paths)
+
+
+    def add_dirs(self, sync_dirs):
+        '''add new directories without their contents.  The directories
+        have to be committed with the files in them'''
+        self.add(sync_dirs, depth="empty")
+        return self._get_paths(sync_dirs)
 
+
+    def checkout(self, repo_dir, recurse=None, depth='empty'):
         repo_url = self.get_repo_url(repo_dir)
+        self.log.append("svn checkout %s" % repo_url)
         if recurse != None:
             self.client.checkout(repo_url, self.sync_dir, recurse=recurse)
         elif depth:
-            depth = eval("pysvn.depth.%s" % depth)
-            self.client.checkout(repo_url, self.sync_dir, depth=depth)
+            self.client.checkout(repo_url, self.sync_dir, depth=self._get_depth(depth))
 
 
 
     def checkout_file(self, repo_path):
         '''Check out a sinlge file'''
-        self.add_default_callbacks()
-
         repo_dir = os.path.dirname(repo_path)
         sync_path = "%s/%s" % (self.sync_dir, os.path.basename(repo_path))
 
-        self.checkout(repo_dir, self.sync_dir, depth='empty')
+        self.checkout(repo_dir, depth='empty')
         self.export(repo_path, sync_path)
 
 
 
-    def update(self, repo_path, recurse=None, depth='empty'):
-        self.add_default_callbacks()
-        repo_url = self.get_repo_url(repo_path)
+    def update(self, sync_paths, recurse=None, depth=None):
+        '''update one or a list of paths of the sync dir in a single call.
+        A depth of "empty" or "files" brings in only part of a sparse
+        checkout, like svn update --set-depth'''
+        sync_paths = self._get_paths(sync_paths)
+        if not sync_paths:
+            return []
+        self.log.append("svn update (%s paths)" % len(sync_paths))
         if recurse != None:
-            self.client.update(repo_url, dst, recurse=recurse)
+            return self.client.update(sync_paths, recurse=recurse)
         elif depth:
-            depth = eval("pysvn.depth.%s" % depth)
-            self.client.update(repo_url, dst, depth=depth)
+            return self.client.update(sync_paths, depth=self._get_depth(depth),
+                    depth_is_sticky=True)
+        else:
+            return self.client.update(sync_paths)
 
 
 
     def export(self, repo_path, dst, recurse=None, depth='empty'):
-        self.add_default_callbacks()
         repo_url = self.get_repo_url(repo_path)
         if recurse != None:
             self.client.export(repo_url, dst, recurse=recurse)
         elif depth != None:
-            depth = eval("pysvn.depth.%s" % depth)
-            self.client.export(repo_url, dst, depth=depth)
+            self.client.export(repo_url, dst, depth=self._get_depth(depth))
         else:
             self.client.export(repo_url, dst)
 
@@ -118,35 +162,62 @@ class Subversion(ScmImpl):
 
 
     def commit(self, paths, description):
-        self.add_default_callbacks()
+        '''commit a list of paths in a single revision'''
+        full_paths = self._get_paths(paths)
+        self.log.append("svn commit (%s paths)" % len(full_paths))
+        ret_val = self.client.checkin(full_paths, description)
+
+        # a commit may have created a branch or a tag
+        self.clear_cache(root=self.root)
+        return ret_val
+
+
+
+    STATUS_MAP = None
+
+    def _get_status_map(cls):
+        if cls.STATUS_MAP == None:
+            kinds = pysvn.wc_status_kind
+            cls.STATUS_MAP = {
+                kinds.added: "added",
+                kinds.deleted: "deleted",
+                kinds.modified: "modified",
+                kinds.conflicted: "conflicted",
+                kinds.unversioned: "unversioned",
+                kinds.missing: "missing",
+            }
+        return cls.STATUS_MAP
+    _get_status_map = classmethod(_get_status_map)
+
+
+    def status(self, paths=None, depth="infinity", get_all=True):
+        '''get the status of one or a list of paths relative to the sync dir
+
+        @params
+          paths: a path or a list of paths.  Defaults to the sync dir
+          depth: how deep to look.  "empty", "files", "immediates" or
+            "infinity"
+          get_all: return the unchanged files as well.  If False, only
+            files which have changed are returned, which is much faster
+            on large working copies
+
+        @return
+          dictionary: path to status
+        '''
+        if not paths:
+            paths = [self.sync_dir]
+        paths = self._get_paths(paths)
+
+        status_map = self._get_status_map()
+        depth = self._get_depth(depth)
 
-        full_paths = []
-        for path in paths:
-            if not path.startswith(self.sync_dir):
-                path = "%s/%s" % (self.sync_dir, path)
-            full_paths.append(path)
-        self.client.checkin(full_paths, description)
-
-
-    def status(self, path=None):
-        path = "%s/%s" % (self.sync_dir, path)
-
-        changes = self.client.status(path)
         info = {}
-        for f in changes:
-            path = f.path.replace("\\", "/")
-            if f.text_status == pysvn.wc_status_kind.added:
-                info[path] = "added"
-            elif f.text_status == pysvn.wc_status_kind.deleted:
-                info[path] = "deleted"
-            elif f.text_status == pysvn.wc_status_kind.modified:
-                info[path] = "modified"
-            elif f.text_status == pysvn.wc_status_kind.conflicted:
-                info[path] = "conflicted"
-            elif f.text_status == pysvn.wc_status_kind.unversioned:
-                info[path] = "unversioned"
-            else:
-                info[path] = "same"
+        for path in paths:
+            # unversioned directories are reported but not walked into
+            changes = self.client.status(path, depth=depth, get_all=get_all,
+                    ignore_externals=True)
+            for f in changes:
+                info[f.path.replace("\\", "/")] = status_map.get(f.text_status, "same")
 
         return info
 
@@ -157,40 +228,49 @@ class Subversion(ScmImpl):
     # Query methods
     #
 
-    def get_all_branches(self):
-        repo_url = '%s/branches' % self.root
-
-        self.client.callback_get_login = self.get_login
-        self.client.callback_ssl_server_trust_prompt = self.ssl_server_trust_prompt
-        self.client.callback_notify = self.notify
+    def _list_dir(self, repo_url):
+        '''get the names of the entries of a repository directory.  The
+        listing is cached for cache_ttl seconds'''
+        now = time.time()
+        cached = self.LIST_CACHE.get(repo_url)
+        if cached and now - cached[0] < self.cache_ttl:
+            return cached[1]
 
+        self.log.append("svn list %s" % repo_url)
         dir_list = self.client.ls(repo_url)
 
-        branches = []
+        names = []
         for dir_entry in dir_list:
             full = dir_entry.name
-            branch = os.path.basename(full)
-            branches.append(branch)
+            names.append( os.path.basename(full) )
+
+        self.LIST_CACHE[repo_url] = (now, names)
+        return names
+
+
+    def clear_cache(cls, repo_url=None, root=None):
+        '''clear the cached listing of a repository url, of all of the urls
+        of a repository root, or everything'''
+        if repo_url:
+            if repo_url in cls.LIST_CACHE:
+                del(cls.LIST_CACHE[repo_url])
+        elif root:
+            for repo_url in list(cls.LIST_CACHE.keys()):
+                if repo_url.startswith("%s/" % root):
+                    del(cls.LIST_CACHE[repo_url])
+        else:
+            cls.LIST_CACHE.clear()
+    clear_cache = classmethod(clear_cache)
 
-        return branches
+
+    def get_all_branches(self):
+        repo_url = '%s/branches' % self.root
+        return list(self._list_dir(repo_url))
 
 
     def get_all_tags(self, branch):
         repo_url = '%s/tags' % self.root
-
-        self.client.callback_get_login = self.get_login
-        self.client.callback_ssl_server_trust_prompt = self.ssl_server_trust_prompt
-        self.client.callback_notify = self.notify
-
-        dir_list = self.client.ls(repo_url)
-
-        tags = []
-        for dir_entry in dir_list:
-            full = dir_entry.name
-            tag = os.path.basename(full)
-            tags.append(tag)
-
-        return tags
+        return list(self._list_dir(repo_url))
 
 
 
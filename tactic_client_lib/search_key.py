@@ -0,0 +1,177 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['SearchKey']
+
+import sys
+
+try:
+    import xmlrpclib
+except:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    # Python2
+    _intern = intern
+
+
+def intern_str(value):
+    '''intern a string so that all of the keys of a search type share it'''
+    try:
+        return _intern(value)
+    except TypeError:
+        # ie: unicode in Python2
+        return value
+
+
+
+class SearchKey(object):
+    '''A parsed search key.  A search key has the form:
+
+        prod/shot?project=bar&code=XG001
+        sthpw/login?code=admin
+
+    The search type, base search type, project and column are interned, so
+    a large number of search keys of the same type share these strings.
+    Other parameters after the code or id are kept in params.
+
+        key = SearchKey.get("prod/shot?project=bar&code=XG001")
+        key.get_search_type()   # prod/shot?project=bar
+        key.get_code()          # XG001
+
+    A SearchKey compares and hashes like its string and can be passed to the
+    server directly.
+    '''
+
+    __slots__ = ['search_key', 'search_type', 'base_type', 'project',
+            'column', 'code', 'params']
+
+    # search key string -> SearchKey
+    cache = {}
+    CACHE_SIZE = 100000
+
+    def __init__(self, search_key):
+        self.search_key = search_key
+
+        base_type, sep, query = search_key.partition('?')
+        if not sep or not query:
+            raise ValueError("Invalid search key [%s]" % search_key)
+
+        project = None
+        column = None
+        code = None
+        params = []
+        for param in query.split('&'):
+            name, sep, value = param.partition('=')
+            if not sep:
+                raise ValueError("Invalid search key [%s]" % search_key)
+            if name == 'project' and project == None:
+                project = value
+            elif column == None:
+                column = name
+                code = value
+            else:
+                params.append( (intern_str(name), value) )
+        if column == None:
+            raise ValueError("Invalid search key [%s]" % search_key)
+
+        self.base_type = intern_str(base_type)
+        if project:
+            self.project = intern_str(project)
+            self.search_type = intern_str("%s?project=%s" % (base_type, project))
+        else:
+            self.project = None
+            self.search_type = self.base_type
+        self.column = intern_str(column)
+        self.code = code
+        self.params = tuple(params)
+
+
+    def get(cls, search_key):
+        '''get the parsed search key of a string, parsing every string only
+        once'''
+        if isinstance(search_key, SearchKey):
+            return search_key
+        key = cls.cache.get(search_key)
+        if key == None:
+            key = SearchKey(search_key)
+            if len(cls.cache) >= cls.CACHE_SIZE:
+                cls.cache.clear()
+            cls.cache[search_key] = key
+        return key
+    get = classmethod(get)
+
+
+    def build(cls, search_type, code, project_code=None, column='code'):
+        '''build a search key from its components'''
+        if project_code and search_type.find('?') == -1:
+            search_type = "%s?project=%s" % (search_type, project_code)
+        if search_type.find('?') == -1:
+            search_key = "%s?%s=%s" % (search_type, column, code)
+        else:
+            search_key = "%s&%s=%s" % (search_type, column, code)
+        return cls.get(search_key)
+    build = classmethod(build)
+
+
+    def get_search_type(self):
+        return self.search_type
+
+    def get_base_type(self):
+        return self.base_type
+
+    def get_project(self):
+        return self.project
+
+    def get_column(self):
+        return self.column
+
+    def get_code(self):
+        '''get the code, or the id if the search key uses an id'''
+        return self.code
+
+    def get_params(self):
+        return dict(self.params)
+
+    def split(self):
+        return self.search_type, self.code
+
+
+    def __str__(self):
+        return self.search_key
+
+    def __repr__(self):
+        return "SearchKey(%r)" % self.search_key
+
+    def __eq__(self, other):
+        if isinstance(other, SearchKey):
+            other = other.search_key
+        return self.search_key == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.search_key)
+
+
+
+def dump_search_key(marshaller, value, write):
+    marshaller.dispatch[type(value.search_key)](marshaller, value.search_key, write)
+
+# send search keys to the server as strings
+xmlrpclib.Marshaller.dispatch[SearchKey] = dump_search_key
+
+
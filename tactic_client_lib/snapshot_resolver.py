@@ -0,0 +1,171 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['SnapshotResolver']
+
+
+from .tactic_server_stub import TacticServerStub
+
+
+class SnapshotResolver(object):
+    '''Resolves the snapshots, paths and web paths of many sobjects or
+    snapshot codes at once.  Search keys are grouped by search type, so
+    a session with hundreds of references takes a handful of queries
+    instead of a couple of calls per reference.  All of the results are
+    remembered, so subsequent lookups do not go to the server at all.
+
+        resolver = SnapshotResolver.get()
+        snapshots = resolver.resolve(search_keys, context='model')
+        for search_key, snapshot in snapshots.items():
+            web_paths = resolver.get_web_paths(snapshot)
+    '''
+
+    def __init__(self, server=None):
+        if not server:
+            server = TacticServerStub.get()
+        self.server = server
+
+        # (search_key, context, version) -> snapshot
+        self.key_cache = {}
+        # snapshot code -> snapshot
+        self.code_cache = {}
+
+
+    def clear(self):
+        '''forget all of the resolved snapshots'''
+        self.key_cache = {}
+        self.code_cache = {}
+
+
+    def _query(self, filters):
+        return self.server.query_snapshots(filters=filters,
+                include_paths_dict=True, include_web_paths_dict=True)
+
+
+    def _get_version_filter(self, version):
+        if version in [None, '']:
+            version = -1
+        version = int(version)
+        if version == -1:
+            return ['is_latest', True]
+        elif version == 0:
+            return ['is_current', True]
+        else:
+            return ['version', version]
+
+
+    def resolve(self, search_keys, context='publish', version=-1):
+        '''get the snapshots of many sobjects
+
+        @params
+        search_keys: list of search keys of the sobjects
+        context: the context of the snapshots
+        version: the version of the snapshots. -1 is the latest and 0 is
+            the current version
+
+        @return
+        dict: search_key to snapshot.  The snapshot is None if the sobject
+            has no snapshot in this context
+        '''
+        snapshots = {}
+
+        # group the search keys that have not been resolved yet
+        groups = {}
+        for search_key in search_keys:
+            key = (search_key, context, str(version))
+            if key in self.key_cache:
+                snapshots[search_key] = self.key_cache[key]
+                continue
+
+            search_type, code = self.server.split_search_key(search_key)
+            if search_key.find("&id=") != -1 or search_key.find("?id=") != -1:
+                column = "search_id"
+            else:
+                column = "search_code"
+            groups.setdefault( (search_type, column), {} )[code] = search_key
+
+        version_filter = self._get_version_filter(version)
+        for (search_type, column), codes in groups.items():
+            filters = []
+            filters.append( ['search_type', search_type] )
+            filters.append( [column, list(codes.keys())] )
+            filters.append( ['context', context] )
+            filters.append( version_filter )
+
+            results = {}
+            for snapshot in self._query(filters):
+                results[str(snapshot.get(column))] = snapshot
+                self.code_cache[snapshot.get('code')] = snapshot
+
+            for code, search_key in codes.items():
+                snapshot = results.get(str(code))
+                self.key_cache[(search_key, context, str(version))] = snapshot
+                snapshots[search_key] = snapshot
+
+        return snapshots
+
+
+    def resolve_codes(self, snapshot_codes):
+        '''get many snapshots from their codes
+
+        @params
+        snapshot_codes: list of snapshot codes
+
+        @return
+        dict: snapshot code to snapshot.  Codes that do not exist are not
+            included
+        '''
+        missing = [x for x in snapshot_codes if x not in self.code_cache]
+        if missing:
+            filters = [ ['code', missing] ]
+            for snapshot in self._query(filters):
+                self.code_cache[snapshot.get('code')] = snapshot
+            # remember the codes that do not exist as well
+            for snapshot_code in missing:
+                self.code_cache.setdefault(snapshot_code, None)
+
+        snapshots = {}
+        for snapshot_code in snapshot_codes:
+            snapshot = self.code_cache.get(snapshot_code)
+            if snapshot:
+                snapshots[snapshot_code] = snapshot
+        return snapshots
+
+
+    def get_paths(self, snapshot, file_type='main'):
+        '''get the client repository paths of a resolved snapshot'''
+        if not snapshot:
+            return []
+        paths = snapshot.get('__paths_dict__') or {}
+        return paths.get(file_type) or []
+
+
+    def get_web_paths(self, snapshot, file_type='main'):
+        '''get the web paths of a resolved snapshot'''
+        if not snapshot:
+            return []
+        paths = snapshot.get('__web_paths_dict__') or {}
+        return paths.get(file_type) or []
+
+
+
+    resolver = None
+    def get(cls):
+        '''get a resolver shared for the rest of the session'''
+        server = TacticServerStub.get()
+        if not cls.resolver or cls.resolver.server is not server:
+            cls.resolver = SnapshotResolver(server)
+        return cls.resolver
+    get = classmethod(get)
+
+
+
@@ -14,24 +14,21 @@
 # scripts using the client api.  Thin wrapper to the client API.  
 # These are meant to be copied to client directories.
 
-import datetime
+import datetime, time
 import re
-import os, getpass, shutil, sys, types, hashlib
+import os, getpass, shutil, sys, types
 import six
 from six.moves import input, urllib
 
 
-try:
-    import xmlrpclib
-except:
-    # Python3
-    from xmlrpc import client as xmlrpclib
+from .common.lazy_module import LazyModule
+from .common.instrumentation import Instrumentation
+from .resource_config import ResourceConfig
 
-try:
-    import httplib
-except:
-    # Python3
-    from http import client as httplib
+# these are only imported when a connection is made to the server
+xmlrpclib = LazyModule("xmlrpclib", "xmlrpc.client")
+httplib = LazyModule("httplib", "http.client")
+hashlib = LazyModule("hashlib")
 
 
 
@@ -74,6 +71,8 @@ class TacticServerStub(object):
         self.ticket = None # the ticket sent to the server
         self.login_ticket = None
         self.transaction_ticket = None
+        # (login, password, site) of a ticket from the connection manager
+        self.credentials = None
 
         self.site = site
 
@@ -93,6 +92,18 @@ class TacticServerStub(object):
         self.protocol = protocol
         self.transport = None
 
+        # priority class of the uploads and downloads of this stub
+        self.transfer_priority = 'normal'
+
+        # local copy answering the queries which accept stale results
+        self.query_mirror = None
+
+        # splits large insert_multiple and update_multiple calls
+        self.chunked_writer = None
+
+        # cache of the results of eval()
+        self.expression_cache = None
+
         # if all of the necessary parameters are set, then
         if server and (ticket or login) and project:
             self.set_server(server)
@@ -102,8 +113,7 @@ class TacticServerStub(object):
                 self.set_ticket(ticket)
             elif login:
                 # else try with no password (api_require_password)
-                ticket = self.get_ticket(login, password, site)
-                self.set_ticket(ticket)
+                self._login(login, password, site)
 
 
         elif setup:
@@ -150,6 +160,7 @@ class TacticServerStub(object):
     def set_ticket(self, ticket):
         '''set the login ticket'''
         self.set_login_ticket(ticket)
+        self.credentials = None
 
         # reset the handoff_dir
         self.handoff_dir = None
@@ -209,6 +220,8 @@ class TacticServerStub(object):
             return
             
 
+        from .common.instrumented_transport import InstrumentedTransport, InstrumentedSafeTransport
+
         if (self.server_name.startswith("http://") or
             self.server_name.startswith("https://")):
             url = "%s/tactic/default/Api/" % self.server_name
@@ -230,20 +243,24 @@ class TacticServerStub(object):
                 self.server = xmlrpclib.ServerProxy(
                             url, allow_none=True,
                             verbose=False, use_datetime=False, 
-                            transport=xmlrpclib.SafeTransport(context=context)
+                            transport=InstrumentedSafeTransport(context=context)
                  )
             except:
                 self.server = xmlrpclib.ServerProxy(
                             url, allow_none=True,
                             verbose=False, use_datetime=False, 
+                            transport=InstrumentedSafeTransport()
                  )
 
         else:
             if self.transport:
                 self.server = xmlrpclib.Server(url, allow_none=True, transport=self.transport)
             else:
-                self.server = xmlrpclib.Server(url, allow_none=True)
+                self.server = xmlrpclib.Server(url, allow_none=True, transport=InstrumentedTransport())
 
+        # transient errors are retried with the retry policy of each method
+        from .common.retry_policy import RetryServerProxy
+        self.server = RetryServerProxy(self.server, relogin=self._relogin)
 
 
         try:
@@ -263,6 +280,10 @@ class TacticServerStub(object):
             user_agent = 'xmlrpclib.py (Linux)'
         xmlrpclib.Transport.user_agent = user_agent
 
+        # the connection is reset in forked processes
+        from .connection_manager import ConnectionManager
+        ConnectionManager.get().register(self)
+
         
     def get_server_name(self):
         return self.server_name
@@ -270,6 +291,27 @@ class TacticServerStub(object):
     def get_server(self):
         return self.server
 
+    def get_instrumentation(self):
+        '''Function: get_instrumentation()
+           Get the registry recording the time, payload sizes, retries and
+           errors of the calls made to the server'''
+        return Instrumentation.get()
+
+    def set_retry_policy(self, policy, method=None):
+        '''Function: set_retry_policy(policy, method=None)
+           Set the RetryPolicy of the calls to a method of the server, or
+           of all of the calls if no method is given.  The policies are
+           shared by all of the stubs of the process'''
+        from .common.retry_policy import RetryPolicy
+        RetryPolicy.set(policy, method=method)
+
+    def get_transfer_scheduler(self):
+        '''Function: get_transfer_scheduler()
+           Get the scheduler of the uploads and downloads of this process,
+           which sets the rate limits and reports the live throughput'''
+        from .common.transfer_scheduler import TransferScheduler
+        return TransferScheduler.get()
+
     def set_project(self, project_code):
         '''Function: set_project(project_code)
            Set the project code'''
@@ -290,6 +332,65 @@ class TacticServerStub(object):
             Sets the transport that can be used to setup proxy'''
         self.transport = transport
 
+    def set_query_mirror(self, mirror):
+        '''Function: set_query_mirror(mirror)
+           Set the QueryMirror which answers the queries made with
+           stale_ok=True, or None to send all of the queries to the server'''
+        self.query_mirror = mirror
+
+    def get_query_mirror(self):
+        return self.query_mirror
+
+    def set_chunked_writer(self, writer):
+        '''Function: set_chunked_writer(writer)
+           Set the ChunkedWriter which splits large insert_multiple and
+           update_multiple calls into chunks'''
+        self.chunked_writer = writer
+
+    def get_chunked_writer(self):
+        if not self.chunked_writer:
+            from .chunked_writer import ChunkedWriter
+            self.chunked_writer = ChunkedWriter()
+        return self.chunked_writer
+
+    def set_expression_cache(self, cache):
+        '''Function: set_expression_cache(cache)
+           Set the ExpressionCache which keeps the results of eval(), or
+           None to send all of the expressions to the server'''
+        self.expression_cache = cache
+
+    def get_expression_cache(self):
+        return self.expression_cache
+
+    def _changed(self, search_types=[], search_keys=[], all=False):
+        '''called after a call which changes sobjects, so that local copies
+        of them are refreshed'''
+        if not isinstance(search_keys, (list, tuple)):
+            search_keys = [search_keys]
+        search_keys = [x for x in search_keys if isinstance(x, six.string_types)]
+
+        if self.expression_cache:
+            if all:
+                self.expression_cache.clear()
+            else:
+                self.expression_cache.invalidate(search_types, search_keys)
+
+        if not self.query_mirror:
+            return
+        if all:
+            self.query_mirror.invalidate()
+            return
+        for search_type in search_types:
+            self.query_mirror.mark_stale(search_type)
+        if search_keys:
+            self.query_mirror.mark_keys_stale(search_keys)
+
+    def set_transfer_priority(self, priority):
+        '''Function: set_transfer_priority(priority)
+           Set the priority class of the uploads and downloads of this stub
+           in the transfer scheduler: urgent, high, normal or bulk'''
+        self.transfer_priority = priority
+
     def set_site(self, site=None):
         '''Function: set_site(site=None)
            Set the site applicable in a portal setup'''
@@ -398,7 +499,7 @@ class TacticServerStub(object):
 
     def split_search_key(self, search_key):
         '''API Function: split_search_key(search_key)
-        Convenience method to split a search_key in into its search_type and search_code/id components. Note: only accepts the new form prod/asset?project=sample3d&code=chr001
+        Convenience method to split a search_key in into its search_type and search_code/id components. Note: only accepts the new form prod/asset?project=sample3d&code=chr001.  Parameters after the code/id are ignored.
 
         @param:
         search_key - the unique identifier of a sobject
@@ -407,14 +508,49 @@ class TacticServerStub(object):
         tuple - search type, search code/id
 
         '''
-        if search_key.find('&') != -1: 
-            search_type, code = search_key.split('&')
-        else:
-            # non project-based search_key
-            search_type, code = search_key.split('?')
-        codes = code.split('=')
-        assert len(codes) == 2
-        return search_type, codes[1]
+        from .search_key import SearchKey
+        return SearchKey.get(search_key).split()
+
+
+    def build_search_keys(self, search_type, codes, project_code=None,
+                          column='code'):
+        '''API Function: build_search_keys(search_type, codes, project_code=None, column='code')
+        Build the search keys of a list of codes of the same search type
+
+        @param:
+        search_type - the unique identifier of a search type: ie prod/asset
+        codes - a list of codes of sobjects
+
+        @keyparam:
+        project_code - an optional project code.  If this is not
+            included, the project from get_ticket() is added.
+        column - the column of the codes
+
+        @return:
+        list - search keys
+
+        @example:
+        [code]
+        search_keys = server.build_search_keys("prod/asset", ["chr001", "chr002"])
+        [/code]
+        '''
+        prefix = self.build_search_key(search_type, '', project_code, column)
+        return ["%s%s" % (prefix, code) for code in codes]
+
+
+    def split_search_keys(self, search_keys):
+        '''API Function: split_search_keys(search_keys)
+        Split a list of search keys into their search type and code/id
+        components.  The search types of the same type are shared
+
+        @param:
+        search_keys - a list of search keys
+
+        @return:
+        list - a tuple of search type, search code/id for every search key
+        '''
+        from .search_key import SearchKey
+        return [SearchKey.get(x).split() for x in search_keys]
 
     def get_home_dir(self):
         '''API Function: get_home_dir()
@@ -603,6 +739,34 @@ class TacticServerStub(object):
         return self.server.get_ticket(login, password, site)
 
 
+    def _login(self, login, password, site=None):
+        '''use a ticket of a login, shared by the connection manager'''
+        from .connection_manager import ConnectionManager
+        ticket = ConnectionManager.get().get_ticket(self, login, password, site)
+        self.set_ticket(ticket)
+        self.credentials = (login, password, site)
+
+
+    def _relogin(self, fault):
+        '''get a new ticket when the server rejects a ticket shared by the
+        connection manager
+
+        @return:
+        dictionary - the new ticket sent to the server, or None
+        '''
+        from .connection_manager import ConnectionManager
+        if not self.credentials or not ConnectionManager.is_ticket_fault(fault):
+            return None
+        # a transaction can not be continued with a new ticket
+        if self.transaction_ticket != self.login_ticket:
+            return None
+
+        login, password, site = self.credentials
+        ConnectionManager.get().invalidate(self, login, password, site)
+        self._login(login, password, site)
+        return self.ticket
+
+
     def get_info_from_user(self, force=False):
         '''API Function: get_info_from_user(force=False)
         Get input from the user about the users environment.  Questions
@@ -687,6 +851,9 @@ class TacticServerStub(object):
             file.close()
             print("Saved to [%s]" % path)
 
+        # make sure the new information is read
+        ResourceConfig.clear()
+
         # set up the server with the new information
         self._setup(self.protocol)
 
@@ -972,6 +1139,9 @@ class TacticServerStub(object):
 
         result = self.server.finish(self.ticket, description)
         self.set_login_ticket(self.login_ticket)
+        # triggers of the transaction may have changed any sobject
+        if self.expression_cache:
+            self.expression_cache.clear()
         #self.ticket = None
         #self.transaction_ticket = None
         return result
@@ -1007,6 +1177,7 @@ class TacticServerStub(object):
         result = self.server.abort(self.ticket, ignore_files)
         self.ticket = None
         self.transaction_ticket = None
+        self._changed(all=True)
         return result
 
 
@@ -1026,8 +1197,10 @@ class TacticServerStub(object):
         '''
         if self.protocol == "local":
             return
-        return self.server.undo(self.ticket, transaction_ticket, transaction_id,
+        result = self.server.undo(self.ticket, transaction_ticket, transaction_id,
                               ignore_files)
+        self._changed(all=True)
+        return result
 
 
 
@@ -1042,7 +1215,9 @@ class TacticServerStub(object):
         '''
         if self.protocol == "local":
             return
-        return self.server.redo(self.ticket, transaction_ticket, transaction_id)
+        result = self.server.redo(self.ticket, transaction_ticket, transaction_id)
+        self._changed(all=True)
+        return result
 
 
 
@@ -1101,8 +1276,9 @@ class TacticServerStub(object):
 
     def query(self, search_type, filters=[], columns=[], order_bys=[],
               show_retired=False, limit=None, offset=None, single=False,
-              distinct=None, return_sobjects=False, parent_key=None):
-        '''API Function: query(search_type, filters=[], columns=[], order_bys=[], show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False) 
+              distinct=None, return_sobjects=False, parent_key=None,
+              stale_ok=False, result_format=None):
+        '''API Function: query(search_type, filters=[], columns=[], order_bys=[], show_retired=False, limit=None, offset=None, single=False, distinct=None, return_sobjects=False, stale_ok=False, result_format=None) 
         General query for sobject information
 
         @param:
@@ -1122,6 +1298,11 @@ class TacticServerStub(object):
         return_sobjects - return sobjects instead of dictionary.  This
                 works only when using the API on the server.
         parent_key - filter to specify a parent sobject
+        stale_ok - allow the query to be answered by the query mirror set
+                with set_query_mirror(), which may be slightly out of date
+        result_format - 'columnar' returns a ResultSet which stores the
+                values by column.  It is decoded directly from the response
+                and uses much less memory for large results
 
         @return:
         list of dictionary/sobjects - Each array item represents an sobject
@@ -1149,6 +1330,23 @@ class TacticServerStub(object):
         (value)                     -> where value
         [/code]
         '''
+        if stale_ok and self.query_mirror and not distinct and \
+                not return_sobjects and not parent_key:
+            from .query_mirror import QueryMirrorException
+            try:
+                results = self.query_mirror.query(search_type, filters, columns,
+                        order_bys, show_retired, limit, offset, single)
+                return self._format_results(results, result_format)
+            except QueryMirrorException:
+                pass
+
+        if result_format == 'columnar' and not return_sobjects:
+            results = self._columnar_call("query", search_type, filters,
+                                  columns, order_bys, show_retired, limit,
+                                  offset, single, distinct, return_sobjects,
+                                  parent_key)
+            return self._format_results(results, result_format)
+
         #return self.server.query(self.ticket, search_type, filters, columns, order_bys, show_retired, limit, offset, single, return_sobjects)
         results = self.server.query(self.ticket, search_type, filters, columns,
                                   order_bys, show_retired, limit, offset,
@@ -1157,6 +1355,38 @@ class TacticServerStub(object):
             results = eval(results)
         return results
 
+
+    def _columnar_call(self, method, *args):
+        # ask the transport to decode the response into a ResultSet
+        transport = None
+        try:
+            transport = self.server("transport")
+        except Exception:
+            pass
+        if not hasattr(transport, "set_columnar"):
+            transport = None
+
+        if transport:
+            transport.set_columnar(True)
+        try:
+            return getattr(self.server, method)(self.ticket, *args)
+        finally:
+            if transport:
+                transport.set_columnar(False)
+
+
+    def _format_results(self, results, result_format):
+        if result_format != 'columnar':
+            return results
+        from .result_set import ResultSet
+        if isinstance(results, six.string_types):
+            results = eval(results)
+        if isinstance(results, list):
+            # ie: the local protocol or a transport which does not decode
+            # by column
+            results = ResultSet.from_rows(results)
+        return results
+
         
     def insert(self, search_type, data, metadata={}, parent_key=None,  info={},
                use_id=False, triggers=True):
@@ -1221,8 +1451,10 @@ class TacticServerStub(object):
         server.insert( search_type, data, triggers=False )
         [/code]
         '''
-        return self.server.insert(self.ticket, search_type, data, metadata,
+        result = self.server.insert(self.ticket, search_type, data, metadata,
                                 parent_key, info, use_id, triggers)
+        self._changed(search_types=[search_type])
+        return result
 
 
     def update(self, search_key, data={}, metadata={}, parent_key=None, info={},
@@ -1253,12 +1485,14 @@ class TacticServerStub(object):
         dictionary - represent the sobject with its current data.
             If search_key is an array, This will be an array of dictionaries
         '''
-        return self.server.update(self.ticket, search_key, data, metadata,
+        result = self.server.update(self.ticket, search_key, data, metadata,
                                 parent_key, info, use_id, triggers)
+        self._changed(search_keys=search_key)
+        return result
 
         
-    def update_multiple(self, data, triggers=True):
-        '''API Function: update_multiple(data, triggers=True) 
+    def update_multiple(self, data, triggers=True, parallel=None):
+        '''API Function: update_multiple(data, triggers=True, parallel=None) 
 
         Update for several sobjects with different data in one function call.  The
         data structure contains all the information needed to update and is
@@ -1280,16 +1514,32 @@ class TacticServerStub(object):
             Note: this can also be an array.  Each data dictionary element in
             the array will be applied to the corresponding search key
         triggers - boolean to fire trigger on insert
-
+        parallel - the number of chunks sent at the same time when the
+            data is large enough to be split with the ChunkedWriter
 
         @return:
-        None
+            a list of the results returned by the server, joined over all
+            of the chunks.  It is empty if the server returns nothing
         '''
-        return self.server.update_multiple(self.ticket, data, triggers)
+        if not isinstance(data, dict):
+            result = self.server.update_multiple(self.ticket, data, triggers)
+            self._changed(all=True)
+            return self.get_chunked_writer().join_results([result])
+
+        items = list(data.items())
+        def update(stub, start, end):
+            return stub.server.update_multiple(stub.ticket,
+                    dict(items[start:end]), triggers)
+
+        try:
+            result = self.get_chunked_writer().execute(self, update, items, parallel)
+        finally:
+            self._changed(search_keys=list(data.keys()))
+        return result
 
     def insert_multiple(self, search_type,  data, metadata=[], parent_key=None,
-                        use_id=False, triggers=True):
-        '''API Function: insert_multiple(data, metadata=[], parent_key=None, use_id=False, triggers=True)
+                        use_id=False, triggers=True, parallel=None):
+        '''API Function: insert_multiple(data, metadata=[], parent_key=None, use_id=False, triggers=True, parallel=None)
         Insert for several sobjects in one function call.  The
         data structure contains all the infon needed to update and is
         formated as follows:
@@ -1316,12 +1566,22 @@ class TacticServerStub(object):
         parent_key - set the parent key for this sobject
         use_id - boolean to control if id is used in the search_key in returning sobject dict
         triggers - boolean to fire trigger on insert
+        parallel - the number of chunks sent at the same time when the
+            data is large enough to be split with the ChunkedWriter
 
         @return:
             a list of all the inserted sobjects
         '''
-        return self.server.insert_multiple(self.ticket, search_type, data, metadata,
-                                         parent_key, use_id, triggers)
+        def insert(stub, start, end):
+            return stub.server.insert_multiple(stub.ticket, search_type,
+                    data[start:end], metadata[start:end], parent_key,
+                    use_id, triggers)
+
+        try:
+            result = self.get_chunked_writer().execute(self, insert, data, parallel)
+        finally:
+            self._changed(search_types=[search_type])
+        return result
 
 
     def insert_update(self, search_key, data, metadata={}, parent_key=None,
@@ -1346,8 +1606,11 @@ class TacticServerStub(object):
         @return:
         dictionary - represent the sobject with its current data.
         '''
-        return self.server.insert_update(self.ticket, search_key, data, metadata,
+        result = self.server.insert_update(self.ticket, search_key, data, metadata,
                                        parent_key, info, use_id, triggers)
+        # it may have been inserted
+        self._changed(search_types=[search_key.split("?")[0]], search_keys=search_key)
+        return result
 
 
     def get_unique_sobject(self, search_type, data={}):
@@ -1407,6 +1670,9 @@ class TacticServerStub(object):
         vars - user defined variable
         show_retired - defaults to False to not return retired items
 
+        The results are kept in the ExpressionCache set with
+        set_expression_cache(), if any.
+
         @return:
         results of the expression.  The results depend on the exact nature
         of the expression.
@@ -1424,13 +1690,25 @@ class TacticServerStub(object):
         examples on how to use the expression language.
 
         '''
+        cache = self.expression_cache
+        if cache:
+            key = cache.get_key(expression, search_keys, mode, single, vars,
+                    show_retired, self.project_code)
+            results = cache.get(key)
+            if results != None:
+                return results
+
         #return self.server.eval(self.ticket, expression, search_keys, mode, single, vars)
         results = self.server.eval(self.ticket, expression, search_keys, mode,
                                  single, vars, show_retired)
         try:
-            return eval(results)
+            results = eval(results)
         except:
-            return results
+            pass
+
+        if cache:
+            cache.set(key, results, cache.get_search_types(expression, search_keys))
+        return results
 
 
 
@@ -1527,8 +1805,13 @@ class TacticServerStub(object):
             form name:value pairs
         '''
 
-        return self.server.delete_sobject(self.ticket, search_key,
+        result = self.server.delete_sobject(self.ticket, search_key,
                                         include_dependencies)
+        if include_dependencies:
+            self._changed(all=True)
+        else:
+            self._changed(search_keys=search_key)
+        return result
 
 
 
@@ -1544,7 +1827,9 @@ class TacticServerStub(object):
             dictionary - sobject that represents values of the sobject in the
             form name:value pairs
         '''
-        return self.server.retire_sobject(self.ticket, search_key)
+        result = self.server.retire_sobject(self.ticket, search_key)
+        self._changed(search_keys=search_key)
+        return result
 
 
 
@@ -1559,7 +1844,9 @@ class TacticServerStub(object):
         dictionary - sobject that represents values of the sobject in the
             form name:value pairs
         '''
-        return self.server.reactivate_sobject(self.ticket, search_key)
+        result = self.server.reactivate_sobject(self.ticket, search_key)
+        self._changed(search_keys=search_key)
+        return result
 
 
 
@@ -1694,8 +1981,10 @@ class TacticServerStub(object):
         @return:
         dictionary - the last connection sobject created
         '''
-        return self.server.connect_sobjects(self.ticket, src_sobject, dst_sobject,
-                                          context)
+        result = self.server.connect_sobjects(self.ticket, src_sobject, dst_sobject,
+                                            context)
+        self._changed(search_types=['sthpw/connection'])
+        return result
 
 
 
@@ -1781,11 +2070,13 @@ class TacticServerStub(object):
                 pass
 
 
-        f = urllib.request.urlopen(url)
-        file = open(to_path, "wb")
-        file.write( f.read() )
-        file.close()
-        f.close()
+        # go through the download cache of the machine, if it is enabled
+        from .download_cache import DownloadCache
+        cache = DownloadCache.get()
+        if cache:
+            cache.fetch(url, to_path, self._download_url, checksum=md5_checksum)
+        else:
+            self._download_url(url, to_path)
 
         # check for downloaded file
         # COMMENTED OUT for now since it does not work well with icons
@@ -1820,6 +2111,49 @@ class TacticServerStub(object):
 
 
 
+    def _download_url(self, url, to_path):
+        '''download the contents of a url to a path'''
+        from .common.transfer_scheduler import TransferScheduler
+        host = urllib.parse.urlsplit(url)[1]
+        transfer = TransferScheduler.get().acquire(host, kind='download',
+                priority=self.transfer_priority)
+
+        error = None
+        size = 0
+        start = time.time()
+        try:
+            f = urllib.request.urlopen(url)
+            try:
+                file = open(to_path, "wb")
+                try:
+                    while True:
+                        buffer = f.read(1024*1024)
+                        if not buffer:
+                            break
+                        transfer.throttle(len(buffer))
+                        size += len(buffer)
+                        file.write( buffer )
+                finally:
+                    file.close()
+            finally:
+                f.close()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            transfer.release()
+            Instrumentation.get().record("download", time.time() - start,
+                    response_bytes=size, error=error)
+
+
+
+    def _md5_check(self, path, md5_checksum):
+        '''check that a file matches an md5 checksum'''
+        from .download_cache import DownloadCache
+        return DownloadCache.get_md5(path) == md5_checksum
+
+
+
 
     def upload_file(self, path, base_dir=None, chunk_size=None, offset=None, num_chunks=0):
         '''API Function: upload_file(path)
@@ -1846,6 +2180,7 @@ class TacticServerStub(object):
                 chunk_size = 10*1024*1024
 
         upload.set_chunk_size(chunk_size)
+        upload.set_priority(self.transfer_priority)
 
         if offset:
             upload.set_offset(offset)
@@ -1888,6 +2223,18 @@ class TacticServerStub(object):
 
 
 
+    def get_transfer_agent(self):
+        '''API Function: get_transfer_agent()
+        Get the agent which uploads files in the background
+
+        @return:
+            TransferAgent
+        '''
+        from .transfer_agent import TransferAgent
+        return TransferAgent.get()
+
+
+
     def upload_group(self, path, file_range):
         '''uses http protocol to upload a sequences of files through HTTP
 
@@ -1970,9 +2317,11 @@ class TacticServerStub(object):
         @return:
         dictionary - representation of the snapshot created for this checkin
         '''
-        return self.server.create_snapshot(self.ticket, search_key, context,
-                                         snapshot_type, description, is_current,
-                                         level_key, is_revision, triggers)
+        result = self.server.create_snapshot(self.ticket, search_key, context,
+                                           snapshot_type, description, is_current,
+                                           level_key, is_revision, triggers)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
+        return result
 
 
 
@@ -2011,7 +2360,10 @@ class TacticServerStub(object):
             information about what happened to a checked in file
         metadata - a dictionary of values that will be stored as metadata
             on the snapshot
-        mode - inplace, upload, copy, move
+        mode - inplace, upload, copy, move, background.  background uploads
+            the file with the transfer agent and returns a TransferHandle
+            right away.  The checkin is done once the upload has landed and
+            its snapshot is returned by the wait() method of the handle
         is_revision - flag to set this as a revision instead of a version
         create_icon - flag to create an icon on checkin
         info - dict of info to pass to the ApiClientCmd
@@ -2026,11 +2378,21 @@ class TacticServerStub(object):
         @return:
         dictionary - representation of the snapshot created for this checkin
         '''
-        mode_options = ['upload', 'uploaded', 'copy', 'move', 'local','inplace']
+        mode_options = ['upload', 'uploaded', 'copy', 'move', 'local','inplace', 'background']
         if mode:
             if mode not in mode_options:
                 raise TacticApiException('Mode must be in %s' % mode_options)
 
+            if mode == 'background':
+                args = [search_key, context, file_path, snapshot_type,
+                        description, use_handoff_dir, file_type, is_current,
+                        level_key, metadata, 'upload', is_revision, info,
+                        keep_file_name, create_icon, checkin_cls,
+                        context_index_padding, checkin_type, source_path,
+                        version, process]
+                return self.get_transfer_agent().upload(self, file_path,
+                        method='simple_checkin', args=args)
+
             if mode == 'upload':
                 self.upload_file(file_path)
             elif mode == 'uploaded':
@@ -2123,6 +2485,7 @@ class TacticServerStub(object):
             file.write(full_snapshot_xml)
             file.close()
 
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
         return snapshot
 
 
@@ -2207,10 +2570,12 @@ class TacticServerStub(object):
                 file_path = os.path.abspath(file_path)
 
 
-        return self.server.group_checkin(self.ticket, search_key, context,
-                                       file_path, file_range,
-                                       snapshot_type, description, file_type,
-                                       metadata, mode, is_revision, info )
+        result = self.server.group_checkin(self.ticket, search_key, context,
+                                         file_path, file_range,
+                                         snapshot_type, description, file_type,
+                                         metadata, mode, is_revision, info )
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
+        return result
 
 
 
@@ -2322,6 +2687,7 @@ class TacticServerStub(object):
                     os.makedirs(repo_dir)
                 shutil.copytree(dir,repo_path)
 
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
         return snapshot
 
  
@@ -2354,8 +2720,10 @@ class TacticServerStub(object):
         @return:
         dictionary - the resulting snapshot
         '''
-        return self.server.add_dependency(self.ticket, snapshot_code, file_path,
-                                        type, tag)
+        result = self.server.add_dependency(self.ticket, snapshot_code, file_path,
+                                          type, tag)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
 
     def add_dependency_by_code(self, to_snapshot_code, from_snapshot_code,
                                type='ref', tag='main'):
@@ -2379,8 +2747,10 @@ class TacticServerStub(object):
         @return:
         dictionary - the resulting snapshot
         '''
-        return self.server.add_dependency_by_code(self.ticket, to_snapshot_code,
-                                                from_snapshot_code, type, tag)
+        result = self.server.add_dependency_by_code(self.ticket, to_snapshot_code,
+                                                  from_snapshot_code, type, tag)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
 
 
     def add_file(self, snapshot_code, file_path, file_type='main',
@@ -2417,8 +2787,9 @@ class TacticServerStub(object):
         use_handoff_dir - DEPRECATED: (use mode arg) use handoff dir to checkin
             file.  The handoff dir is an agreed upon directory between the
             client and server to transfer files.
-        mode - upload|copy|move|manual|inplace - determine the protocol which delievers
-            the file to the server.
+        mode - upload|copy|move|manual|inplace|background - determine the protocol which delievers
+            the file to the server.  background uploads the files with the
+            transfer agent and returns a TransferHandle right away
         create_icon - (True|False) determine whether to create an icon for
             this appended file.  Only 1 icon should be created for each
             snapshot.
@@ -2485,6 +2856,12 @@ class TacticServerStub(object):
             if os.path.isdir(path):
                 raise TacticApiException('[%s] is a directory. Use add_directory() instead' %path)
 
+        if mode == 'background':
+            args = [snapshot_code, file_paths, file_types, False, 'upload',
+                    create_icon, dir_naming, file_naming, checkin_type]
+            return self.get_transfer_agent().upload(self, file_paths,
+                    method='add_file', args=args)
+
         mode_options = ['upload', 'copy', 'move', 'preallocate','inplace']
         if mode:
             if mode in ['copy', 'move']:
@@ -2520,14 +2897,18 @@ class TacticServerStub(object):
             if mode in ['copy', 'move']:
                 mode = 'create'
 
-        return self.server.add_file(self.ticket, snapshot_code, file_paths,
-                                  file_types, use_handoff_dir, mode,
-                                  create_icon, dir_naming, file_naming,
-                                  checkin_type)
+        result = self.server.add_file(self.ticket, snapshot_code, file_paths,
+                                    file_types, use_handoff_dir, mode,
+                                    create_icon, dir_naming, file_naming,
+                                    checkin_type)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
 
 
     def remove_file(self, snapshot_code, file_type):
-        return self.server.remove_file(self.ticket, snapshot_code, file_type)
+        result = self.server.remove_file(self.ticket, snapshot_code, file_type)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
         
 
 
@@ -2577,8 +2958,10 @@ class TacticServerStub(object):
             elif mode == 'preallocate':
                 use_handoff_dir = True
 
-        return self.server.add_group(self.ticket, snapshot_code, file_path,
-                                   file_type, file_range, use_handoff_dir, mode)
+        result = self.server.add_group(self.ticket, snapshot_code, file_path,
+                                     file_type, file_range, use_handoff_dir, mode)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
 
 
 
@@ -2647,9 +3030,11 @@ class TacticServerStub(object):
 
         use_handoff_dir = True
         create_icon = False
-        return self.server.add_file(self.ticket, snapshot_code, dir, file_type,
-                                  use_handoff_dir, mode, create_icon,
-                                  dir_naming, file_naming )
+        result = self.server.add_file(self.ticket, snapshot_code, dir, file_type,
+                                    use_handoff_dir, mode, create_icon,
+                                    dir_naming, file_naming )
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
  
 
 
@@ -2743,7 +3128,9 @@ class TacticServerStub(object):
         @return
         None
         '''
-        return self.server.lock_sobject(self.ticket, search_key, context)
+        result = self.server.lock_sobject(self.ticket, search_key, context)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
+        return result
 
  
     def unlock_sobject(self, search_key, context):
@@ -2759,12 +3146,14 @@ class TacticServerStub(object):
         None
  
         '''
-        return self.server.unlock_sobject(self.ticket, search_key, context)
+        result = self.server.unlock_sobject(self.ticket, search_key, context)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'], search_keys=search_key)
+        return result
 
 
 
-    def query_snapshots(self, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False):
-        '''API Function:  query_snapshots(filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths=False)
+    def query_snapshots(self, filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths_dict=False, stale_ok=False, result_format=None):
+        '''API Function:  query_snapshots(filters=None, columns=None, order_bys=[], show_retired=False, limit=None, offset=None, single=False, include_paths=False, include_full_xml=False, include_paths_dict=False, include_parent=False, include_files=False, include_web_paths=False, stale_ok=False, result_format=None)
 
         thin wrapper around query, but is specific to querying snapshots
         with some useful included flags that are specific to snapshots
@@ -2792,10 +3181,33 @@ class TacticServerStub(object):
         include_parent - includes all of the parent attributes in a __parent__ dictionary
         include_files - includes all of the file objects referenced in the
                     snapshots
+        stale_ok - allow the query to be answered by the query mirror if
+                none of the include flags are set
+        result_format - 'columnar' returns a ResultSet which stores the
+                values by column
 
         @return:
         list of snapshots
         '''
+        if stale_ok and self.query_mirror and not (include_paths or
+                include_full_xml or include_paths_dict or include_parent or
+                include_files or include_web_paths_dict):
+            from .query_mirror import QueryMirrorException
+            try:
+                results = self.query_mirror.query("sthpw/snapshot", filters,
+                        columns, order_bys, show_retired, limit, offset, single)
+                return self._format_results(results, result_format)
+            except QueryMirrorException:
+                pass
+
+        if result_format == 'columnar':
+            results = self._columnar_call("query_snapshots", filters, columns,
+                                         order_bys, show_retired, limit, offset,
+                                         single, include_paths, include_full_xml,
+                                         include_paths_dict, include_parent,
+                                         include_files, include_web_paths_dict)
+            return self._format_results(results, result_format)
+
         return self.server.query_snapshots(self.ticket, filters, columns, order_bys,
                                          show_retired, limit, offset, single,
                                          include_paths, include_full_xml,
@@ -2888,7 +3300,9 @@ class TacticServerStub(object):
         @return:
         string - the resulting snapshot xml
         '''
-        return self.server.set_current_snapshot(self.ticket, snapshot_code)
+        result = self.server.set_current_snapshot(self.ticket, snapshot_code)
+        self._changed(search_types=['sthpw/snapshot', 'sthpw/file'])
+        return result
 
 
     def get_dependencies(self, snapshot_code, mode='explicit', tag='main',
@@ -2991,9 +3405,11 @@ class TacticServerStub(object):
         dictionary - task created
         ''' 
 
-        return self.server.create_task(self.ticket, search_key, process, subcontext,
-                                     description, bid_start_date, bid_end_date,
-                                     bid_duration, assigned)
+        result = self.server.create_task(self.ticket, search_key, process, subcontext,
+                                       description, bid_start_date, bid_end_date,
+                                       bid_duration, assigned)
+        self._changed(search_types=['sthpw/task'], search_keys=search_key)
+        return result
 
 
 
@@ -3018,8 +3434,10 @@ class TacticServerStub(object):
         @return:
         list - tasks created
         '''
-        return self.server.add_initial_tasks(self.ticket, search_key, pipeline_code,
-                                           processes, skip_duplicate, offset, start_date)
+        result = self.server.add_initial_tasks(self.ticket, search_key, pipeline_code,
+                                             processes, skip_duplicate, offset, start_date)
+        self._changed(search_types=['sthpw/task'], search_keys=search_key)
+        return result
 
 
 
@@ -3088,7 +3506,9 @@ class TacticServerStub(object):
         @return
         note that was created
         ''' 
-        return self.server.create_note(self.ticket, search_key, note, process, subcontext, user)
+        result = self.server.create_note(self.ticket, search_key, note, process, subcontext, user)
+        self._changed(search_types=['sthpw/note'], search_keys=search_key)
+        return result
 
 
     #
@@ -3201,7 +3621,9 @@ class TacticServerStub(object):
         event - name of event
         input - input data to send to the trigger
         '''
-        return self.server.call_trigger(self.ticket, search_key, event, input, process)
+        result = self.server.call_trigger(self.ticket, search_key, event, input, process)
+        self._changed(all=True)
+        return result
 
 
 
@@ -3214,7 +3636,9 @@ class TacticServerStub(object):
         event - the event to be set
         data - dictionary data that needs to be sent to the process
         '''
-        return self.server.call_pipeline_event(self.ticket, search_key, process, event, data)
+        result = self.server.call_pipeline_event(self.ticket, search_key, process, event, data)
+        self._changed(all=True)
+        return result
 
 
     def get_pipeline_status(self, search_key, process):
@@ -3711,7 +4135,9 @@ class TacticServerStub(object):
         @return:
             dictionary - returned data structure
         '''
-        return self.server.execute_python_script(self.ticket, script_path, kwargs)
+        result = self.server.execute_python_script(self.ticket, script_path, kwargs)
+        self._changed(all=True)
+        return result
 
 
     def execute_cmd(self, class_name, args={}, values={}):
@@ -3728,7 +4154,9 @@ class TacticServerStub(object):
         @return:
             string - description of command
         '''
-        return self.server.execute_cmd(self.ticket, class_name, args, values)
+        result = self.server.execute_cmd(self.ticket, class_name, args, values)
+        self._changed(all=True)
+        return result
 
 
 
@@ -3744,7 +4172,9 @@ class TacticServerStub(object):
         @return:
             dictionary - returned data structure
         '''
-        return self.server.execute_js_script(self.ticket, script_path, kwargs)
+        result = self.server.execute_js_script(self.ticket, script_path, kwargs)
+        self._changed(all=True)
+        return result
 
 
 
@@ -3773,8 +4203,13 @@ class TacticServerStub(object):
 
         server.execute_transaction(transaction_xml)
 
+        The TransactionBuilder builds the transaction xml from inserts,
+        updates and retires of sobjects.
         '''
-        return self.server.execute_transaction(self.ticket, transaction_xml, file_mode)
+        try:
+            return self.server.execute_transaction(self.ticket, transaction_xml, file_mode)
+        finally:
+            self._changed(all=True)
 
     def check_access(self, access_group, key, access, value=None, is_match=False, default="edit"):
         '''API Function: check_access(access_group, key, access, value, is_match, default="edit")
@@ -4019,41 +4454,17 @@ class TacticServerStub(object):
                 # this is dealt with in get_resource_path already
                 #if not self.login:
                 #    self.login = getpass.getuser()
-                file_path = self.get_resource_path()
-                if not os.path.exists(file_path):
-                    msg = "[%s] does not exist yet.  There is not enough information to authenticate the server. Either set the appropriate environment variables or run get_ticket.py" %file_path
+                # the parsed resource file is cached for the process
+                config = ResourceConfig.get(self.get_resource_path)
+                if not config.exists():
+                    msg = "[%s] does not exist yet.  There is not enough information to authenticate the server. Either set the appropriate environment variables or run get_ticket.py" % config.get_path()
                     raise TacticApiException(msg)
 
-                # try to open the resource file
-                file = open(file_path)
-                lines = file.readlines()
-                file.close()
-
-                rc_server = None
-                rc_ticket = None
-                rc_project = None
-                rc_login = None
-                rc_site = None
-
-                for line in lines:
-                    line = line.strip()
-                    if line.startswith("#"):
-                        continue
-                    name, value = line.split("=")
-                    if name == "server":
-                        #self.set_server(value)
-                        rc_server = value
-                    elif name == "ticket":
-                        #self.set_ticket(value)
-                        rc_ticket = value
-                    elif name == "project":
-                        #self.set_project(value)
-                        rc_project = value
-                    elif name == "login":
-                        #self.set_project(value)
-                        rc_login = value
-                    elif name == "site":
-                        rc_site = value
+                rc_server = config.get_value("server")
+                rc_ticket = config.get_value("ticket")
+                rc_project = config.get_value("project")
+                rc_login = config.get_value("login")
+                rc_site = config.get_value("site")
 
                 # these have to be issued in the correct order
                 if rc_server:
@@ -4078,9 +4489,9 @@ class TacticServerStub(object):
             if env_project:
                 self.set_project(env_project)
             if env_user:
-                # try to get a ticket with a set password
-                ticket = self.get_ticket(env_user, env_password, self.site)
-                self.set_ticket(ticket)
+                # try to get a ticket with a set password.  A ticket
+                # cached by another process for this user is used if valid
+                self._login(env_user, env_password, self.site)
             if env_ticket:
                 self.set_ticket(env_ticket)
 
@@ -4256,6 +4667,8 @@ class Search(object):
 
 
 class SObject(dict):
+    __slots__ = []
+
     def get_search_key(self):
         return self['__search_key__']
 
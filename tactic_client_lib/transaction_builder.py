@@ -0,0 +1,186 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['TransactionBuilder']
+
+import json
+
+import six
+
+from .search_key import SearchKey
+
+
+class TransactionBuilder(object):
+    '''Collects inserts, updates and retires of sobjects and sends them to
+    the server as a single execute_transaction call.
+
+        builder = TransactionBuilder(server)
+        builder.insert("prod/shot", {'code': 'SH001', 'frame_end': 100})
+        builder.update("prod/shot?project=bar&code=SH001", {'status': 'ready'})
+        builder.update(search_key, {'description': 'Big Money Shot'})
+        builder.retire(other_key)
+        builder.execute()
+
+    Operations on the same sobject are merged: later updates of a column
+    replace earlier ones, updates of an inserted sobject are added to the
+    insert and a retire is an update of s_status.  The transaction xml is
+    written with a streaming generator, so no DOM is built for very large
+    transactions.
+    '''
+
+    def __init__(self, stub=None, project_code=None):
+        '''
+        @params
+        stub: the server stub executing the transaction
+        project_code: the project of the search types without a project.
+            By default, the project of the stub
+        '''
+        self.stub = stub
+        if not project_code and stub:
+            project_code = stub.get_project()
+        self.project_code = project_code
+
+        # [action, search_type, code, data] in the order of the calls
+        self.operations = []
+        # (search_type, code) -> operation
+        self.index = {}
+
+
+    def get_search_type(self, search_type):
+        if search_type.startswith('sthpw/') or search_type.find('?') != -1:
+            return search_type
+        if not self.project_code:
+            raise ValueError("No project for search type [%s]" % search_type)
+        return "%s?project=%s" % (search_type, self.project_code)
+
+
+    def insert(self, search_type, data):
+        '''add an insert of an sobject'''
+        search_type = self.get_search_type(search_type)
+        code = data.get('code')
+        if code != None:
+            operation = self.index.get( (search_type, code) )
+            if operation and operation[0] == 'insert':
+                operation[3].update(data)
+                return
+        operation = ['insert', search_type, code, dict(data)]
+        self.operations.append(operation)
+        if code != None:
+            self.index[(search_type, code)] = operation
+
+
+    def update(self, search_key, data):
+        '''add an update of an sobject.  Only search keys with a code are
+        supported'''
+        if not data:
+            return
+        key = SearchKey.get(search_key)
+        if key.get_column() != 'code':
+            raise ValueError("Search key [%s] has no code" % search_key)
+        search_type = self.get_search_type(key.get_search_type())
+        code = key.get_code()
+
+        operation = self.index.get( (search_type, code) )
+        if operation:
+            operation[3].update(data)
+            return
+        operation = ['update', search_type, code, dict(data)]
+        self.operations.append(operation)
+        self.index[(search_type, code)] = operation
+
+
+    def retire(self, search_key):
+        '''add a retire of an sobject'''
+        self.update(search_key, {'s_status': 'retired'})
+
+
+    def __len__(self):
+        return len(self.operations)
+
+
+    def get_search_types(self):
+        search_types = []
+        for operation in self.operations:
+            if operation[1] not in search_types:
+                search_types.append(operation[1])
+        return search_types
+
+
+    def get_value(self, value):
+        if isinstance(value, six.string_types):
+            return value
+        if isinstance(value, (dict, list, tuple)):
+            return json.dumps(value)
+        return six.text_type(value)
+
+
+    def write(self, stream):
+        '''write the transaction xml to a stream opened for text, or for
+        bytes in Python2'''
+        from xml.sax.saxutils import XMLGenerator
+        writer = XMLGenerator(stream, "UTF-8")
+        writer.startDocument()
+        writer.startElement("transaction", {})
+        for action, search_type, code, data in self.operations:
+            attrs = {'search_type': search_type, 'action': action}
+            if code != None:
+                attrs['search_code'] = self.get_value(code)
+            writer.startElement("sobject", attrs)
+            for name, value in data.items():
+                attrs = {'name': name}
+                # a column without a to value is set to NULL
+                if value != None:
+                    attrs['to'] = self.get_value(value)
+                writer.startElement("column", attrs)
+                writer.endElement("column")
+            writer.endElement("sobject")
+        writer.endElement("transaction")
+        writer.endDocument()
+
+
+    def get_xml(self):
+        '''get the transaction xml as text'''
+        stream = six.StringIO()
+        self.write(stream)
+        xml = stream.getvalue()
+        # XMLGenerator writes encoded strings in Python2
+        if isinstance(xml, six.binary_type):
+            xml = xml.decode("UTF-8")
+        return xml
+
+
+    def execute(self, file_mode=None):
+        '''send the operations to the server as a single transaction and
+        clear them
+
+        @return
+        the result of execute_transaction
+        '''
+        if not self.stub:
+            raise ValueError("No server stub to execute the transaction")
+        if not self.operations:
+            return None
+
+        stub = self.stub
+        try:
+            result = stub.server.execute_transaction(stub.ticket, self.get_xml(), file_mode)
+        finally:
+            stub._changed(search_types=self.get_search_types())
+        self.clear()
+        return result
+
+
+    def clear(self):
+        self.operations = []
+        self.index = {}
+
+
@@ -0,0 +1,503 @@
+###########################################################
+#
+# Copyright (c) 2008, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+__all__ = ['TransferAgent', 'TransferHandle']
+
+import os, sys, time, json, random, threading, tempfile, getpass, sqlite3
+
+from .common.instrumentation import Instrumentation
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paths TEXT NOT NULL,
+    server TEXT,
+    project TEXT,
+    site TEXT,
+    login_ticket TEXT,
+    transaction_ticket TEXT,
+    method TEXT,
+    args TEXT,
+    state TEXT NOT NULL,
+    tries INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    pid INTEGER,
+    error TEXT,
+    result TEXT,
+    created REAL,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS job_state_idx ON job (state, next_try);
+'''
+
+
+class TransferHandle(object):
+    '''A handle on a background upload, returned as soon as the job is
+    written to the journal'''
+
+    def __init__(self, agent, job_id):
+        self.agent = agent
+        self.job_id = job_id
+
+    def get_id(self):
+        return self.job_id
+
+    def get_state(self):
+        return self.agent.get_job(self.job_id).get('state')
+
+    def done(self):
+        return self.get_state() in ['done', 'failed']
+
+    def get_error(self):
+        return self.agent.get_job(self.job_id).get('error')
+
+    def wait(self, timeout=None):
+        '''wait for the upload and the checkin to complete
+
+        @return
+        the result of the checkin call, or None if there is no checkin
+
+        @raise
+        TacticUploadException if the job has failed
+        '''
+        return self.agent.wait(self.job_id, timeout=timeout)
+
+
+
+class TransferAgent(object):
+    '''Uploads files in the background.
+
+    Upload jobs are written to a sqlite journal and executed by a pool of
+    threads, so that the caller gets a handle back immediately.  A job
+    which fails is retried with an exponential backoff.  Since the journal
+    is on disk, jobs which were not finished when a process exited are
+    picked up again by the next agent that starts with the same journal,
+    either in a client process or in a daemon started with:
+
+        python -m tactic_client_lib.transfer_agent
+
+    A job can carry a server call, ie: simple_checkin, which is made once
+    all of the files of the job have been uploaded:
+
+        handle = server.simple_checkin(search_key, context, path, mode='background')
+        ...
+        snapshot = handle.wait()
+
+    The journal is TACTIC_TRANSFER_JOURNAL or a file in the temp directory
+    of the current user.  It contains tickets and the jobs which are
+    executed with them, so a journal, or the default directory in the
+    temp dir, which is not private to the current user is refused.  Only
+    the check-in methods in METHODS can be called by a job.
+    '''
+
+    # the server methods which a job can call
+    METHODS = ['simple_checkin', 'group_checkin', 'directory_checkin', 'add_file']
+
+    def __init__(self, journal_path=None, workers=2, max_tries=8, backoff=2, max_backoff=300):
+        '''
+        @params
+        journal_path: path of the sqlite journal
+        workers: number of upload threads
+        max_tries: number of tries before a job fails
+        backoff: delay in seconds before the first retry.  It doubles
+            after every failure up to max_backoff
+        '''
+        if not journal_path:
+            journal_path = os.environ.get("TACTIC_TRANSFER_JOURNAL") or self.get_default_path()
+        self.journal_path = journal_path
+        self.workers = workers
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.threads = []
+        self.running = False
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
+
+        from .common.common import Common
+        from .common import TacticUploadException
+        dir = os.path.dirname(journal_path)
+        if dir and not os.path.exists(dir):
+            os.makedirs(dir, int("700", 8))
+        if journal_path == self.get_default_path() and not Common.check_private_path(dir):
+            raise TacticUploadException("Transfer journal directory [%s] is not private to the current user" % dir)
+
+        # create the journal readable only by the current user
+        fd = os.open(journal_path, os.O_RDWR | os.O_CREAT, int("600", 8))
+        os.close(fd)
+        if not Common.check_private_path(journal_path, is_dir=False):
+            raise TacticUploadException("Transfer journal [%s] is not private to the current user" % journal_path)
+
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+
+    def get_default_path(self):
+        try:
+            user = getpass.getuser()
+        except Exception:
+            user = "default"
+        return "%s/tactic_transfers_%s/journal.db" % (tempfile.gettempdir(), user)
+
+
+    def _connect(self):
+        # a connection can only be used in the thread that created it
+        conn = sqlite3.connect(self.journal_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+    def _update(self, job_id, **values):
+        values['updated'] = time.time()
+        names = sorted(values.keys())
+        sql = "UPDATE job SET %s WHERE id = ?" % ", ".join(["%s = ?" % x for x in names])
+        conn = self._connect()
+        try:
+            conn.execute(sql, [values[x] for x in names] + [job_id])
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.condition.acquire()
+        try:
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+
+
+    #
+    # jobs
+    #
+    def upload(self, stub, paths, method=None, args=None):
+        '''add an upload job
+
+        @params
+        stub: the server stub which the files are uploaded for
+        paths: a path or a list of paths to upload
+        method: a method of the server to call once the files are uploaded
+        args: the arguments of the method, after the ticket
+
+        @return
+        TransferHandle
+        '''
+        from .common import TacticUploadException
+        if method and method not in self.METHODS:
+            raise TacticUploadException("Method [%s] can not be called by a transfer job" % method)
+        if not isinstance(paths, list):
+            paths = [paths]
+        for path in paths:
+            if not os.path.isfile(path):
+                raise TacticUploadException("File [%s] does not exist" % path)
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''INSERT INTO job (paths, server, project,
+                site, login_ticket, transaction_ticket, method, args, state,
+                created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', [
+                json.dumps(paths), stub.get_server_name(), stub.get_project(),
+                stub.get_site(), stub.get_login_ticket(),
+                stub.get_transaction_ticket(), method, json.dumps(args or []),
+                'pending', now, now])
+            conn.commit()
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+
+        self.start()
+        self.condition.acquire()
+        try:
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+        return TransferHandle(self, job_id)
+
+
+    def get_handle(self, job_id):
+        '''get the handle of a job, ie: one added before a restart'''
+        return TransferHandle(self, job_id)
+
+
+    def get_job(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM job WHERE id = ?", [job_id]).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return {}
+        return dict( zip(row.keys(), tuple(row)) )
+
+
+    def get_jobs(self, state=None):
+        conn = self._connect()
+        try:
+            if state:
+                rows = conn.execute("SELECT * FROM job WHERE state = ? ORDER BY id", [state]).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM job ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        return [dict( zip(x.keys(), tuple(x)) ) for x in rows]
+
+
+    def wait(self, job_id, timeout=None):
+        '''wait for a job to complete.  See TransferHandle.wait()'''
+        if timeout != None:
+            end = time.time() + timeout
+        while True:
+            job = self.get_job(job_id)
+            state = job.get('state')
+            if state == 'done':
+                result = job.get('result')
+                if result:
+                    return json.loads(result)
+                return None
+            elif state == 'failed' or not job:
+                from .common import TacticUploadException
+                raise TacticUploadException("Background upload [%s] failed: %s" % (job_id, job.get('error')))
+
+            if timeout != None and time.time() >= end:
+                return None
+
+            # jobs may be completed by another process, so poll the journal
+            self.condition.acquire()
+            try:
+                self.condition.wait(0.5)
+            finally:
+                self.condition.release()
+
+
+    def clear(self, states=['done']):
+        '''remove finished jobs from the journal'''
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM job WHERE state IN (%s)" % ", ".join(["?"] * len(states)), states)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+
+    #
+    # workers
+    #
+    def start(self):
+        self.lock.acquire()
+        try:
+            self.threads = [x for x in self.threads if x.is_alive()]
+            if self.running and self.threads:
+                return
+            self.running = True
+            self._recover()
+            for i in range(self.workers - len(self.threads)):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        finally:
+            self.lock.release()
+
+
+    def stop(self):
+        self.condition.acquire()
+        try:
+            self.running = False
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+
+    def _is_alive(self, pid):
+        if not pid:
+            return False
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return False
+        except Exception:
+            # os.kill is not available on all platforms
+            return True
+        return True
+
+
+    def _recover(self):
+        '''put back the jobs of processes which died during the upload'''
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, pid, state FROM job WHERE state IN ('uploading', 'completing')").fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            if row['pid'] != os.getpid() and not self._is_alive(row['pid']):
+                if row['state'] == 'completing':
+                    state = 'uploaded'
+                else:
+                    state = 'pending'
+                self._update(row['id'], state=state, pid=None)
+
+
+    def _claim(self):
+        '''take the next job which is due'''
+        conn = self._connect()
+        try:
+            # an immediate transaction makes sure a job is only claimed once
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute('''SELECT * FROM job WHERE state IN
+                    ('pending', 'uploaded') AND next_try <= ? ORDER BY id
+                    LIMIT 1''', [time.time()]).fetchone()
+                if row:
+                    if row['state'] == 'pending':
+                        state = 'uploading'
+                    else:
+                        state = 'completing'
+                    conn.execute("UPDATE job SET state = ?, pid = ?, updated = ? WHERE id = ?",
+                            [state, os.getpid(), time.time(), row['id']])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        job = dict( zip(row.keys(), tuple(row)) )
+        job['state'] = state
+        return job
+
+
+    def _run(self):
+        while self.running:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if not job:
+                self.condition.acquire()
+                try:
+                    if self.running:
+                        self.condition.wait(1)
+                finally:
+                    self.condition.release()
+                continue
+
+            self.execute(job)
+
+
+    def execute(self, job):
+        '''upload the files of a job and make its server call'''
+        start = time.time()
+        size = 0
+        error = None
+
+        method = job.get('method')
+        if method and method not in self.METHODS:
+            # never retried
+            self._update(job['id'], state='failed', pid=None,
+                    error="Method [%s] can not be called by a transfer job" % method)
+            return
+
+        try:
+            stub = self.get_stub(job)
+            paths = json.loads(job.get('paths'))
+            if job.get('state') == 'uploading':
+                for path in paths:
+                    size += os.path.getsize(path)
+                    self._upload(stub, path)
+                # the files are on the server: if the call fails, it is
+                # retried without uploading again
+                self._update(job['id'], state='completing')
+
+            result = None
+            if method:
+                result = self._complete(stub, method, json.loads(job.get('args')))
+            self._update(job['id'], state='done', error=None, result=json.dumps(result, default=str))
+
+        except Exception as e:
+            error = e
+            tries = job.get('tries') + 1
+            if tries >= self.max_tries:
+                state = 'failed'
+            elif self.get_job(job['id']).get('state') == 'completing':
+                state = 'uploaded'
+            else:
+                state = 'pending'
+            delay = min(self.backoff * (2 ** (tries-1)), self.max_backoff)
+            # add jitter so that failed jobs do not all retry together
+            delay = delay * random.uniform(0.5, 1.0)
+            self._update(job['id'], state=state, tries=tries,
+                    next_try=time.time() + delay, error=str(e), pid=None)
+
+        Instrumentation.get().record("background_upload", time.time() - start,
+                request_bytes=size, retries=job.get('tries'), error=error)
+
+
+    def get_stub(self, job):
+        '''get a server stub for the server, project and tickets of a job'''
+        from .tactic_server_stub import TacticServerStub
+        stub = TacticServerStub(setup=False, protocol='xmlrpc', site=job.get('site'))
+        stub.set_server(job.get('server'))
+        stub.set_project(job.get('project'))
+        stub.set_ticket(job.get('login_ticket'))
+        if job.get('transaction_ticket'):
+            stub.set_transaction_ticket(job.get('transaction_ticket'))
+        return stub
+
+
+    def _upload(self, stub, path):
+        stub.upload_file(path)
+
+
+    def _complete(self, stub, method, args):
+        return getattr(stub.get_server(), method)(stub.ticket, *args)
+
+
+
+    agent = None
+    def get(cls):
+        if not cls.agent:
+            cls.agent = TransferAgent()
+        return cls.agent
+    get = classmethod(get)
+
+
+
+def main():
+    '''run the agent of the journal until it is interrupted'''
+    agent = TransferAgent.get()
+    agent.start()
+    sys.stdout.write("Transfer agent running on [%s]\n" % agent.journal_path)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        agent.stop()
+
+
+if __name__ == "__main__":
+    main()
+
+
@@ -0,0 +1,401 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+'''Benchmarks of the hot paths of the client api.  A local stand-in for
+the TACTIC server (xmlrpc api, UploadServer and static files) is started
+in a thread, so no TACTIC installation is needed.
+
+    python benchmark.py [--quick] [--output results.json]
+
+The results are written as json: one entry per benchmark and parameter
+set with the best time of several runs, so that they can be compared
+between revisions.
+'''
+
+import os, sys, time, json, shutil, tempfile, threading, platform, getopt
+
+try:
+    import xmlrpclib
+    from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    from socketserver import ThreadingMixIn
+
+# import the client lib
+sys.path.insert( 0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) )
+from tactic_client_lib import TacticServerStub
+
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+
+class FakeApi(object):
+    '''implements the few api methods used by the benchmarks'''
+
+    def __init__(self, handoff_dir):
+        self.handoff_dir = handoff_dir
+        self.rows = {}
+
+    def _get_rows(self, count):
+        rows = self.rows.get(count)
+        if rows == None:
+            rows = []
+            for i in range(count):
+                rows.append( {
+                    'id': i,
+                    'code': 'SHOT%05d' % i,
+                    'name': 'shot %s' % i,
+                    'description': 'description of shot %s' % i,
+                    'status': 'in_progress',
+                    'frame_start': 1,
+                    'frame_end': 100 + i,
+                    'login': 'admin',
+                    'timestamp': '2012-01-01 00:00:00',
+                    '__search_key__': 'prod/shot?project=bench&code=SHOT%05d' % i,
+                } )
+            self.rows[count] = rows
+        return rows
+
+    def ping(self, ticket):
+        return "OK"
+
+    def query(self, ticket, search_type, filters=[], columns=[], order_bys=[],
+            show_retired=False, limit=None, offset=None, single=False,
+            distinct=None, return_sobjects=False, parent_key=None):
+        return self._get_rows(int(limit or 0))
+
+    def get_handoff_dir(self, ticket):
+        return self.handoff_dir
+
+    def simple_checkin(self, ticket, search_key, context, path, *args):
+        return {'code': 'SNAPSHOT00001', 'context': context}
+
+
+
+class FakeRequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/tactic/default/Api/',)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.find("/UploadServer/") == -1:
+            return SimpleXMLRPCRequestHandler.do_POST(self)
+
+        # read and discard the uploaded data
+        remaining = int(self.headers.get("content-length") or 0)
+        while remaining > 0:
+            data = self.rfile.read( min(remaining, 1024*1024) )
+            if not data:
+                break
+            remaining -= len(data)
+
+        self.send_response(200, "OK")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+
+    def do_GET(self):
+        path = "%s/%s" % (self.server.static_dir, os.path.basename(self.path))
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        f = open(path, "rb")
+        try:
+            shutil.copyfileobj(f, self.wfile, 1024*1024)
+        finally:
+            f.close()
+
+
+
+class FakeServer(ThreadingMixIn, SimpleXMLRPCServer):
+    '''Local stand-in for a TACTIC server'''
+    daemon_threads = True
+
+    def __init__(self, tmp_dir):
+        SimpleXMLRPCServer.__init__(self, ("127.0.0.1", 0), FakeRequestHandler,
+                logRequests=False, allow_none=True)
+
+        self.static_dir = "%s/static" % tmp_dir
+        os.makedirs(self.static_dir)
+        handoff_dir = "%s/handoff" % tmp_dir
+        os.makedirs(handoff_dir)
+
+        self.register_instance(FakeApi(handoff_dir))
+
+    def get_server_name(self):
+        return "127.0.0.1:%s" % self.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+
+
+class Benchmark(object):
+
+    def __init__(self, quick=False):
+        self.quick = quick
+        self.results = []
+        self.repeat = quick and 2 or 5
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = FakeServer(self.tmp_dir)
+        self.server.start()
+
+        self.stub = TacticServerStub(server=self.server.get_server_name(),
+                project="bench", ticket="bench")
+
+
+    def cleanup(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+
+    def measure(self, name, func, params={}, size=None, setup=None):
+        '''time a function.  The best of the runs is kept
+
+        @params
+        name: the name of the benchmark
+        func: the function to time
+        params: the parameters of this run, stored with the result
+        size: the number of bytes processed, to calculate a throughput
+        setup: function called, untimed, before each run
+        '''
+        times = []
+        for i in range(self.repeat):
+            if setup:
+                setup()
+            start = timer()
+            func()
+            times.append( timer() - start )
+
+        best = min(times)
+        result = {
+            'name': name,
+            'params': params,
+            'best': best,
+            'mean': sum(times) / len(times),
+            'repeat': len(times),
+        }
+        if size and best:
+            result['bytes_per_second'] = size / best
+        self.results.append(result)
+        # progress goes to stderr so that stdout is only the json
+        sys.stderr.write("%-24s %-40s %.6f s\n" % (name, json.dumps(params, sort_keys=True), best))
+
+
+    def skip(self, name, reason):
+        self.results.append( {
+            'name': name,
+            'skipped': reason,
+        } )
+        sys.stderr.write("%-24s skipped: %s\n" % (name, reason))
+
+
+    def _create_file(self, path, size):
+        block = os.urandom(1024*1024)
+        f = open(path, "wb")
+        try:
+            while size > 0:
+                f.write( block[:min(size, len(block))] )
+                size -= len(block)
+        finally:
+            f.close()
+
+
+    #
+    # benchmarks
+    #
+    def run_query(self):
+        counts = [10, 100, 1000, 10000]
+        if self.quick:
+            counts = [10, 100, 1000]
+
+        for count in counts:
+            self.measure("query", lambda: self.stub.query("prod/shot", limit=count), {'rows': count})
+
+            # decoding of the response only
+            response = xmlrpclib.dumps( (self.server.instance._get_rows(count),), methodresponse=True, allow_none=True)
+            self.measure("query_decode", lambda: xmlrpclib.loads(response), {'rows': count}, size=len(response))
+
+
+    def run_upload(self):
+        size = (self.quick and 8 or 64) * 1024 * 1024
+        path = "%s/upload.bin" % self.tmp_dir
+        self._create_file(path, size)
+
+        for chunk_size in [1, 4, 10, 32]:
+            chunk_size = chunk_size * 1024 * 1024
+            if chunk_size > size:
+                continue
+            self.measure("upload_file", lambda: self.stub.upload_file(path, chunk_size=chunk_size),
+                    {'size': size, 'chunk_size': chunk_size}, size=size)
+        os.remove(path)
+
+
+    def run_download(self):
+        sizes = [1, 16]
+        if not self.quick:
+            sizes.append(128)
+
+        to_dir = "%s/download" % self.tmp_dir
+        for size in sizes:
+            size = size * 1024 * 1024
+            filename = "download_%s.bin" % size
+            self._create_file("%s/%s" % (self.server.static_dir, filename), size)
+            url = "http://%s/assets/%s" % (self.server.get_server_name(), filename)
+
+            def setup():
+                if os.path.exists(to_dir):
+                    shutil.rmtree(to_dir)
+            self.measure("download", lambda: self.stub.download(url, to_dir=to_dir),
+                    {'size': size}, size=size, setup=setup)
+
+
+    def run_directory_checkin(self):
+        counts = [10, 1000]
+        for count in counts:
+            dir = "%s/checkin_%s" % (self.tmp_dir, count)
+            size = 0
+            for i in range(count):
+                sub_dir = "%s/sub%02d" % (dir, i % 10)
+                if not os.path.exists(sub_dir):
+                    os.makedirs(sub_dir)
+                data = os.urandom(16*1024)
+                f = open("%s/file%05d.bin" % (sub_dir, i), "wb")
+                f.write(data)
+                f.close()
+                size += len(data)
+
+            self.measure("directory_checkin",
+                    lambda: self.stub.directory_checkin("prod/shot?project=bench&code=SHOT00001", "publish", dir),
+                    {'files': count}, size=size)
+
+
+    def run_maya_parser(self):
+        try:
+            from tactic_client_lib.maya.maya_parser import MayaParser, MayaParserTextureFilter, MayaParserReferenceFilter
+        except ImportError as e:
+            self.skip("maya_parser", str(e))
+            return
+
+        counts = [100, 10000]
+        for count in counts:
+            path = "%s/scene_%s.ma" % (self.tmp_dir, count)
+            f = open(path, "w")
+            f.write("//Maya ASCII 2012 scene\n")
+            for i in range(count):
+                f.write('file -rdi 1 -ns "ref%s" -rfn "ref%sRN" "/assets/ref%s.ma";\n' % (i, i, i))
+            for i in range(count):
+                f.write('createNode file -n "file%s";\n' % i)
+                f.write('\tsetAttr ".ftn" -type "string" "/textures/tex%s.tif";\n' % i)
+                f.write('createNode transform -n "node%s";\n' % i)
+                f.write('\tsetAttr ".t" -type "double3" 0 %s 0 ;\n' % i)
+            f.close()
+
+            def parse():
+                parser = MayaParser(path)
+                parser.add_filter(MayaParserTextureFilter())
+                parser.add_filter(MayaParserReferenceFilter())
+                parser.parse()
+            self.measure("maya_parser", parse, {'nodes': count}, size=os.path.getsize(path))
+
+
+    def run_pipeline(self):
+        from tactic_client_lib.interpreter import pipeline
+        if pipeline.IMPORT_ERROR:
+            self.skip("pipeline", pipeline.IMPORT_ERROR)
+            return
+
+        for count in [10, 100]:
+            xml = ["<pipeline>"]
+            for i in range(count):
+                xml.append('<process name="process%s"><action class="Handler%s"><option>%s</option></action></process>' % (i, i, i))
+            for i in range(count-1):
+                xml.append('<connect from="process%s" to="process%s"/>' % (i, i+1))
+            xml.append("</pipeline>")
+            xml = "".join(xml)
+
+            def lookups():
+                p = pipeline.Pipeline(xml)
+                for i in range(count):
+                    name = "process%s" % i
+                    p.get_output_process_names(name)
+                    p.get_input_process_names(name)
+                    p.get_handler_class(name)
+                    p.get_action_options(name)
+            self.measure("pipeline", lookups, {'processes': count})
+
+
+    def execute(self):
+        self.run_query()
+        self.run_upload()
+        self.run_download()
+        self.run_directory_checkin()
+        self.run_maya_parser()
+        self.run_pipeline()
+
+        return {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': self.quick,
+            'results': self.results,
+        }
+
+
+
+def main(args):
+    opts, args = getopt.getopt(args, "qo:", ["quick", "output="])
+    quick = False
+    output = None
+    for opt, value in opts:
+        if opt in ["-q", "--quick"]:
+            quick = True
+        elif opt in ["-o", "--output"]:
+            output = value
+
+    benchmark = Benchmark(quick=quick)
+    try:
+        data = benchmark.execute()
+    finally:
+        benchmark.cleanup()
+
+    data = json.dumps(data, indent=2, sort_keys=True)
+    if output:
+        f = open(output, "w")
+        f.write(data)
+        f.close()
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
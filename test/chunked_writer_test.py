@@ -0,0 +1,219 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, threading
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.chunked_writer import ChunkedWriter, ChunkedWriteException
+from tactic_client_lib.tactic_server_stub import TacticServerStub
+
+
+class FakeServer(object):
+    '''records the rows sent to insert_multiple and update_multiple'''
+    def __init__(my, fail=[]):
+        my.calls = []
+        my.fail = fail
+        my.lock = threading.Lock()
+
+    def insert_multiple(my, ticket, search_type, data, metadata, parent_key, use_id, triggers):
+        with my.lock:
+            my.calls.append( (ticket, [x.get('code') for x in data], len(metadata)) )
+        for row in data:
+            if row.get('code') in my.fail:
+                raise Exception("failed to insert [%s]" % row.get('code'))
+        return [dict(x, __search_key__="prod/shot?code=%s" % x.get('code')) for x in data]
+
+    def update_multiple(my, ticket, data, triggers):
+        with my.lock:
+            my.calls.append( (ticket, sorted(data.keys()), 0) )
+        if my.fail == 'none':
+            return None
+        return list(data.keys())
+
+
+class FakeStub(object):
+    '''a stub in a transaction'''
+    protocol = 'xmlrpc'
+    def __init__(my, server):
+        my.server = server
+        my.login_ticket = 'login'
+        my.ticket = 'transaction'
+        my.transaction_ticket = 'transaction'
+        my.transactions = []
+    def get_login_ticket(my):
+        return my.login_ticket
+    def get_transaction_ticket(my):
+        return my.transaction_ticket
+    def set_login_ticket(my, ticket):
+        my.login_ticket = ticket
+        my.ticket = ticket
+        my.transaction_ticket = ticket
+    def start(my, title):
+        my.transactions.append("start")
+        my.ticket = 'transaction'
+        my.transaction_ticket = 'transaction'
+    def finish(my):
+        my.transactions.append("finish")
+        my.set_login_ticket(my.login_ticket)
+    def abort(my):
+        my.transactions.append("abort")
+        # like the stub, abort() clears the tickets
+        my.ticket = None
+        my.transaction_ticket = None
+
+
+class FakeWriter(ChunkedWriter):
+    def get_stub(my, stub):
+        return stub
+
+
+class ChunkedWriterTest(unittest.TestCase):
+
+    def setUp(my):
+        my.shots = [{'code': 'SH%0.4d' % i, 'description': 'x' * (i % 3) * 100} for i in range(25)]
+        my.server = FakeServer()
+        my.stub = TacticServerStub(setup=False)
+        my.stub.server = my.server
+        # in a transaction of the caller
+        my.stub.set_login_ticket('login')
+        my.stub.set_transaction_ticket('transaction')
+
+
+    def test_all(my):
+        my._test_chunks()
+        my._test_insert()
+        my._test_update()
+        my._test_failures()
+        my._test_parallel()
+
+
+    def _test_chunks(my):
+        writer = ChunkedWriter(max_rows=10, max_bytes=1000)
+        sizes = [300] * 5 + [2000] + [10] * 20
+        my.assertEqual(3, writer.get_chunk(sizes, 0))
+        my.assertEqual(5, writer.get_chunk(sizes, 3))
+        # a chunk always has a row
+        my.assertEqual(6, writer.get_chunk(sizes, 5))
+        my.assertEqual(16, writer.get_chunk(sizes, 6))
+
+        # chunks get smaller on a slow server
+        writer.target_time = 1
+        writer._measure(400, 1.0)
+        my.assertEqual(1, writer.get_chunk(sizes, 0))
+
+
+    def _test_insert(my):
+        # small writes are a single call
+        results = my.stub.insert_multiple("prod/shot", my.shots[:5], metadata=[{}] * 5)
+        my.assertEqual(1, len(my.server.calls))
+        my.assertEqual(5, len(results))
+
+        my.server.calls = []
+        my.stub.set_chunked_writer( ChunkedWriter(max_rows=10) )
+        results = my.stub.insert_multiple("prod/shot", my.shots, metadata=[{}] * 25)
+        my.assertEqual([10, 10, 5], [len(x[1]) for x in my.server.calls])
+        my.assertEqual([10, 10, 5], [x[2] for x in my.server.calls])
+        my.assertEqual([x.get('code') for x in my.shots], [x.get('code') for x in results])
+
+
+    def _test_update(my):
+        my.server.calls = []
+        data = dict([("prod/shot?code=%s" % x.get('code'), {'status': 'ready'}) for x in my.shots])
+        results = my.stub.update_multiple(data)
+        my.assertEqual([10, 10, 5], [len(x[1]) for x in my.server.calls])
+        my.assertEqual(sorted(data.keys()), sorted(results))
+
+        # a single chunk has the same shape
+        small = dict(list(data.items())[:3])
+        my.assertEqual(sorted(small.keys()), sorted(my.stub.update_multiple(small)))
+
+        # and so has a server which returns nothing
+        my.server.fail = 'none'
+        try:
+            my.assertEqual([], my.stub.update_multiple(small))
+            my.assertEqual([], my.stub.update_multiple(data))
+        finally:
+            my.server.fail = []
+
+
+    def _test_failures(my):
+        my.server.calls = []
+        my.server.fail = ['SH0012']
+        try:
+            my.stub.insert_multiple("prod/shot", my.shots)
+        except ChunkedWriteException as e:
+            my.assertEqual(15, len(e.results))
+            my.assertEqual([(10, 20)], [x[:2] for x in e.failures])
+        else:
+            my.fail("failed chunk not reported")
+        # the other chunks were still sent
+        my.assertEqual(3, len(my.server.calls))
+        my.server.fail = []
+
+
+    def _test_parallel(my):
+        server = FakeServer()
+        stub = FakeStub(server)
+        writer = FakeWriter(max_rows=4, parallel=3)
+
+        def insert(stub, start, end):
+            return stub.server.insert_multiple(stub.ticket, "prod/shot", my.shots[start:end], [], None, False, True)
+
+        results = writer.execute(stub, insert, my.shots)
+        my.assertEqual(25, len(results))
+        my.assertEqual([x.get('code') for x in my.shots], [x.get('code') for x in results])
+        my.assertEqual(7, len(server.calls))
+        # all of the chunks are in the same transaction
+        my.assertEqual(set(['transaction']), set([x[0] for x in server.calls]))
+        my.assertEqual([], stub.transactions)
+
+        # a transaction is started when there is none, and aborted on failure
+        stub.set_login_ticket('login')
+        server.fail = ['SH0001']
+        my.assertRaises(ChunkedWriteException, writer.execute, stub, insert, my.shots)
+        my.assertEqual(["start", "abort"], stub.transactions)
+        # the stub can be used after the abort
+        my.assertEqual('login', stub.ticket)
+        my.assertEqual('login', stub.get_transaction_ticket())
+
+        stats = writer.get_stats()
+        my.assertEqual(2, stats.get('calls'))
+        my.assertEqual(1, stats.get('failures'))
+
+        # sequential chunks are in a transaction too, and stop at the failure
+        stub.transactions = []
+        server.calls = []
+        try:
+            writer.execute(stub, insert, my.shots, parallel=1)
+        except ChunkedWriteException as e:
+            my.assertEqual([], e.results)
+        else:
+            my.fail("failed chunk not reported")
+        my.assertEqual(["start", "abort"], stub.transactions)
+        my.assertEqual(1, len(server.calls))
+        my.assertEqual('login', stub.ticket)
+
+        server.fail = []
+        stub.transactions = []
+        results = writer.execute(stub, insert, my.shots, parallel=1)
+        my.assertEqual(25, len(results))
+        my.assertEqual(["start", "finish"], stub.transactions)
+        my.assertEqual('login', stub.get_transaction_ticket())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
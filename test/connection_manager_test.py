@@ -0,0 +1,161 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, time, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.connection_manager import ConnectionManager
+from tactic_client_lib.common.retry_policy import RetryServerProxy
+from tactic_client_lib.tactic_server_stub import TacticServerStub
+
+try:
+    import xmlrpclib
+except ImportError:
+    from xmlrpc import client as xmlrpclib
+
+
+class FakeStub(object):
+    def __init__(my):
+        my.count = 0
+        my.site = None
+    def get_server_name(my):
+        return "localhost"
+    def get_server(my):
+        return None
+    def set_site(my, site):
+        my.site = site
+    def get_ticket(my, login, password, site=None):
+        my.count += 1
+        return "ticket%s" % my.count
+
+
+class FakeServer(object):
+    '''rejects the tickets which it did not issue'''
+    def __init__(my):
+        my.tickets = []
+    def get_ticket(my, login, password, site):
+        my.tickets.append("ticket%s" % (len(my.tickets) + 1))
+        return my.tickets[-1]
+    def ping(my, ticket):
+        if ticket.get('ticket') not in my.tickets:
+            raise xmlrpclib.Fault(1, "Cannot login with key: %s. User may be disabled" % ticket.get('ticket'))
+        return "OK"
+
+
+class ConnectionManagerTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp()
+        my.manager = ConnectionManager(ticket_ttl=60)
+        my.manager.get_cache_dir = lambda: my.tmp_dir
+        my.env = os.environ.get(ConnectionManager.ENV_NAME)
+
+    def tearDown(my):
+        ConnectionManager.manager = None
+        shutil.rmtree(my.tmp_dir)
+        if my.env == None:
+            os.environ.pop(ConnectionManager.ENV_NAME, None)
+        else:
+            os.environ[ConnectionManager.ENV_NAME] = my.env
+
+
+    def test_all(my):
+        my._test_cache()
+        my._test_shared()
+        my._test_invalidate()
+        my._test_relogin()
+        my._test_cache_dir()
+
+
+    def _test_cache(my):
+        stub = FakeStub()
+        my.assertEqual("ticket1", my.manager.get_ticket(stub, "joe", "pw"))
+        my.assertEqual("ticket1", my.manager.get_ticket(stub, "joe", "pw"))
+        my.assertEqual(1, stub.count)
+
+        # a different password does not share the ticket
+        my.assertEqual("ticket2", my.manager.get_ticket(stub, "joe", "other"))
+
+
+    def _test_shared(my):
+        # another process finds the ticket in the environment or the file
+        stub = FakeStub()
+        manager = ConnectionManager(ticket_ttl=60)
+        manager.get_cache_dir = lambda: my.tmp_dir
+        my.assertEqual("ticket1", manager.get_ticket(stub, "joe", "pw"))
+
+        os.environ.pop(ConnectionManager.ENV_NAME, None)
+        manager = ConnectionManager(ticket_ttl=60)
+        manager.get_cache_dir = lambda: my.tmp_dir
+        my.assertEqual("ticket1", manager.get_ticket(stub, "joe", "pw"))
+        my.assertEqual(0, stub.count)
+
+
+    def _test_invalidate(my):
+        stub = FakeStub()
+        my.manager.invalidate(stub, "joe", "pw")
+        my.assertEqual("ticket1", my.manager.get_ticket(stub, "joe", "pw"))
+        my.assertEqual(1, stub.count)
+
+
+    def _test_relogin(my):
+        ConnectionManager.manager = my.manager
+        server = FakeServer()
+        stub = TacticServerStub(setup=False)
+        stub.server_name = "localhost"
+        stub.server = RetryServerProxy(server, relogin=stub._relogin)
+
+        # a cached ticket which the server does not know
+        key = my.manager.get_key("localhost", "joe", "pw")
+        my.manager._set_cached(key, "stale", time.time() + 60)
+        stub._login("joe", "pw")
+        my.assertEqual("stale", stub.get_login_ticket())
+
+        # the call is sent again once with a new ticket
+        my.assertEqual("OK", stub.server.ping(stub.ticket))
+        my.assertEqual(["ticket1"], server.tickets)
+        my.assertEqual("ticket1", stub.get_login_ticket())
+        my.assertEqual("ticket1", my.manager.get_ticket(stub, "joe", "pw"))
+
+        # a ticket which was not from the connection manager is not replaced
+        stub.set_ticket("other")
+        my.assertRaises(xmlrpclib.Fault, stub.server.ping, stub.ticket)
+        my.assertEqual(["ticket1"], server.tickets)
+
+
+    def _test_cache_dir(my):
+        if not hasattr(os, "getuid"):
+            return
+        my.assertEqual(True, my.manager.check_cache_dir(my.tmp_dir))
+
+        # a ticket cache which other users can read is not used
+        os.chmod(my.tmp_dir, int("755", 8))
+        my.assertEqual(False, my.manager.check_cache_dir(my.tmp_dir))
+        stub = FakeStub()
+        manager = ConnectionManager(ticket_ttl=60)
+        manager.get_cache_dir = lambda: my.tmp_dir
+        os.environ.pop(ConnectionManager.ENV_NAME, None)
+        manager.get_ticket(stub, "ann", "pw")
+        my.assertEqual(False, os.path.exists("%s/%s.json" % (my.tmp_dir, manager.get_key("localhost", "ann", "pw"))))
+
+        # nor is a link to a directory
+        link = "%s/link" % my.tmp_dir
+        os.mkdir("%s/dir" % my.tmp_dir, int("700", 8))
+        os.symlink("%s/dir" % my.tmp_dir, link)
+        my.assertEqual(False, my.manager.check_cache_dir(link))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile, socket, threading, json
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+class FakeScm(object):
+    '''an scm implementation which does not connect to anything'''
+    def __init__(my, **kwargs):
+        my.kwargs = kwargs
+        my.log = []
+    def set_root(my, root):
+        pass
+    def set_branch(my, branch):
+        pass
+    def set_sync_dir(my, sync_dir):
+        pass
+    def get_log(my):
+        return my.log
+    def check_connection(my):
+        pass
+    def status(my, *args):
+        my.log.append("status")
+        return {'args': list(args), 'user': my.kwargs.get("user")}
+    def _connect(my):
+        return "private"
+    name = "not callable"
+
+
+class FakeServer(threading.Thread):
+    '''listens on a port and answers anything with a wrong proof'''
+    def __init__(my):
+        super(FakeServer, my).__init__()
+        my.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        my.sock.bind(("127.0.0.1", 0))
+        my.sock.listen(1)
+        my.port = my.sock.getsockname()[1]
+        my.received = []
+
+    def run(my):
+        conn, address = my.sock.accept()
+        rfile = conn.makefile('rb')
+        while True:
+            line = rfile.readline()
+            if not line:
+                break
+            my.received.append(json.loads(line.decode("UTF8")))
+            conn.sendall(b'{"proof": "0000"}\n')
+        rfile.close()
+        conn.close()
+        my.sock.close()
+
+
+
+class DelegateTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp().replace("\\", "/")
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the scm modules are only supported in Python2
+            return
+
+        from tactic_client_lib.scm import delegate, delegate_server
+        delegate.PerforceImpl = FakeScm
+        delegate_server.PerforceImpl = FakeScm
+        delegate.get_tactic_data_dir = lambda: my.tmp_dir
+        delegate_server.get_tactic_data_dir = lambda: my.tmp_dir
+
+        my.delegate = delegate
+        my.delegate_server = delegate_server
+
+        my._test_dispatch()
+        my._test_run()
+        my._test_token()
+        my._test_server()
+
+
+    def _get_free_port(my):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+
+    def _test_dispatch(my):
+        DelegateCmd = my.delegate.DelegateCmd
+        ScmException = my.delegate.ScmException
+
+        cmd = DelegateCmd(scm=FakeScm(user="admin"), method="status", args=["a.ma"])
+        ret_val = cmd.execute()
+        my.assertEqual({'args': ['a.ma'], 'user': 'admin'}, ret_val.get("value"))
+        my.assertEqual(["status"], ret_val.get("log"))
+
+        # only public methods of the scm can be called
+        for method in ["_connect", "__init__", "unknown", "name", None]:
+            cmd = DelegateCmd(scm=FakeScm(), method=method)
+            my.assertRaises(ScmException, cmd.execute)
+
+
+    def _test_run(my):
+        run = my.delegate.run
+
+        # the files of each job are in a directory of their own
+        base = "%s/temp/output" % my.tmp_dir
+        os.makedirs("%s/job2" % base, int("700", 8))
+        f = open("%s/job2/kwargs.json" % base, "w")
+        f.write(json.dumps({'method': 'status', 'args': ['job2.ma']}))
+        f.close()
+
+        ret_val = run({'method': 'status', 'args': ['job1.ma']}, job_id="job1")
+        my.assertEqual('OK', ret_val.get("status"))
+        ret_val = run(job_id="job2")
+        my.assertEqual('OK', ret_val.get("status"))
+        ret_val = run({'method': '_connect'}, job_id="job3")
+        my.assertEqual('error', ret_val.get("status"))
+
+        for job_id in ["job1", "job2", "job3"]:
+            f = open("%s/%s/output.json" % (base, job_id))
+            output = json.loads(f.read())
+            f.close()
+            if job_id == "job3":
+                my.assertEqual("Invalid method [_connect]", output.get("msg"))
+            else:
+                my.assertEqual(['%s.ma' % job_id], output.get("value").get("args"))
+        my.assertEqual(False, os.path.exists("%s/output.json" % base))
+
+
+    def _test_token(my):
+        DelegateServer = my.delegate_server.DelegateServer
+        DelegateClient = my.delegate_server.DelegateClient
+        ScmException = my.delegate_server.ScmException
+
+        server = DelegateServer(port=my._get_free_port())
+        try:
+            path = DelegateServer.get_token_path()
+            my.assertEqual("%s/temp/delegate.token" % my.tmp_dir, path)
+            my.assertEqual(server.token, open(path).read())
+            if not hasattr(os, "getuid"):
+                return
+            my.assertEqual(int("600", 8), os.stat(path).st_mode & int("777", 8))
+
+            # a token which other users can read is refused
+            os.chmod(path, int("644", 8))
+            my.assertRaises(ScmException, DelegateClient, port=server.server_address[1])
+
+            # and so is a token directory which they can write to
+            os.chmod(os.path.dirname(path), int("777", 8))
+            my.assertRaises(ScmException, server.write_token, "abc")
+            os.chmod(os.path.dirname(path), int("700", 8))
+        finally:
+            server.server_close()
+
+
+    def _test_server(my):
+        DelegateServer = my.delegate_server.DelegateServer
+        DelegateClient = my.delegate_server.DelegateClient
+        ScmException = my.delegate_server.ScmException
+
+        server = DelegateServer(port=my._get_free_port(), token="secret")
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        port = server.server_address[1]
+        try:
+            client = DelegateClient(port=port, token="secret")
+            try:
+                ret_val = client.execute(method="status", args=["a.ma"], user="admin", password="pw")
+                my.assertEqual('OK', ret_val.get("status"))
+                my.assertEqual({'args': ['a.ma'], 'user': 'admin'}, ret_val.get("value"))
+
+                ret_val = client.execute(method="_connect", user="admin", password="pw")
+                my.assertEqual('error', ret_val.get("status"))
+                my.assertEqual("Invalid method [_connect]", ret_val.get("msg"))
+
+                results = list(client.execute_many([{'method': 'status', 'args': [x]} for x in ["a", "b"]]))
+                my.assertEqual([(3, ['a']), (4, ['b'])], [(x.get("id"), x.get("value").get("args")) for x in results])
+            finally:
+                client.close()
+
+            # a request with another token is refused
+            ret_val = server.execute({"id": 1, "token": "other", "kwargs": {"method": "status"}})
+            my.assertEqual("Invalid token", ret_val.get("msg"))
+
+            # a client with another token does not trust the server
+            my.assertRaises(ScmException, DelegateClient, port=port, token="other")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # a server which does not hold the token never gets the credentials
+        fake = FakeServer()
+        fake.start()
+        my.assertRaises(ScmException, DelegateClient, port=fake.port, token="secret")
+        fake.join(10)
+        my.assertEqual(1, len(fake.received))
+        my.assertEqual(["challenge"], list(fake.received[0].keys()))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, stat, shutil, tempfile, hashlib
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.download_cache import DownloadCache
+
+
+class FakeFetch(object):
+    '''writes the url as the contents of the file'''
+    def __init__(my):
+        my.count = 0
+    def __call__(my, url, path):
+        my.count += 1
+        f = open(path, "w")
+        f.write(url * 10)
+        f.close()
+
+
+class DownloadCacheTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp()
+        my.cache_dir = "%s/cache" % my.tmp_dir
+        my.to_dir = "%s/to" % my.tmp_dir
+        os.makedirs(my.to_dir)
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        my._test_hit()
+        my._test_unversioned()
+        my._test_checksum()
+        my._test_evict()
+
+
+    def _read(my, path):
+        f = open(path)
+        data = f.read()
+        f.close()
+        return data
+
+
+    def _test_hit(my):
+        cache = DownloadCache(my.cache_dir)
+        fetch = FakeFetch()
+        url = "http://server1/assets/sample3d/chr001_model_v001.ma"
+
+        path = cache.fetch(url, "%s/a.ma" % my.to_dir, fetch)
+        my.assertEqual(1, fetch.count)
+        my.assertEqual(url * 10, my._read(path))
+        # the destination is not hard linked to the cache by default
+        my.assertEqual(1, os.stat(path).st_nlink)
+
+        # the host is not part of the key
+        url2 = url.replace("server1", "server2")
+        path = cache.fetch(url2, "%s/b.ma" % my.to_dir, fetch)
+        my.assertEqual(1, fetch.count)
+        my.assertEqual(url * 10, my._read(path))
+        my.assertEqual({'hits': 1, 'misses': 1}, cache.get_stats())
+
+        # a different version is a different file
+        cache.fetch(url, "%s/c.ma" % my.to_dir, fetch, version=2)
+        my.assertEqual(2, fetch.count)
+
+
+    def _test_unversioned(my):
+        cache = DownloadCache(my.cache_dir)
+        fetch = FakeFetch()
+        url = "http://server1/assets/sample3d/chr001_model.ma"
+
+        cache.fetch(url, "%s/d.ma" % my.to_dir, fetch)
+        cache.fetch(url, "%s/d.ma" % my.to_dir, fetch)
+        my.assertEqual(2, fetch.count)
+        my.assertEqual({'hits': 0, 'misses': 0}, cache.get_stats())
+
+
+    def _test_checksum(my):
+        cache = DownloadCache(my.cache_dir)
+        fetch = FakeFetch()
+        url = "http://server1/assets/sample3d/chr002_model.ma"
+
+        md5 = hashlib.md5((url*10).encode("UTF8")).hexdigest()
+        cache.fetch(url, "%s/e.ma" % my.to_dir, fetch, checksum=md5)
+        cache.fetch(url, "%s/f.ma" % my.to_dir, fetch, checksum=md5)
+        my.assertEqual(1, fetch.count)
+
+        # a download which does not match its checksum is kept, but it is
+        # not cached
+        path = cache.fetch(url, "%s/g.ma" % my.to_dir, fetch, checksum="bad")
+        my.assertEqual(url * 10, my._read(path))
+        my.assertEqual(2, fetch.count)
+        key = cache.get_key(url, checksum="bad")
+        my.assertEqual(False, os.path.exists(cache.get_entry_path(key)))
+
+
+    def _test_evict(my):
+        cache_dir = "%s/evict" % my.tmp_dir
+        fetch = FakeFetch()
+        url = "http://server1/assets/sample3d/chr003_model_v%03d.ma"
+        size = len(url * 10)
+
+        # room for 2 files
+        cache = DownloadCache(cache_dir, max_bytes=size*2 + 1)
+        for i in range(3):
+            cache.fetch(url % i, "%s/h%s.ma" % (my.to_dir, i), fetch)
+        my.assertEqual(2, len(cache.get_entries()))
+
+        # the oldest one was removed
+        key = cache.get_key(url % 0)
+        my.assertEqual(False, os.path.exists(cache.get_entry_path(key)))
+        # the destination is not affected
+        my.assertEqual((url % 0) * 10, my._read("%s/h0.ma" % my.to_dir))
+
+        # the mode of a hard linked destination is not changed by eviction
+        cache = DownloadCache(cache_dir, max_bytes=size*2 + 1, link_mode="hardlink")
+        path = cache.fetch(url % 3, "%s/h3.ma" % my.to_dir, fetch)
+        my.assertEqual(2, os.stat(path).st_nlink)
+        for i in range(4, 6):
+            cache.fetch(url % i, "%s/h%s.ma" % (my.to_dir, i), fetch)
+        my.assertEqual(1, os.stat(path).st_nlink)
+        my.assertEqual(0, os.stat(path).st_mode & stat.S_IWUSR)
+
+        # a file bigger than the budget still gets to its destination
+        cache = DownloadCache("%s/small" % my.tmp_dir, max_bytes=10)
+        path = cache.fetch(url % 6, "%s/h6.ma" % my.to_dir, fetch)
+        my.assertEqual((url % 6) * 10, my._read(path))
+        my.assertEqual([], cache.get_entries())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.expression_cache import ExpressionCache
+from tactic_client_lib.tactic_server_stub import TacticServerStub
+
+
+class FakeServer(object):
+    '''answers expressions with the number of times they were evaluated'''
+    def __init__(my):
+        my.evals = []
+
+    def eval(my, ticket, expression, search_keys, mode, single, vars, show_retired):
+        my.evals.append(expression)
+        return str([len(my.evals)])
+
+    def update(my, ticket, search_key, data, metadata, parent_key, info, use_id, triggers):
+        return {}
+
+    def create_task(my, ticket, search_key, *args):
+        return {}
+
+    def execute_cmd(my, ticket, class_name, args, values):
+        return {}
+
+    def add_file(my, ticket, snapshot_code, *args):
+        return {}
+
+    def finish(my, ticket, description):
+        return "OK"
+
+
+class ExpressionCacheTest(unittest.TestCase):
+
+    def setUp(my):
+        my.server = FakeServer()
+        my.stub = TacticServerStub(setup=False)
+        my.stub.server = my.server
+        my.stub.ticket = 'ticket'
+        my.stub.project_code = 'sample3d'
+        my.stub.set_expression_cache( ExpressionCache() )
+
+
+    def test_all(my):
+        my._test_key()
+        my._test_eval()
+        my._test_invalidate()
+        my._test_transaction()
+        my._test_limits()
+
+
+    def _test_key(my):
+        my.assertEqual("@GET(prod/shot['code','SH 01'].code)",
+                ExpressionCache.normalize("  @GET(prod/shot['code',   'SH 01'].code)\n"))
+        my.assertEqual("@COUNT(sthpw/task) + 1", ExpressionCache.normalize("@COUNT(sthpw/task)  +\t1"))
+        my.assertEqual("'a  b'", ExpressionCache.normalize("'a  b'"))
+
+        cache = ExpressionCache()
+        my.assertEqual(set(['prod/shot', 'sthpw/task']), cache.get_search_types("@GET(prod/shot.sthpw/task.status)"))
+        my.assertEqual(set(['prod/asset']), cache.get_search_types("@GET(.code)", "prod/asset?project=sample3d&code=chr001"))
+
+        my.assertEqual(cache.get_key("@GET(.code)", vars={'a': 1, 'b': 2}), cache.get_key("@GET( .code )", vars={'b': 2, 'a': 1}))
+        my.assertNotEqual(cache.get_key("@GET(.code)"), cache.get_key("@GET(.code)", single=True))
+        my.assertNotEqual(cache.get_key("@GET(.code)"), cache.get_key("@GET(.code)", show_retired=True))
+        my.assertNotEqual(cache.get_key("@GET(.code)", ['prod/shot?code=a']), cache.get_key("@GET(.code)", ['prod/shot?code=b']))
+
+
+    def _test_eval(my):
+        stub = my.stub
+        my.assertEqual([1], stub.eval("@GET(prod/shot.code)"))
+        my.assertEqual([1], stub.eval("@GET( prod/shot.code )"))
+        my.assertEqual(1, len(my.server.evals))
+
+        # the cached results can not be changed by the caller
+        results = stub.eval("@GET(prod/shot.code)")
+        results.append("changed")
+        my.assertEqual([1], stub.eval("@GET(prod/shot.code)"))
+
+        my.assertEqual([2], stub.eval("@GET(prod/shot.code)", show_retired=True))
+        my.assertEqual([3], stub.eval("@GET(.code)", search_keys=["prod/asset?project=sample3d&code=chr001"]))
+        my.assertEqual([4], stub.eval("$PROJECT"))
+
+        # the same expression in another project
+        stub.project_code = 'other'
+        my.assertEqual([5], stub.eval("@GET(prod/shot.code)"))
+        stub.project_code = 'sample3d'
+
+        stats = stub.get_expression_cache().get_stats()
+        my.assertEqual(3, stats.get('hits'))
+        my.assertEqual(5, stats.get('misses'))
+        my.assertEqual(0.375, stats.get('hit_rate'))
+
+
+    def _test_invalidate(my):
+        stub = my.stub
+        count = len(my.server.evals)
+        # an update of an asset drops the expressions related to assets,
+        # and the ones with no search type
+        stub.update("prod/asset?project=sample3d&code=chr001", {'name': 'chr'})
+        stub.eval("@GET(prod/shot.code)")
+        my.assertEqual(count, len(my.server.evals))
+        stub.eval("@GET(.code)", search_keys=["prod/asset?project=sample3d&code=chr001"])
+        stub.eval("$PROJECT")
+        my.assertEqual(count + 2, len(my.server.evals))
+
+        stub.create_task("prod/shot?project=sample3d&code=SH01")
+        stub.eval("@GET(prod/shot.code)")
+        my.assertEqual(count + 3, len(my.server.evals))
+
+        stub.eval("@GET(sthpw/snapshot.code)")
+        stub.add_directory("SNAPSHOT00001", "/tmp/render", mode="inplace")
+        stub.eval("@GET(sthpw/snapshot.code)")
+        my.assertEqual(count + 5, len(my.server.evals))
+
+        # commands may change anything
+        stub.execute_cmd("MyCmd")
+        stub.eval("@GET(.code)", search_keys=["prod/asset?project=sample3d&code=chr001"])
+        my.assertEqual(count + 6, len(my.server.evals))
+
+
+    def _test_transaction(my):
+        stub = my.stub
+        stub.eval("@GET(prod/shot.code)")
+        count = len(my.server.evals)
+        stub.finish()
+        stub.eval("@GET(prod/shot.code)")
+        my.assertEqual(count + 1, len(my.server.evals))
+
+
+    def _test_limits(my):
+        cache = ExpressionCache(max_entries=2, ttl=None)
+        for i in range(3):
+            cache.set(cache.get_key("@COUNT(prod/shot) + %s" % i), i, set(['prod/shot']))
+        my.assertEqual(None, cache.get(cache.get_key("@COUNT(prod/shot) + 0")))
+        my.assertEqual(2, cache.get(cache.get_key("@COUNT(prod/shot) + 2")))
+
+        cache = ExpressionCache(ttl=-1)
+        cache.set(cache.get_key("$PROJECT"), "sample3d", set())
+        my.assertEqual(None, cache.get(cache.get_key("$PROJECT")))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
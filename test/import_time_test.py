@@ -0,0 +1,97 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, subprocess, json
+
+
+# budget in seconds for "import tactic_client_lib".  It can be raised on
+# slow machines with TACTIC_IMPORT_BUDGET
+IMPORT_BUDGET = float(os.environ.get("TACTIC_IMPORT_BUDGET") or 0.05)
+
+SCRIPT = '''
+import sys, time, json
+timer = getattr(time, "perf_counter", time.time)
+start = timer()
+import tactic_client_lib
+elapsed = timer() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'modules': [x for x in sys.modules.keys() if x in MODULES],
+}))
+'''
+
+# modules which should not be imported by "import tactic_client_lib"
+HEAVY_MODULES = [
+    'tactic_client_lib.tactic_server_stub',
+    'tactic_client_lib.cgapp',
+    'tactic_client_lib.scm',
+    'tactic_client_lib.maya',
+    'tactic_client_lib.interpreter',
+    'xmlrpc.client',
+    'http.client',
+    'six',
+]
+
+
+class ImportTimeTest(unittest.TestCase):
+
+    def _run(my, script):
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = "MODULES = %r\n%s" % (HEAVY_MODULES, script)
+        output = subprocess.check_output([sys.executable, "-c", script], cwd=base_dir)
+        return json.loads(output.decode("UTF8").strip().splitlines()[-1])
+
+
+    def test_all(my):
+        if sys.version_info[0] < 3:
+            # lazy imports are only supported in Python3
+            return
+
+        my._test_lazy()
+        my._test_budget()
+
+
+    def _test_lazy(my):
+        data = my._run(SCRIPT)
+        my.assertEqual([], data['modules'])
+
+        # the lazy attributes are still available
+        data = my._run(SCRIPT + '''
+from tactic_client_lib import TacticServerStub, TacticApiException
+print(json.dumps({'elapsed': 0, 'modules': [x for x in sys.modules.keys() if x in MODULES]}))
+''')
+        my.assertEqual(True, 'tactic_client_lib.tactic_server_stub' in data['modules'])
+        # no connection is made, so xmlrpc is not needed
+        my.assertEqual(False, 'xmlrpc.client' in data['modules'])
+
+        # the classes of the stub module are exported as in Python2
+        data = my._run(SCRIPT + '''
+from tactic_client_lib import *
+names = [x for x in ['TACTIC', 'Command', 'Search', 'SObject'] if x in globals()]
+print(json.dumps({'elapsed': 0, 'modules': names}))
+''')
+        my.assertEqual(['TACTIC', 'Command', 'Search', 'SObject'], data['modules'])
+
+
+    def _test_budget(my):
+        # take the best of a few runs to reduce noise
+        times = [my._run(SCRIPT)['elapsed'] for i in range(3)]
+        elapsed = min(times)
+        my.assertTrue(elapsed < IMPORT_BUDGET,
+                "import tactic_client_lib took %.4fs, budget is %.4fs" % (elapsed, IMPORT_BUDGET))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
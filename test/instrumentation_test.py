@@ -0,0 +1,119 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, threading
+
+try:
+    import xmlrpclib
+    from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+except ImportError:
+    # Python3
+    from xmlrpc import client as xmlrpclib
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.common.instrumentation import Instrumentation
+from tactic_client_lib.common.instrumented_transport import InstrumentedTransport
+from tactic_client_lib.tactic_server_stub import TacticServerStub
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    # answer on the url of the TACTIC api
+    rpc_paths = ()
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(my):
+        my.server = SimpleXMLRPCServer(("127.0.0.1", 0), requestHandler=RequestHandler,
+                logRequests=False, allow_none=True)
+        my.server.register_function(lambda x: x * 2, "double")
+        my.server.register_function(lambda ticket: "OK", "ping")
+        my.server.register_function(my._fail, "fail")
+        my.thread = threading.Thread(target=my.server.serve_forever)
+        my.thread.daemon = True
+        my.thread.start()
+
+        my.instrumentation = Instrumentation.get()
+        my.instrumentation.clear()
+        my.instrumentation.enable()
+
+    def tearDown(my):
+        my.instrumentation.enable(False)
+        my.instrumentation.clear()
+        my.server.shutdown()
+        my.server.server_close()
+
+    def _fail(my):
+        raise Exception("failed")
+
+
+    def test_all(my):
+        my._test_record()
+        my._test_transport()
+        my._test_stub()
+        my._test_openmetrics()
+
+
+    def _test_record(my):
+        calls = []
+        my.instrumentation.add_hook(calls.append)
+        my.instrumentation.record("download", 0.02, response_bytes=100)
+        my.instrumentation.remove_hook(calls.append)
+
+        my.assertEqual(1, len(calls))
+        data = my.instrumentation.get_report()['download']
+        my.assertEqual(1, data['count'])
+        my.assertEqual(100, data['response_bytes'])
+        # 0.02 falls in the 0.025 bucket
+        histogram = dict(data['histogram'])
+        my.assertEqual(0, histogram[0.01])
+        my.assertEqual(1, histogram[0.025])
+
+
+    def _test_transport(my):
+        port = my.server.server_address[1]
+        proxy = xmlrpclib.ServerProxy("http://127.0.0.1:%s/" % port, transport=InstrumentedTransport())
+        my.assertEqual(4, proxy.double(2))
+        my.assertRaises(xmlrpclib.Fault, proxy.fail)
+
+        report = my.instrumentation.get_report()
+        my.assertEqual(1, report['double']['count'])
+        my.assertEqual(True, report['double']['request_bytes'] > 0)
+        my.assertEqual(True, report['double']['response_bytes'] > 0)
+        my.assertEqual(0, report['double']['errors'])
+        my.assertEqual(1, report['fail']['errors'])
+
+
+    def _test_stub(my):
+        # a round trip through the transport installed by the stub
+        server = TacticServerStub(setup=False)
+        server.set_server("127.0.0.1:%s" % my.server.server_address[1])
+        server.set_ticket("abc")
+        my.assertEqual("OK", server.ping())
+        my.assertEqual(1, my.instrumentation.get_report()['ping']['count'])
+
+
+    def _test_openmetrics(my):
+        text = my.instrumentation.get_openmetrics()
+        my.assertEqual(True, text.endswith("# EOF\n"))
+        my.assertEqual(True, 'tactic_api_call_seconds_count{method="double"} 1' in text)
+        my.assertEqual(True, 'tactic_api_call_seconds_bucket{method="double",le="+Inf"} 1' in text)
+        my.assertEqual(True, 'tactic_api_errors_total{method="fail"} 1' in text)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
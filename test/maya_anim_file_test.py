@@ -0,0 +1,92 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.maya.maya_anim_file import MayaAnimFile
+
+
+ANIM_DATA = '''// header
+//START_ANIM=chr001:hero
+anim hero
+//END_ANIM=chr001:hero
+// between blocks
+//START_STATIC=hero
+static hero
+//END_STATIC=hero
+//START=prop
+old prop
+//END=prop
+'''
+
+
+class MayaAnimFileTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp()
+        my.path = "%s/set.anim" % my.tmp_dir
+        f = open(my.path, "w")
+        f.write(ANIM_DATA)
+        f.close()
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        my._test_parse()
+        my._test_index_file()
+
+
+    def _test_parse(my):
+        anim_file = MayaAnimFile(my.path)
+        anim_file.parse()
+
+        my.assertEquals("//START_ANIM=chr001:hero\nanim hero\n//END_ANIM=chr001:hero\n", anim_file.get_anim("chr001"))
+        my.assertEquals("//START_STATIC=hero\nstatic hero\n//END_STATIC=hero\n", anim_file.get_static("hero"))
+
+        # lines after an //END are not part of the block
+        my.assertEquals(-1, anim_file.get_anim("chr001").find("between"))
+
+        # old style blocks are both anim and static
+        my.assertEquals(anim_file.get_anim("prop"), anim_file.get_static("prop"))
+        my.assertEquals("", anim_file.get_anim("hero"))
+        my.assertEquals(['chr001', 'hero', 'prop'], anim_file.get_instances())
+        anim_file.close()
+
+
+    def _test_index_file(my):
+        anim_file = MayaAnimFile(my.path)
+        anim_file.parse(use_index_file=True)
+        anim_file.close()
+        my.assertEquals(True, os.path.exists(anim_file.get_index_path()))
+
+        anim_file2 = MayaAnimFile(my.path)
+        my.assertEquals(True, anim_file2.load_index())
+        my.assertEquals(anim_file.anim_index, anim_file2.anim_index)
+        my.assertEquals("//START=prop\nold prop\n//END=prop\n", anim_file2.get_static("prop"))
+        anim_file2.close()
+
+        # a changed anim file invalidates the index
+        f = open(my.path, "a")
+        f.write("//START_ANIM=extra\n//END_ANIM=extra\n")
+        f.close()
+        anim_file3 = MayaAnimFile(my.path)
+        my.assertEquals(False, anim_file3.load_index())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, re, types
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.common.maya_batch import MayaBatch, MayaBatchException
+
+
+# the nodes and attributes of the fake scene
+SCENE = {
+    'chr001': {'tacticNodeData': "<node/>"},
+    'chr001|geo': {},
+}
+
+
+def get_fake_modules():
+    '''fake maya.cmds and maya.mel modules answering from SCENE'''
+    cmds = types.ModuleType("maya.cmds")
+    def objExists(plug):
+        node, attr = (plug.split(".") + [None])[:2]
+        return node in SCENE and (not attr or attr in SCENE[node])
+    def getAttr(plug, type=False):
+        node, attr = plug.split(".")
+        if type:
+            return "string"
+        return SCENE[node][attr]
+    def listRelatives(node, fullPath=True, allDescendents=False, type=None):
+        return [x for x in SCENE.keys() if x.startswith("%s|" % node)] or None
+    def referenceQuery(node, isNodeReferenced=False):
+        raise RuntimeError("not a reference: %s" % node)
+    cmds.ls = lambda node: [x for x in SCENE.keys() if x == node]
+    cmds.objExists = objExists
+    cmds.getAttr = getAttr
+    cmds.listRelatives = listRelatives
+    cmds.referenceQuery = referenceQuery
+
+    mel = types.ModuleType("maya.mel")
+    mel.eval = lambda cmd: "mel: %s" % cmd
+
+    maya = types.ModuleType("maya")
+    maya.cmds = cmds
+    maya.mel = mel
+    return {'maya': maya, 'maya.cmds': cmds, 'maya.mel': mel}
+
+
+class FakeApp(object):
+    '''executes the python() mel command of a batch like Maya does'''
+    def __init__(my):
+        my.cmds = []
+    def mel(my, cmd, verbose=None):
+        my.cmds.append(cmd)
+        match = re.match(r'^python\("(.*)"\)$', cmd, re.S)
+        # undo the escaping of the mel string
+        expr = re.sub(r'\\(.)', r'\1', match.group(1))
+        return eval(expr)
+
+
+class MayaBatchTest(unittest.TestCase):
+
+    def test_all(my):
+        modules = get_fake_modules()
+        saved = dict([(x, sys.modules.get(x)) for x in modules])
+        sys.modules.update(modules)
+        try:
+            my._test_script()
+            my._test_execute()
+        finally:
+            for name, module in saved.items():
+                if module:
+                    sys.modules[name] = module
+                else:
+                    del(sys.modules[name])
+
+
+    def _test_script(my):
+        batch = MayaBatch(FakeApp())
+        my.assertEqual(0, batch.node_exists("chr001"))
+        my.assertEqual(1, batch.get_attr("chr001", "tacticNodeData"))
+
+        script = batch.get_script()
+        my.assertEqual(2, script.count("    _run(lambda: "))
+        my.assertEqual(True, script.find("bool(cmds.ls('chr001'))") != -1)
+        # the script compiles
+        compile(script, "<tactic_batch>", "exec")
+
+        mel = batch.get_mel()
+        my.assertEqual(True, mel.startswith('python("'))
+        # no unescaped quote ends the mel string early
+        my.assertEqual(None, re.search(r'[^\\]"', mel[len('python("'):-2]))
+
+
+    def _test_execute(my):
+        app = FakeApp()
+        batch = MayaBatch(app)
+        my.assertEqual([], batch.execute())
+        my.assertEqual([], app.cmds)
+
+        batch.node_exists("chr001")
+        batch.node_exists("chr002")
+        batch.attr_exists("chr001", "tacticNodeData")
+        batch.attr_exists("chr001", "notes")
+        batch.get_attr("chr001", "tacticNodeData")
+        batch.get_attr("chr001", "notes")
+        batch.get_attr_type("chr001", "tacticNodeData")
+        batch.get_children("chr001")
+        batch.get_children("chr001|geo")
+        batch.is_reference("chr001")
+        batch.mel('print "hello"')
+
+        results = batch.execute()
+        # a single round trip
+        my.assertEqual(1, len(app.cmds))
+        my.assertEqual([True, False, True, False, "<node/>", "", "string",
+                ["chr001|geo"], [], None, 'mel: print "hello"'], results)
+        # the failed query does not abort the batch
+        my.assertEqual([9], list(batch.get_errors().keys()))
+        my.assertEqual(True, batch.get_errors()[9].find("not a reference") != -1)
+
+        batch.clear()
+        my.assertEqual([], batch.execute())
+
+        # a batch which does not get to Maya
+        app.mel = lambda cmd, verbose=None: None
+        batch.node_exists("chr001")
+        my.assertRaises(MayaBatchException, batch.execute)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+class FakeBatch(object):
+    def __init__(my, app):
+        my.app = app
+        my.queries = []
+    def attr_exists(my, node, attr):
+        my.queries.append( (node, attr) )
+    def execute(my):
+        return [my.app.attrs.get(x) != None for x in my.queries]
+
+
+class FakeApp(object):
+    '''stores the attributes of the nodes in a dictionary'''
+    def __init__(my):
+        my.attrs = {}
+        my.calls = []
+    def get_attr(my, node, attr):
+        my.calls.append("get_attr")
+        return my.attrs.get( (node, attr) ) or ""
+    def set_attr(my, node, attr, value, type=None):
+        my.calls.append("set_attr")
+        my.attrs[(node, attr)] = value
+    def add_attr(my, node, attr, type=None):
+        my.calls.append("add_attr")
+        my.attrs[(node, attr)] = ""
+    def batch(my):
+        my.calls.append("batch")
+        return FakeBatch(my)
+
+
+class NodeDataTest(unittest.TestCase):
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the application modules are only supported in Python2
+            return
+
+        from tactic_client_lib.application.common import Application, NodeData
+        my.NodeData = NodeData
+        my.app = FakeApp()
+        Application.app = my.app
+        try:
+            my._test_parse()
+            my._test_commit()
+            my._test_escape()
+        finally:
+            Application.app = None
+
+
+    def _test_parse(my):
+        NodeData = my.NodeData
+        data = NodeData("chr001", "<node><ref context='model' snapshot_code='SNAPSHOT00001'/></node>")
+        # the xml is parsed when it is first used
+        my.assertEqual(None, data.nodes)
+        my.assertEqual("model", data.get_attr("ref", "context"))
+        my.assertEqual("", data.get_attr("ref", "version"))
+        my.assertEqual("", data.get_attr("session", "context"))
+        my.assertEqual([], my.app.calls)
+
+        my.assertEqual("<ref context='model' snapshot_code='SNAPSHOT00001' version='3'/>",
+                data.get_node_xml("ref", {'version': 3}))
+        my.assertEqual("", data.get_node_xml("session"))
+
+        # old pretty printed data, with the escaped newlines of XSI
+        data = NodeData("chr001", '<node>\\n  <ref context="rig"\\n       snapshot_code="SNAPSHOT00002"/>\\n</node>\\n')
+        my.assertEqual("rig", data.get_attr("ref", "context"))
+        my.assertEqual("<node><ref context='rig' snapshot_code='SNAPSHOT00002'/></node>", data.get_xml())
+
+        data = NodeData("chr001", "<node>")
+        my.assertEqual("<node/>", data.get_xml())
+
+
+    def _test_commit(my):
+        NodeData = my.NodeData
+        data = NodeData("chr001", "<node><ref context='model'/></node>")
+        data.set_attr("ref", "context", "model")
+        my.assertEqual(False, data.is_dirty())
+        data.commit()
+        my.assertEqual([], my.app.calls)
+
+        data.set_attr("ref", "version", 3)
+        my.assertEqual(True, data.is_dirty())
+        data.commit()
+        my.assertEqual(False, data.is_dirty())
+        # the attributes are created once
+        my.assertEqual(["batch", "add_attr", "add_attr", "set_attr", "set_attr"], my.app.calls)
+        my.assertEqual("<node><ref context='model' version='3'/></node>", my.app.attrs[("chr001", NodeData.ATTR_NAME)])
+        my.assertEqual(my.app.attrs[("chr001", NodeData.ATTR_NAME)], my.app.attrs[("chr001", NodeData.ATTR_NAME2)])
+
+        my.app.calls = []
+        data.set_attr("ref", "context", "rig")
+        data.commit()
+        my.assertEqual(["set_attr", "set_attr"], my.app.calls)
+
+        # the data is read from the node if it is not given
+        data = NodeData("chr001")
+        my.assertEqual("rig", data.get_attr("ref", "context"))
+
+
+    def _test_escape(my):
+        NodeData = my.NodeData
+        value = 'a "quoted"\nvalue\\ with \'<tags>\' & \ttabs'
+        data = NodeData("chr002", "")
+        data.set_attr("ref", "description", value)
+        data.commit()
+
+        xml = my.app.attrs[("chr002", NodeData.ATTR_NAME)]
+        for char in ['\n', '"', '\\', '\t']:
+            my.assertEqual(-1, xml.find(char))
+
+        data = NodeData("chr002")
+        my.assertEqual(value, data.get_attr("ref", "description"))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
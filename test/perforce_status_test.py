@@ -0,0 +1,160 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, stat, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+def unescape(path):
+    for char, escape in [('@', '%40'), ('#', '%23'), ('*', '%2A'), ('%', '%25')]:
+        path = path.replace(escape, char)
+    return path
+
+
+class FakeP4(object):
+    '''answers fstat and diff for the files of a workspace.  Like Perforce,
+    it takes escaped paths and reports the local files unescaped'''
+    def __init__(my, sync_dir):
+        my.sync_dir = sync_dir
+        my.diffed = []
+        my.fstat_args = []
+    def run(my, cmd, *args):
+        if cmd == "fstat":
+            my.fstat_args.append(args[-1])
+            return [
+                {'clientFile': "%s/a/same.txt" % my.sync_dir, 'haveRev': '1'},
+                {'clientFile': "%s/a/b/edit.txt" % my.sync_dir, 'haveRev': '2'},
+                {'clientFile': "%s/a/b/changed.txt" % my.sync_dir, 'haveRev': '1'},
+                {'clientFile': "%s/a/b/v@1#2%%3*.txt" % my.sync_dir, 'haveRev': '1'},
+                {'clientFile': "%s/missing.txt" % my.sync_dir, 'haveRev': '1'},
+                {'clientFile': "%s/new.txt" % my.sync_dir, 'action': 'add'},
+                {'clientFile': "%s/not_synced.txt" % my.sync_dir},
+            ]
+        elif cmd == "diff":
+            paths = args[-1]
+            for path in paths:
+                if path.find("@") != -1 or path.find("#") != -1 or path.find("*") != -1:
+                    raise Exception("%s - no such file(s)." % path)
+            my.diffed.extend(paths)
+            return [{'clientFile': unescape(x), 'status': x.endswith("changed.txt") and 'diff' or 'same'} for x in paths]
+
+
+class FakeImpl(object):
+    def __init__(my, sync_dir):
+        my.sync_dir = sync_dir
+        my.p4 = FakeP4(sync_dir)
+        my.log = []
+        my.depot = 'depot'
+
+
+class PerforceStatusTest(unittest.TestCase):
+
+    def setUp(my):
+        my.sync_dir = tempfile.mkdtemp().replace("\\", "/")
+        for path in ["a/same.txt", "a/b/edit.txt", "a/b/changed.txt", "a/b/v@1#2%3*.txt", "new.txt", "other.txt", ".tactic/cache"]:
+            path = "%s/%s" % (my.sync_dir, path)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            f = open(path, "w")
+            f.write(path)
+            f.close()
+        # synced files are read-only until they are opened for edit
+        for path in ["a/same.txt", "a/b/changed.txt"]:
+            os.chmod("%s/%s" % (my.sync_dir, path), stat.S_IRUSR)
+
+    def tearDown(my):
+        for path in ["a/same.txt", "a/b/changed.txt"]:
+            os.chmod("%s/%s" % (my.sync_dir, path), stat.S_IRUSR | stat.S_IWUSR)
+        shutil.rmtree(my.sync_dir)
+
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the scm modules are only supported in Python2
+            return
+
+        my._test_scan_dir()
+        my._test_status()
+
+
+    def _relative(my, paths):
+        return sorted([x[len(my.sync_dir)+1:] for x in paths])
+
+
+    def _test_scan_dir(my):
+        from tactic_client_lib.scm.perforce_status import scan_dir
+        ignore = lambda x: x.endswith("/.tactic")
+        dirs, files = scan_dir(my.sync_dir, threads=4, ignore=ignore)
+        my.assertEqual(["a", "a/b"], my._relative(dirs))
+        my.assertEqual(["a/b/changed.txt", "a/b/edit.txt", "a/b/v@1#2%3*.txt", "a/same.txt", "new.txt", "other.txt"],
+                my._relative(files.keys()))
+
+        path = "%s/a/same.txt" % my.sync_dir
+        size, mtime, writable = files[path]
+        my.assertEqual(len(path), size)
+        my.assertEqual(False, writable)
+        my.assertEqual(True, files["%s/new.txt" % my.sync_dir][2])
+
+        # the same result without threads
+        dirs2, files2 = scan_dir(my.sync_dir + "/", threads=1, ignore=ignore)
+        my.assertEqual(sorted(dirs), sorted(dirs2))
+        my.assertEqual(files, files2)
+
+
+    def _test_status(my):
+        from tactic_client_lib.scm.perforce_status import PerforceStatus
+        impl = FakeImpl(my.sync_dir)
+        status = PerforceStatus(impl, threads=4).execute()
+        relative = dict([(x[len(my.sync_dir)+1:], y) for x, y in status.items()])
+        my.assertEqual({
+            'a': 'directory',
+            'a/b': 'directory',
+            'a/same.txt': 'same',
+            'a/b/edit.txt': 'editable',
+            'a/b/changed.txt': 'modified',
+            'a/b/v@1#2%3*.txt': 'editable',
+            'missing.txt': 'missing',
+            'new.txt': 'added',
+            'other.txt': 'unversioned',
+        }, relative)
+        my.assertEqual(4, len(impl.p4.diffed))
+        # wildcards and revision specifiers in file names are escaped
+        my.assertEqual(True, "%s/a/b/v%%401%%232%%253%%2A.txt" % my.sync_dir in impl.p4.diffed)
+        my.assertEqual(["%s/..." % my.sync_dir], impl.p4.fstat_args)
+
+        # unchanged files are not diffed again
+        impl.p4.diffed = []
+        status2 = PerforceStatus(impl, threads=4).execute()
+        my.assertEqual(status, status2)
+        my.assertEqual([], impl.p4.diffed)
+
+        # a changed file is
+        path = "%s/a/b/edit.txt" % my.sync_dir
+        f = open(path, "a")
+        f.write("more")
+        f.close()
+        PerforceStatus(impl, threads=4).execute()
+        my.assertEqual([path], impl.p4.diffed)
+
+        # and so is the path of a single file
+        PerforceStatus(impl, threads=4).execute("%s/a/b/v@1#2%%3*.txt" % my.sync_dir)
+        my.assertEqual("%s/a/b/v%%401%%232%%253%%2A.txt" % my.sync_dir, impl.p4.fstat_args[-1])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
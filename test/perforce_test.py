@@ -0,0 +1,249 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+class FakeP4Exception(Exception):
+    pass
+
+
+class FakeP4(object):
+    '''a depot of relative paths.  Like P4Python, warnings raise an
+    exception'''
+    sync_dir = None
+
+    def __init__(my):
+        my.depot = {}
+        my.commands = []
+        my.errors = []
+        my.warnings = []
+        my.fail = {}
+        my.change = 11
+        # path -> changelist of the opened files
+        my.opened = {}
+
+    def connect(my):
+        pass
+
+    def connected(my):
+        return True
+
+    def _flatten(my, args):
+        flat = []
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                flat.extend(my._flatten(arg))
+            else:
+                flat.append(arg)
+        return flat
+
+    def run(my, *args):
+        args = my._flatten(args)
+        my.commands.append(args)
+        my.errors = []
+        my.warnings = []
+
+        cmd = args[0]
+        if my.fail.get(cmd):
+            my.errors = [my.fail.get(cmd)]
+            raise FakeP4Exception(my.fail.get(cmd))
+
+        paths = [x for x in args[1:] if x.startswith("//") or x.startswith("/")]
+        if cmd == "sync":
+            data = []
+            for path in paths:
+                if path.startswith(my.sync_dir):
+                    relative = path[len(my.sync_dir)+1:]
+                else:
+                    relative = path[len("//depot/"):]
+                if relative not in my.depot:
+                    my.warnings.append("%s - no such file(s)." % path)
+                    continue
+                local_path = "%s/%s" % (my.sync_dir, relative)
+                if not os.path.exists(os.path.dirname(local_path)):
+                    os.makedirs(os.path.dirname(local_path))
+                f = open(local_path, "w")
+                f.write(my.depot[relative])
+                f.close()
+                data.append({'clientFile': local_path, 'action': 'refreshed', 'fileSize': '3'})
+            if my.warnings:
+                raise FakeP4Exception("[P4#run] Warnings during command execution( \"p4 sync\" )\n%s" % "\n".join(my.warnings))
+            return data
+        elif cmd in ["add", "edit"]:
+            changelist = args[args.index("-c")+1]
+            for path in paths:
+                if path in my.opened:
+                    my.warnings.append("%s - can't %s (already opened for edit)" % (path, cmd))
+                else:
+                    my.opened[path] = changelist
+            if my.warnings:
+                raise FakeP4Exception("[P4#run] Warnings during command execution( \"p4 %s\" )\n%s" % (cmd, "\n".join(my.warnings)))
+            return [{'clientFile': x, 'action': cmd} for x in paths]
+        elif cmd == "reopen":
+            changelist = args[args.index("-c")+1]
+            for path in paths:
+                my.opened[path] = changelist
+            return [{'clientFile': x, 'action': cmd} for x in paths]
+        elif cmd == "submit":
+            return [{'submittedChange': str(my.change)}]
+        elif cmd == "opened":
+            changelist = args[args.index("-c")+1]
+            return [{'depotFile': x} for x, y in sorted(my.opened.items()) if y == changelist]
+        return []
+
+    def fetch_change(my):
+        return {'Change': 'new', 'Files': ["//depot/default.txt"]}
+
+    def save_change(my, changespec):
+        my.commands.append(["change", changespec.get("Description")])
+        my.change += 1
+        return ["Change %s created." % my.change]
+
+    def get_commands(my, name):
+        return [x[1:] for x in my.commands if x[0] == name]
+
+
+
+class PerforceTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp().replace("\\", "/")
+        my.sync_dir = "%s/sync" % my.tmp_dir
+        my.src_dir = "%s/src" % my.tmp_dir
+        os.makedirs(my.sync_dir)
+        os.makedirs(my.src_dir)
+        for name in ["chr001.ma", "prop001.ma"]:
+            f = open("%s/%s" % (my.src_dir, name), "w")
+            f.write(name)
+            f.close()
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the scm modules are only supported in Python2
+            return
+
+        from tactic_client_lib.scm import perforce
+        perforce.P4 = FakeP4
+        my.PerforceImpl = perforce.PerforceImpl
+        FakeP4.sync_dir = my.sync_dir
+
+        my._test_sync()
+        my._test_deliver()
+        my._test_commit()
+        my._test_rollback()
+
+
+    def _get_impl(my, depot={}, status={}):
+        impl = my.PerforceImpl(user="admin", port="1666", password="secret", sync_dir=my.sync_dir)
+        impl.p4.depot = depot.copy()
+        status = dict([("%s/%s" % (my.sync_dir, x), y) for x, y in status.items()])
+        impl.status = lambda sync_dir=None: status
+        return impl
+
+
+    def _test_sync(my):
+        impl = my._get_impl({'chr/chr001.ma': "old"})
+
+        # files which are not in the depot are skipped
+        result = impl.checkout_files(["chr/chr001.ma", "prop/prop001.ma"])
+        my.assertEqual([], result.get("error"))
+        my.assertEqual(True, os.path.exists("%s/chr/chr001.ma" % my.sync_dir))
+        my.assertEqual([["-f", "//depot/chr/chr001.ma", "//depot/prop/prop001.ma"]], impl.p4.get_commands("sync"))
+
+        # but errors are not
+        impl.p4.fail['sync'] = "Connect to server failed"
+        my.assertRaises(FakeP4Exception, impl.checkout_files, ["chr/chr001.ma"])
+
+
+    def _test_deliver(my):
+        impl = my._get_impl({'chr/chr001.ma': "old"}, {
+            'chr/chr001.ma': 'same',
+            'prop/new/prop001.ma': 'added',
+        })
+        result = impl.deliver_files([
+            ("%s/chr001.ma" % my.src_dir, "chr/chr001.ma"),
+            ("%s/prop001.ma" % my.src_dir, "prop/new/prop001.ma"),
+        ], "delivery")
+
+        new_path = "%s/prop/new/prop001.ma" % my.sync_dir
+        my.assertEqual(["%s/chr/chr001.ma" % my.sync_dir], result.get("updated"))
+        my.assertEqual([new_path], result.get("added"))
+        my.assertEqual("prop001.ma", open(new_path).read())
+
+        # directories are not added in Perforce
+        my.assertEqual([["-c", "default", new_path]], impl.p4.get_commands("add"))
+        my.assertEqual([{'submittedChange': '12'}], result.get("value"))
+        my.assertEqual([["-c", "12"]], impl.p4.get_commands("submit"))
+
+
+    def _get_commit_impl(my):
+        impl = my._get_impl({'f.ma': "old"}, {
+            'a.ma': 'unversioned',
+            'b.ma': 'same',
+            'c.ma': 'modified',
+            'd.ma': 'editable',
+            'e.ma': 'added',
+            'f.ma': 'missing',
+        })
+        for name in ["d.ma", "e.ma"]:
+            impl.p4.opened["%s/%s" % (my.sync_dir, name)] = "default"
+        return impl
+
+
+    def _test_commit(my):
+        impl = my._get_commit_impl()
+        paths = ["%s/%s" % (my.sync_dir, x) for x in ["a.ma", "b.ma", "c.ma", "d.ma", "e.ma", "f.ma"]]
+        result = impl.commit_files(["a.ma"] + paths[1:], "commit")
+        my.assertEqual([{'submittedChange': '12'}], result)
+
+        # one command per group of files
+        my.assertEqual([["-f", paths[5]]], impl.p4.get_commands("sync"))
+        my.assertEqual([["-c", "12", paths[0]]], impl.p4.get_commands("add"))
+        my.assertEqual([["-c", "12", paths[1], paths[2]]], impl.p4.get_commands("edit"))
+        # files which are already opened are moved to the changelist
+        my.assertEqual([["-c", "12", paths[3], paths[4]]], impl.p4.get_commands("reopen"))
+        my.assertEqual([["-c", "12"]], impl.p4.get_commands("submit"))
+        my.assertEqual(["12"] * 5, list(impl.p4.opened.values()))
+
+        # the info of the change is returned as is
+        my.assertEqual(["Change 13 created."], impl.add_changelist("empty"))
+        my.assertEqual("13", impl.get_change_number(["Change 13 created."]))
+
+
+    def _test_rollback(my):
+        impl = my._get_commit_impl()
+        impl.p4.fail['submit'] = "Submit failed"
+        paths = ["%s/%s" % (my.sync_dir, x) for x in ["a.ma", "d.ma", "e.ma"]]
+        my.assertRaises(FakeP4Exception, impl.commit_files, paths, "commit")
+
+        # the opened files are moved back to the default changelist and
+        # the changelist is deleted
+        my.assertEqual(["default"] * 3, list(impl.p4.opened.values()))
+        my.assertEqual([["-c", "12", paths[1], paths[2]], ["-c", "default"] + sorted(paths)],
+                impl.p4.get_commands("reopen"))
+        my.assertEqual([["-d", "12"]], impl.p4.get_commands("change")[-1:])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
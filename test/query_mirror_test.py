@@ -0,0 +1,142 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.query_mirror import QueryMirror, QueryMirrorException
+
+
+class FakeStub(object):
+    '''answers queries from a list of tasks'''
+    def __init__(my):
+        my.queries = []
+        my.tasks = []
+        for i in range(10):
+            my.add_task(i, "joe" if i % 2 else "mary", "2020-01-01 00:00:%0.2d" % i)
+
+    def add_task(my, id, assigned, timestamp):
+        my.tasks.append( {
+            '__search_key__': 'sthpw/task?id=%s' % id,
+            'id': id,
+            'assigned': assigned,
+            'status': 'Pending',
+            'is_milestone': id == 0,
+            'timestamp': timestamp,
+            's_status': None,
+        } )
+
+    def get_project(my):
+        return "sample3d"
+
+    def query(my, search_type, filters=[], show_retired=False):
+        my.queries.append( (search_type, filters) )
+        results = []
+        for task in my.tasks:
+            for column, op, value in filters:
+                if op == '>=' and not task.get(column) >= value:
+                    break
+                if op == 'in' and str(task.get(column)) not in value:
+                    break
+            else:
+                results.append(dict(task))
+        return results
+
+
+class QueryMirrorTest(unittest.TestCase):
+
+    def setUp(my):
+        my.stub = FakeStub()
+        my.mirror = QueryMirror(my.stub)
+        my.mirror.configure("sthpw/task", ttl=60, indexes=['assigned'])
+
+
+    def test_all(my):
+        my._test_query()
+        my._test_incremental()
+        my._test_changed()
+        my._test_unsupported()
+        my._test_project()
+
+
+    def _test_query(my):
+        tasks = my.mirror.query("sthpw/task", [('assigned', 'joe')], order_bys=['id desc'])
+        my.assertEqual([9, 7, 5, 3, 1], [x.get('id') for x in tasks])
+        my.assertEqual(1, len(my.stub.queries))
+
+        # answered locally within the ttl
+        tasks = my.mirror.query("sthpw/task", [('id', '>=', '7')], columns=['id'], limit=2, order_bys=['id'])
+        my.assertEqual([{'id': 7, '__search_key__': 'sthpw/task?id=7'}, {'id': 8, '__search_key__': 'sthpw/task?id=8'}], tasks)
+        my.assertEqual(1, len(my.stub.queries))
+
+        task = my.mirror.query("sthpw/task", [('is_milestone', True)], single=True)
+        my.assertEqual(0, task.get('id'))
+        my.assertEqual(True, task.get('is_milestone'))
+
+        tasks = my.mirror.query("sthpw/task", [('id', 'in', ['1', '2']), ('assigned', 'like', 'j%')])
+        my.assertEqual([1], [x.get('id') for x in tasks])
+        tasks = my.mirror.query("sthpw/task", [('assigned', 'like', 'J%')])
+        my.assertEqual([], tasks)
+        tasks = my.mirror.query("sthpw/task", [('s_status', 'is', 'NULL')])
+        my.assertEqual(10, len(tasks))
+        my.assertEqual(1, len(my.stub.queries))
+        my.assertEqual({'hits': 5, 'syncs': 1}, my.mirror.get_stats())
+
+
+    def _test_incremental(my):
+        my.stub.add_task(10, "joe", "2020-01-01 00:01:00")
+        my.mirror.mark_stale("sthpw/task")
+        tasks = my.mirror.query("sthpw/task", [('assigned', 'joe')])
+        my.assertEqual(6, len(tasks))
+        # only the newer tasks were asked for
+        my.assertEqual(('sthpw/task', [('timestamp', '>=', '2020-01-01 00:00:09')]), my.stub.queries[-1])
+
+
+    def _test_changed(my):
+        my.stub.tasks[1]['status'] = 'Complete'
+        my.stub.tasks[2]['s_status'] = 'retired'
+        del(my.stub.tasks[3])
+        my.mirror.mark_keys_stale(['sthpw/task?id=1', 'sthpw/task?id=2', 'sthpw/task?id=3'])
+
+        tasks = my.mirror.query("sthpw/task", [('id', 'in', [1, 2, 3])], order_bys=['id'])
+        my.assertEqual([1], [x.get('id') for x in tasks])
+        my.assertEqual('Complete', tasks[0].get('status'))
+        tasks = my.mirror.query("sthpw/task", [('id', 'in', [1, 2, 3])], show_retired=True)
+        my.assertEqual(2, len(tasks))
+
+        my.mirror.invalidate()
+        count = len(my.stub.queries)
+        my.mirror.query("sthpw/task")
+        my.assertEqual(count + 1, len(my.stub.queries))
+        my.assertEqual(('sthpw/task', []), my.stub.queries[-1])
+
+
+    def _test_unsupported(my):
+        my.assertRaises(QueryMirrorException, my.mirror.query, "sthpw/task", [('assigned', '~', 'jo')])
+        my.assertRaises(QueryMirrorException, my.mirror.query, "sthpw/task", ["id = 1"])
+        my.assertRaises(QueryMirrorException, my.mirror.query, "sthpw/task", [('bad_column', 'joe')])
+        my.assertRaises(QueryMirrorException, my.mirror.query, "sthpw/task", order_bys=['lower(assigned)'])
+
+
+    def _test_project(my):
+        my.assertEqual("prod/shot?project=sample3d", my.mirror.get_key("prod/shot"))
+        my.assertEqual("prod/shot?project=other", my.mirror.get_key("prod/shot?project=other"))
+        my.assertEqual("sthpw/task", my.mirror.get_key("sthpw/task"))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.resource_config import ResourceConfig
+
+
+class ResourceConfigTest(unittest.TestCase):
+
+    def setUp(my):
+        ResourceConfig.clear()
+        my.tmp_dir = tempfile.mkdtemp()
+        my.path = "%s/admin.tacticrc" % my.tmp_dir
+        my._write("login=admin\nserver=localhost\n# comment\n\nticket=abc==\n")
+
+    def tearDown(my):
+        ResourceConfig.clear()
+        shutil.rmtree(my.tmp_dir)
+
+    def _write(my, data, mtime=None):
+        f = open(my.path, "w")
+        f.write(data)
+        f.close()
+        if mtime:
+            os.utime(my.path, (mtime, mtime))
+
+
+    def test_all(my):
+        my._test_parse()
+        my._test_cache()
+
+
+    def _test_parse(my):
+        config = ResourceConfig.get_by_path(my.path)
+        my.assertEqual(True, config.exists())
+        my.assertEqual("admin", config.get_value("login"))
+        # values may contain =
+        my.assertEqual("abc==", config.get_value("ticket"))
+        my.assertEqual(None, config.get_value("project"))
+
+        config = ResourceConfig.get_by_path("%s/none.tacticrc" % my.tmp_dir)
+        my.assertEqual(False, config.exists())
+
+
+    def _test_cache(my):
+        resolved = []
+        def resolve(login):
+            resolved.append(login)
+            return my.path
+
+        config = ResourceConfig.get(resolve)
+        my.assertEqual(config, ResourceConfig.get(resolve))
+        # the path is only resolved once
+        my.assertEqual([None], resolved)
+
+        # a changed file is read again
+        my._write("login=joe\nserver=localhost\n", mtime=1000000000)
+        config = ResourceConfig.get(resolve)
+        my.assertEqual("joe", config.get_value("login"))
+
+        # a removed file is resolved again
+        os.remove(my.path)
+        config = ResourceConfig.get(resolve)
+        my.assertEqual(False, config.exists())
+        my.assertEqual([None, None], resolved)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.result_set import ResultSet, RowView, ColumnarUnmarshaller
+from tactic_client_lib.common.instrumented_transport import InstrumentedTransport
+
+try:
+    import xmlrpclib
+except ImportError:
+    from xmlrpc import client as xmlrpclib
+
+
+ROWS = [
+    {'code': 'SH001', 'frame_start': 1, 'frame_end': 100, '__parent__': {'code': 'SEQ01'}},
+    {'code': 'SH002', 'frame_start': 101, 'frame_end': 150.5, 'tags': ['a', 'b']},
+    {'code': 'SH003', 'frame_start': None},
+]
+
+
+class FakeResponse(object):
+    def __init__(my, data):
+        my.data = data
+    def read(my, *args):
+        data, my.data = my.data, b""
+        return data
+    def getheader(my, name, default=None):
+        return default
+    def close(my):
+        pass
+
+
+class ResultSetTest(unittest.TestCase):
+
+    def test_all(my):
+        my._test_from_rows()
+        my._test_unmarshaller()
+        my._test_transport()
+        my._test_numpy()
+
+
+    def _test_from_rows(my):
+        results = ResultSet.from_rows(ROWS)
+        my.assertEqual(3, len(results))
+        # the order of the names follows the keys of the dicts
+        my.assertEqual(['__parent__', 'code', 'frame_end', 'frame_start', 'tags'], sorted(results.get_names()))
+        my.assertEqual([100, 150.5, None], results.get_column('frame_end'))
+        my.assertEqual(['SH001', 'SH002', 'SH003'], [x.get('code') for x in results])
+
+        row = results[-1]
+        my.assertEqual(True, isinstance(row, RowView))
+        my.assertEqual(None, row['tags'])
+        my.assertEqual('default', row.get('bad_column', 'default'))
+        my.assertEqual(True, 'tags' in row)
+
+        rows = results.to_dicts()
+        my.assertEqual(ROWS[0], dict([(x, y) for x, y in rows[0].items() if y != None]))
+        my.assertEqual(ROWS[0]['__parent__'], results[0]['__parent__'])
+
+        my.assertEqual(['SH002', 'SH003'], results[1:].get_column('code'))
+        my.assertEqual(2, len(results[1:]))
+        my.assertRaises(IndexError, results.__getitem__, 3)
+
+
+    def _parse(my, value):
+        data = xmlrpclib.dumps((value,), methodresponse=True, allow_none=True)
+        target = ColumnarUnmarshaller()
+        parser = xmlrpclib.ExpatParser(target)
+        parser.feed(data)
+        parser.close()
+        return target.close()[0]
+
+
+    def _test_unmarshaller(my):
+        results = my._parse(ROWS)
+        my.assertEqual(True, isinstance(results, ResultSet))
+        my.assertEqual(ResultSet.from_rows(ROWS).to_dicts(), results.to_dicts())
+        # values of nested structs and arrays are left as they are
+        my.assertEqual({'code': 'SEQ01'}, results[0]['__parent__'])
+        my.assertEqual(['a', 'b'], results[1]['tags'])
+
+        # other responses are not changed
+        my.assertEqual(ROWS[0], my._parse(ROWS[0]))
+        my.assertEqual(['a', 'b'], my._parse(['a', 'b']))
+        my.assertEqual(0, len(my._parse([])))
+
+
+    def _test_transport(my):
+        data = xmlrpclib.dumps((ROWS,), methodresponse=True, allow_none=True).encode("UTF8")
+        transport = InstrumentedTransport()
+        transport.verbose = False
+
+        transport.set_columnar(True)
+        results = transport.parse_response(FakeResponse(data))[0]
+        my.assertEqual(True, isinstance(results, ResultSet))
+
+        transport.set_columnar(False)
+        results = transport.parse_response(FakeResponse(data))[0]
+        my.assertEqual(ROWS, results)
+
+
+    def _test_numpy(my):
+        try:
+            import numpy
+        except ImportError:
+            return
+
+        results = ResultSet.from_rows(ROWS)
+        arrays = results.to_numpy()
+        my.assertEqual(['frame_end', 'frame_start'], sorted(arrays.keys()))
+        my.assertEqual(True, numpy.isnan(arrays['frame_start'][2]))
+        my.assertEqual(251.5, numpy.nansum(arrays['frame_end']))
+
+        arrays = ResultSet.from_rows(ROWS[:2]).to_numpy(['frame_start'])
+        my.assertEqual([1, 101], arrays['frame_start'].tolist())
+        my.assertRaises(ValueError, results.to_numpy, ['code'])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, socket, errno
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.common.retry_policy import RetryPolicy, RetryServerProxy
+from tactic_client_lib.common.upload_multipart import UploadMultipart, TacticUploadException
+
+try:
+    import xmlrpclib
+except ImportError:
+    from xmlrpc import client as xmlrpclib
+
+
+class Flaky(object):
+    '''fails with the given errors before succeeding'''
+    def __init__(my, errors):
+        my.errors = list(errors)
+        my.args = []
+    def __call__(my, *args):
+        my.args.append(args)
+        if my.errors:
+            raise my.errors.pop(0)
+        return "OK"
+
+
+class FakeProxy(object):
+    def __init__(my, func):
+        my.func = func
+    def __getattr__(my, name):
+        return my.func
+    def __call__(my, attr):
+        return attr
+
+
+class FlakyUpload(UploadMultipart):
+    def __init__(my, statuses):
+        super(FlakyUpload, my).__init__()
+        my.statuses = list(statuses)
+        my.posts = []
+    def posturl(my, url, fields, files):
+        my.posts.append(list(fields))
+        status = my.statuses.pop(0)
+        return status, status == 200 and "OK" or "Error", "content"
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def setUp(my):
+        my.delays = []
+        my.policy = RetryPolicy(max_tries=3)
+        my.policy.sleep = my.delays.append
+        RetryPolicy.set(my.policy)
+
+    def tearDown(my):
+        RetryPolicy.policies = {}
+
+
+    def test_all(my):
+        my._test_classify()
+        my._test_execute()
+        my._test_override()
+        my._test_proxy()
+        my._test_upload()
+
+
+    def _test_classify(my):
+        policy = my.policy
+        my.assertEqual(True, policy.is_retryable(socket.error(errno.ECONNRESET, "reset")))
+        my.assertEqual(True, policy.is_retryable(socket.timeout("timed out")))
+        my.assertEqual(True, policy.is_retryable(xmlrpclib.ProtocolError("url", 503, "unavailable", {})))
+        my.assertEqual(False, policy.is_retryable(xmlrpclib.ProtocolError("url", 403, "forbidden", {})))
+        my.assertEqual(False, policy.is_retryable(xmlrpclib.Fault(1, "error in the server")))
+        my.assertEqual(False, policy.is_retryable(IOError(errno.ENOENT, "no such file")))
+        my.assertEqual(True, policy.is_retryable(TacticUploadException("failed", status=502)))
+
+        # calls which change data are only retried if nothing was sent
+        refused = socket.error(errno.ECONNREFUSED, "refused")
+        my.assertEqual(True, policy.is_retryable(refused, mutating=True))
+        my.assertEqual(False, policy.is_retryable(socket.error(errno.ECONNRESET, "reset"), mutating=True))
+        my.assertEqual(False, policy.is_retryable(socket.timeout("timed out"), mutating=True))
+        my.assertEqual(False, policy.is_retryable(xmlrpclib.ProtocolError("url", 503, "unavailable", {}), mutating=True))
+        policy = RetryPolicy(retry_mutating=True)
+        my.assertEqual(True, policy.is_retryable(socket.error(errno.ECONNRESET, "reset"), mutating=True))
+
+        my.assertEqual(False, RetryPolicy.is_mutating("query"))
+        my.assertEqual(False, RetryPolicy.is_mutating("get_by_search_key"))
+        my.assertEqual(True, RetryPolicy.is_mutating("insert"))
+        my.assertEqual(True, RetryPolicy.is_mutating("simple_checkin"))
+
+
+    def _test_execute(my):
+        reset = socket.error(errno.ECONNRESET, "reset")
+        func = Flaky([reset, reset])
+        my.assertEqual("OK", my.policy.execute(func, ["a"]))
+        my.assertEqual(3, len(func.args))
+        # the delay grows with every try
+        my.assertEqual(2, len(my.delays))
+        my.assertTrue(my.delays[0] >= 0.25 and my.delays[0] <= 0.5)
+        my.assertTrue(my.delays[1] >= 0.5 and my.delays[1] <= 1.0)
+
+        # gives up after max_tries
+        func = Flaky([reset, reset, reset])
+        my.assertRaises(socket.error, my.policy.execute, func)
+        my.assertEqual(3, len(func.args))
+
+        # errors of the server are not retried
+        func = Flaky([xmlrpclib.Fault(1, "error"), reset])
+        my.assertRaises(xmlrpclib.Fault, my.policy.execute, func)
+        my.assertEqual(1, len(func.args))
+
+        # calls which change data are not retried after the request was sent
+        func = Flaky([reset])
+        my.assertRaises(socket.error, my.policy.execute, func, mutating=True)
+        my.assertEqual(1, len(func.args))
+
+
+    def _test_override(my):
+        policy = RetryPolicy(max_tries=1)
+        RetryPolicy.set(policy, method="execute_cmd")
+        my.assertEqual(policy, RetryPolicy.get("execute_cmd"))
+        my.assertEqual(my.policy, RetryPolicy.get("query"))
+
+        RetryPolicy.set(None, method="execute_cmd")
+        my.assertEqual(my.policy, RetryPolicy.get("execute_cmd"))
+
+
+    def _test_proxy(my):
+        reset = socket.error(errno.ECONNRESET, "reset")
+        refused = socket.error(errno.ECONNREFUSED, "refused")
+        ticket = {'ticket': 'abc', 'project': 'sample3d'}
+
+        func = Flaky([refused])
+        proxy = RetryServerProxy(FakeProxy(func))
+        my.assertEqual("OK", proxy.insert(ticket, "prod/asset", {}))
+        # nothing was sent the first time, so the call is sent again as is
+        my.assertEqual([(ticket, "prod/asset", {})] * 2, func.args)
+
+        # an insert may have been executed before the connection was reset
+        func.errors = [reset]
+        my.assertRaises(socket.error, proxy.insert, ticket, "prod/asset", {})
+        RetryPolicy.set(RetryPolicy(retry_mutating=True), method="insert")
+        RetryPolicy.get("insert").sleep = my.delays.append
+        func.errors = [reset]
+        my.assertEqual("OK", proxy.insert(ticket, "prod/asset", {}))
+
+        # reads are retried
+        func.errors = [reset]
+        my.assertEqual("OK", proxy.query(ticket, "prod/asset"))
+        my.assertEqual((ticket, "prod/asset"), func.args[-1])
+
+        my.assertEqual("transport", proxy("transport"))
+
+
+    def _test_upload(my):
+        upload = FlakyUpload([503, 200])
+        status, reason, content = upload.upload("http://localhost/", [("action", "create")], [])
+        my.assertEqual(200, status)
+        my.assertEqual(0, upload.tries)
+        my.assertEqual([[("action", "create")]] * 2, upload.posts)
+
+        # an appended chunk is not sent twice
+        upload = FlakyUpload([503, 200])
+        my.assertRaises(TacticUploadException, upload.upload, "http://localhost/", [("action", "append")], [])
+        my.assertEqual(1, len(upload.posts))
+
+        upload = FlakyUpload([404])
+        try:
+            upload.upload("http://localhost/", [], [])
+        except TacticUploadException as e:
+            my.assertEqual(404, e.status)
+        else:
+            my.fail("failed upload not reported")
+        my.assertEqual(1, len(upload.posts))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.search_key import SearchKey
+from tactic_client_lib.tactic_server_stub import TacticServerStub
+
+try:
+    import xmlrpclib
+except ImportError:
+    from xmlrpc import client as xmlrpclib
+
+
+class SearchKeyTest(unittest.TestCase):
+
+    def setUp(my):
+        my.server = TacticServerStub(setup=False)
+        my.server.project_code = "sample3d"
+
+
+    def test_all(my):
+        my._test_parse()
+        my._test_cache()
+        my._test_stub()
+
+
+    def _test_parse(my):
+        key = SearchKey("prod/asset?project=sample3d&code=chr001")
+        my.assertEqual("prod/asset?project=sample3d", key.get_search_type())
+        my.assertEqual("prod/asset", key.get_base_type())
+        my.assertEqual("sample3d", key.get_project())
+        my.assertEqual("code", key.get_column())
+        my.assertEqual("chr001", key.get_code())
+
+        key = SearchKey("sthpw/login?code=admin")
+        my.assertEqual(("sthpw/login", "admin"), key.split())
+        my.assertEqual(None, key.get_project())
+
+        key = SearchKey("prod/asset?project=sample3d&id=12&context=publish&version=3")
+        my.assertEqual(("prod/asset?project=sample3d", "12"), key.split())
+        my.assertEqual("id", key.get_column())
+        my.assertEqual({'context': 'publish', 'version': '3'}, key.get_params())
+
+        my.assertRaises(ValueError, SearchKey, "prod/asset")
+        my.assertRaises(ValueError, SearchKey, "prod/asset?project=sample3d")
+        my.assertRaises(ValueError, SearchKey, "prod/asset?code")
+
+        # compares like a string
+        my.assertEqual("sthpw/login?code=admin", SearchKey("sthpw/login?code=admin"))
+        my.assertEqual(True, "sthpw/login?code=admin" in set([SearchKey("sthpw/login?code=admin")]))
+        data = xmlrpclib.dumps((key,))
+        my.assertEqual((str(key),), xmlrpclib.loads(data)[0])
+
+
+    def _test_cache(my):
+        key = SearchKey.get("prod/asset?project=sample3d&code=chr001")
+        my.assertEqual(True, key is SearchKey.get("prod/asset?project=sample3d&code=chr001"))
+        my.assertEqual(True, key is SearchKey.get(key))
+
+        # the components of the keys of a type are shared
+        key2 = SearchKey.get("prod/asset?project=sample3d&code=chr%s" % 2)
+        my.assertEqual(True, key.get_search_type() is key2.get_search_type())
+        my.assertEqual(True, key.get_project() is key2.get_project())
+
+        key = SearchKey.build("prod/asset", "chr003", project_code="sample3d")
+        my.assertEqual("prod/asset?project=sample3d&code=chr003", key)
+        key = SearchKey.build("sthpw/login", "admin")
+        my.assertEqual("sthpw/login?code=admin", key)
+
+
+    def _test_stub(my):
+        server = my.server
+        my.assertEqual(('sthpw/login', 'admin'), server.split_search_key('sthpw/login?code=admin'))
+        my.assertEqual(('prod/asset?project=sample3d', 'chr001'),
+                server.split_search_key('prod/asset?project=sample3d&code=chr001&foo=bar'))
+
+        search_keys = server.build_search_keys("prod/asset", ["chr001", "chr002"])
+        my.assertEqual(["prod/asset?project=sample3d&code=chr001", "prod/asset?project=sample3d&code=chr002"], search_keys)
+        search_keys = server.build_search_keys("sthpw/task", [1, 2], column='id')
+        my.assertEqual(["sthpw/task?id=1", "sthpw/task?id=2"], search_keys)
+        my.assertEqual([server.build_search_key("sthpw/task", 1, column='id')], search_keys[:1])
+
+        my.assertEqual([("sthpw/task", "1"), ("sthpw/task", "2")], server.split_search_keys(search_keys))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+class FakeBatch(object):
+    def __init__(my, app):
+        my.app = app
+        my.queries = []
+    def get_attr(my, node, attr):
+        my.queries.append( (node, attr) )
+    def execute(my):
+        return [my.app.attrs.get(x) for x in my.queries]
+
+
+class FakeApp(object):
+    '''stores the attributes of the nodes in a dictionary'''
+    def __init__(my):
+        my.attrs = {}
+        my.batches = 0
+    def batch(my):
+        my.batches += 1
+        return FakeBatch(my)
+
+
+class FakeUtil(object):
+    def __init__(my):
+        from tactic_client_lib.application.common import Application
+        my.app = Application.get()
+    def get_all_tactic_nodes(my):
+        return sorted(set([x[0] for x in my.app.attrs.keys()]))
+
+
+class FakeServer(object):
+    def __init__(my):
+        my.commits = []
+    def get_login(my):
+        return "admin"
+    def commit_session(my, xml, pid):
+        my.commits.append(xml)
+
+
+
+class SessionTest(unittest.TestCase):
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the application modules are only supported in Python2
+            return
+
+        from tactic_client_lib.application.common import Application, NodeData
+        from tactic_client_lib import TacticServerStub
+        session_module = sys.modules['tactic_client_lib.application.common.session']
+
+        # count the nodes whose data is parsed
+        parsed = []
+        class CountingNodeData(NodeData):
+            def __init__(my2, node, xml=None):
+                parsed.append(node)
+                super(CountingNodeData, my2).__init__(node, xml=xml)
+
+        my.app = FakeApp()
+        my.server = FakeServer()
+        my.parsed = parsed
+        Application.app = my.app
+        TacticServerStub.set(my.server)
+        session_module.TacticNodeUtil = FakeUtil
+        session_module.NodeData = CountingNodeData
+        my.ATTR_NAME = NodeData.ATTR_NAME
+        try:
+            my.session = session_module.Session()
+            my._test_introspect()
+            my._test_unchanged()
+            my._test_changed()
+        finally:
+            Application.app = None
+            TacticServerStub.set(None)
+            session_module.TacticNodeUtil = sys.modules['tactic_client_lib.application.common.tactic_node_util'].TacticNodeUtil
+            session_module.NodeData = NodeData
+
+
+    def _set_data(my, node, snapshot_code):
+        my.app.attrs[(node, my.ATTR_NAME)] = "<node><ref context='model' snapshot_code='%s'/></node>" % snapshot_code
+
+
+    def _get_ref(my, node, snapshot_code):
+        return "<ref context='model' snapshot_code='%s' tactic_node='%s'/>" % (snapshot_code, node)
+
+
+    def _test_introspect(my):
+        my._set_data("tactic_chr001", "SNAPSHOT00001")
+        my._set_data("tactic_prop001", "SNAPSHOT00002")
+
+        xml = my.session.introspect()
+        my.assertEqual("<session>%s%s</session>" % (
+            my._get_ref("tactic_chr001", "SNAPSHOT00001"),
+            my._get_ref("tactic_prop001", "SNAPSHOT00002")), xml)
+        # the data of all of the nodes is read in one batch
+        my.assertEqual(1, my.app.batches)
+        my.assertEqual(["tactic_chr001", "tactic_prop001"], my.parsed)
+        my.assertEqual((["tactic_chr001", "tactic_prop001"], []), my.session.get_changes())
+
+        my.session.commit()
+        my.assertEqual([xml], my.server.commits)
+
+
+    def _test_unchanged(my):
+        my.parsed[:] = []
+        xml = my.session.xml
+        my.assertEqual(xml, my.session.introspect())
+
+        # nodes whose data has the same hash are not parsed again
+        my.assertEqual([], my.parsed)
+        my.assertEqual(([], []), my.session.get_changes())
+        my.assertEqual("<session_diff></session_diff>", my.session.get_diff_xml())
+
+        # and an unchanged session is not committed again
+        my.session.commit()
+        my.assertEqual(1, len(my.server.commits))
+
+
+    def _test_changed(my):
+        my._set_data("tactic_chr001", "SNAPSHOT00003")
+        my._set_data("tactic_set001", "SNAPSHOT00004")
+        del(my.app.attrs[("tactic_prop001", my.ATTR_NAME)])
+
+        xml = my.session.introspect()
+        my.assertEqual(["tactic_chr001", "tactic_set001"], my.parsed)
+        my.assertEqual((["tactic_chr001", "tactic_set001"], ["tactic_prop001"]), my.session.get_changes())
+        my.assertEqual("<session_diff>%s%s<remove tactic_node=\"tactic_prop001\"/></session_diff>" % (
+            my._get_ref("tactic_chr001", "SNAPSHOT00003"),
+            my._get_ref("tactic_set001", "SNAPSHOT00004")), my.session.get_diff_xml())
+
+        my.session.commit()
+        my.assertEqual(2, len(my.server.commits))
+        my.assertEqual(xml, my.server.commits[-1])
+
+        # the session xml can be read back
+        my.assertEqual(["SNAPSHOT00003", "SNAPSHOT00004"],
+            [x.getAttribute("snapshot_code") for x in my.session._get_root().childNodes])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
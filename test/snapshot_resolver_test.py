@@ -0,0 +1,133 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.snapshot_resolver import SnapshotResolver
+from tactic_client_lib.search_key import SearchKey
+
+
+ASSET = "prod/asset?project=sample3d"
+SHOT = "prod/shot?project=sample3d"
+
+SNAPSHOTS = [
+    {'code': 'SNAPSHOT00001', 'search_type': ASSET, 'search_code': 'chr001', 'search_id': 1,
+        'context': 'model', 'version': 1, 'is_latest': False, 'is_current': True},
+    {'code': 'SNAPSHOT00002', 'search_type': ASSET, 'search_code': 'chr001', 'search_id': 1,
+        'context': 'model', 'version': 2, 'is_latest': True, 'is_current': False,
+        '__paths_dict__': {'main': ['/repo/chr001_model_v002.ma']},
+        '__web_paths_dict__': {'main': ['/assets/chr001_model_v002.ma']}},
+    {'code': 'SNAPSHOT00003', 'search_type': ASSET, 'search_code': 'chr002', 'search_id': 2,
+        'context': 'model', 'version': 1, 'is_latest': True, 'is_current': True},
+    {'code': 'SNAPSHOT00004', 'search_type': SHOT, 'search_code': 'SH001', 'search_id': 1,
+        'context': 'model', 'version': 1, 'is_latest': True, 'is_current': True},
+]
+
+
+class FakeStub(object):
+    '''answers query_snapshots from SNAPSHOTS'''
+    def __init__(my):
+        my.queries = []
+
+    def split_search_key(my, search_key):
+        return SearchKey.get(search_key).split()
+
+    def query_snapshots(my, filters=[], include_paths_dict=False, include_web_paths_dict=False):
+        my.queries.append(filters)
+        results = []
+        for snapshot in SNAPSHOTS:
+            for column, value in filters:
+                if isinstance(value, list):
+                    if str(snapshot.get(column)) not in [str(x) for x in value]:
+                        break
+                elif snapshot.get(column) != value:
+                    break
+            else:
+                results.append(dict(snapshot))
+        return results
+
+
+class SnapshotResolverTest(unittest.TestCase):
+
+    def setUp(my):
+        my.stub = FakeStub()
+        my.resolver = SnapshotResolver(my.stub)
+
+
+    def test_all(my):
+        my._test_resolve()
+        my._test_versions()
+        my._test_codes()
+
+
+    def _test_resolve(my):
+        search_keys = ["%s&code=chr001" % ASSET, "%s&code=chr002" % ASSET,
+                "%s&code=chr003" % ASSET, "%s&code=SH001" % SHOT, "%s&id=2" % ASSET]
+        snapshots = my.resolver.resolve(search_keys, context='model')
+
+        # one query per search type and column
+        my.assertEqual(3, len(my.stub.queries))
+        my.assertEqual("SNAPSHOT00002", snapshots[search_keys[0]].get('code'))
+        my.assertEqual("SNAPSHOT00003", snapshots[search_keys[1]].get('code'))
+        my.assertEqual(None, snapshots[search_keys[2]])
+        my.assertEqual("SNAPSHOT00004", snapshots[search_keys[3]].get('code'))
+        my.assertEqual("SNAPSHOT00003", snapshots[search_keys[4]].get('code'))
+
+        # everything is remembered, including the missing snapshots
+        snapshots2 = my.resolver.resolve(search_keys, context='model')
+        my.assertEqual(3, len(my.stub.queries))
+        my.assertEqual(snapshots, snapshots2)
+
+        snapshot = snapshots[search_keys[0]]
+        my.assertEqual(['/repo/chr001_model_v002.ma'], my.resolver.get_paths(snapshot))
+        my.assertEqual(['/assets/chr001_model_v002.ma'], my.resolver.get_web_paths(snapshot))
+        my.assertEqual([], my.resolver.get_paths(snapshot, 'icon'))
+        my.assertEqual([], my.resolver.get_web_paths(None))
+
+
+    def _test_versions(my):
+        search_key = "%s&code=chr001" % ASSET
+        count = len(my.stub.queries)
+        # other versions are resolved separately
+        my.assertEqual("SNAPSHOT00001", my.resolver.resolve([search_key], 'model', 0)[search_key].get('code'))
+        my.assertEqual("SNAPSHOT00001", my.resolver.resolve([search_key], 'model', 1)[search_key].get('code'))
+        my.assertEqual(['is_current', True], my.stub.queries[count][-1])
+        my.assertEqual(['version', 1], my.stub.queries[count+1][-1])
+        my.assertEqual(None, my.resolver.resolve([search_key], 'rig')[search_key])
+        my.assertEqual(count + 3, len(my.stub.queries))
+
+
+    def _test_codes(my):
+        # the snapshots of resolve() are known by their code
+        count = len(my.stub.queries)
+        snapshots = my.resolver.resolve_codes(["SNAPSHOT00002", "SNAPSHOT00004"])
+        my.assertEqual(["SNAPSHOT00002", "SNAPSHOT00004"], sorted(snapshots.keys()))
+        my.assertEqual(count, len(my.stub.queries))
+
+        my.resolver.clear()
+        snapshots = my.resolver.resolve_codes(["SNAPSHOT00003", "SNAPSHOT00009"])
+        my.assertEqual(["SNAPSHOT00003"], list(snapshots.keys()))
+        my.assertEqual([ ['code', ["SNAPSHOT00003", "SNAPSHOT00009"]] ], my.stub.queries[-1])
+
+        # codes which do not exist are not queried again
+        my.resolver.resolve_codes(["SNAPSHOT00009"])
+        my.assertEqual(count + 1, len(my.stub.queries))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
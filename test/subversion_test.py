@@ -0,0 +1,265 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile, types
+
+# import the client lib
+sys.path.insert( 0, ".." )
+
+
+def get_fake_pysvn():
+    '''a pysvn module with only the constants which are used'''
+    pysvn = types.ModuleType("pysvn")
+    class depth(object):
+        empty = "empty"
+        files = "files"
+        immediates = "immediates"
+        infinity = "infinity"
+    class wc_status_kind(object):
+        normal = "normal"
+        added = "added"
+        deleted = "deleted"
+        modified = "modified"
+        conflicted = "conflicted"
+        unversioned = "unversioned"
+        missing = "missing"
+    pysvn.depth = depth
+    pysvn.wc_status_kind = wc_status_kind
+    pysvn.Client = FakeClient
+    return pysvn
+
+
+class FakeStatus(object):
+    def __init__(my, path, text_status):
+        my.path = path
+        my.text_status = text_status
+
+
+class FakeEntry(object):
+    def __init__(my, name):
+        my.name = name
+
+
+class FakeClient(object):
+    '''a repository of relative paths.  Directories have no contents'''
+    def __init__(my, repo=None):
+        my.repo = repo or {}
+        my.sync_dir = None
+        my.calls = []
+        # path -> list of (path, status) returned by status
+        my.statuses = {}
+
+    def checkout(my, url, sync_dir, depth=None, recurse=None):
+        my.calls.append( ("checkout", url, depth) )
+        my.sync_dir = sync_dir
+        if not os.path.exists(sync_dir):
+            os.makedirs(sync_dir)
+
+    def update(my, paths, depth=None, depth_is_sticky=False, recurse=None):
+        my.calls.append( ("update", list(paths), depth) )
+        for path in paths:
+            relative = path[len(my.sync_dir)+1:]
+            if relative not in my.repo:
+                raise Exception("Path [%s] is not in the repository" % relative)
+        for path in paths:
+            content = my.repo[path[len(my.sync_dir)+1:]]
+            if content == None:
+                if not os.path.exists(path):
+                    os.mkdir(path)
+            else:
+                f = open(path, "w")
+                f.write(content)
+                f.close()
+        return []
+
+    def add(my, paths, depth=None):
+        my.calls.append( ("add", list(paths), depth) )
+
+    def checkin(my, paths, description):
+        my.calls.append( ("checkin", list(paths), description) )
+        return "r1"
+
+    def status(my, path, depth=None, get_all=True, ignore_externals=False):
+        my.calls.append( ("status", path, depth, get_all) )
+        statuses = [FakeStatus(x, y) for x, y in my.statuses.get(path, [])]
+        if not get_all:
+            statuses = [x for x in statuses if x.text_status != "normal"]
+        return statuses
+
+    def ls(my, url):
+        my.calls.append( ("ls", url) )
+        return [FakeEntry("%s/1.0" % url), FakeEntry("%s/1.1" % url)]
+
+    def get_calls(my, name):
+        return [x[1:] for x in my.calls if x[0] == name]
+
+
+
+class SubversionTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp().replace("\\", "/")
+        my.sync_dir = "%s/sync" % my.tmp_dir
+        my.src_dir = "%s/src" % my.tmp_dir
+        os.makedirs(my.src_dir)
+        for name in ["chr001.ma", "prop001.ma"]:
+            f = open("%s/%s" % (my.src_dir, name), "w")
+            f.write(name)
+            f.close()
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        if sys.version_info[0] >= 3:
+            # the scm modules are only supported in Python2
+            return
+
+        sys.modules['pysvn'] = get_fake_pysvn()
+        from tactic_client_lib.scm import subversion
+        subversion.pysvn = sys.modules['pysvn']
+
+        subversion.Subversion.clear_cache()
+        try:
+            my._test_batch(subversion.Subversion)
+            my._test_status(subversion.Subversion)
+            my._test_list_cache(subversion.Subversion)
+            my._test_deliver(subversion.Subversion)
+        finally:
+            subversion.Subversion.clear_cache()
+
+
+    def _get_impl(my, cls, repo):
+        impl = cls(root="file:///repo", branch="1.0", sync_dir=my.sync_dir)
+        impl.client = FakeClient(repo)
+        return impl
+
+
+    def _test_batch(my, cls):
+        impl = my._get_impl(cls, {'chr': None, 'chr/a.ma': "a", 'chr/b.ma': "b"})
+        impl.checkout("", depth="empty")
+        paths = ["%s/chr/a.ma" % my.sync_dir, "%s/chr/b.ma" % my.sync_dir]
+
+        # relative paths are in the sync dir, and every operation is a
+        # single call for all of the paths
+        impl.update(["chr"], depth="empty")
+        impl.update(["chr/a.ma", paths[1]], depth="files")
+        my.assertEqual([
+            (["%s/chr" % my.sync_dir], "empty"),
+            (paths, "files"),
+        ], impl.client.get_calls("update"))
+        my.assertEqual([], impl.update([]))
+
+        impl.add(["chr/a.ma", "chr/b.ma"])
+        my.assertEqual([(paths, None)], impl.client.get_calls("add"))
+
+        my.assertEqual("r1", impl.commit(["chr/a.ma", "chr/b.ma"], "commit"))
+        my.assertEqual([(paths, "commit")], impl.client.get_calls("checkin"))
+        my.assertEqual(["svn checkout file:///repo/branches/1.0", "svn update (1 paths)",
+            "svn update (2 paths)", "svn add (2 paths)", "svn commit (2 paths)"], impl.get_log())
+
+
+    def _test_status(my, cls):
+        impl = my._get_impl(cls, {})
+        dir = "%s/chr" % my.sync_dir
+        impl.client.statuses = {
+            my.sync_dir: [(my.sync_dir, "normal"), ("%s/new" % my.sync_dir, "unversioned")],
+            dir: [("%s/a.ma" % dir, "normal"), ("%s/b.ma" % dir, "modified"), ("%s/c.ma" % dir, "added")],
+        }
+
+        my.assertEqual({
+            my.sync_dir: "same",
+            # an unversioned directory is reported but not walked into
+            "%s/new" % my.sync_dir: "unversioned",
+        }, impl.status())
+        my.assertEqual([(my.sync_dir, "infinity", True)], impl.client.get_calls("status"))
+
+        # only the changes, for many paths at a given depth
+        impl.client.calls = []
+        my.assertEqual({
+            "%s/b.ma" % dir: "modified",
+            "%s/c.ma" % dir: "added",
+            "%s/new" % my.sync_dir: "unversioned",
+        }, impl.status(["chr", my.sync_dir], depth="immediates", get_all=False))
+        my.assertEqual([(dir, "immediates", False), (my.sync_dir, "immediates", False)],
+            impl.client.get_calls("status"))
+
+
+    def _test_list_cache(my, cls):
+        impl = my._get_impl(cls, {})
+        my.assertEqual(["1.0", "1.1"], impl.get_all_branches())
+        my.assertEqual(["1.0", "1.1"], impl.get_all_tags("1.0"))
+        my.assertEqual(["1.0", "1.1"], impl.get_all_branches())
+        my.assertEqual([("file:///repo/branches",), ("file:///repo/tags",)], impl.client.get_calls("ls"))
+
+        # the listing is shared by all of the instances
+        impl2 = my._get_impl(cls, {})
+        impl2.get_all_branches()
+        my.assertEqual([], impl2.client.get_calls("ls"))
+
+        # until it expires
+        url = "file:///repo/branches"
+        cached = cls.LIST_CACHE[url]
+        cls.LIST_CACHE[url] = (cached[0] - impl.cache_ttl - 1, cached[1])
+        impl2.get_all_branches()
+        impl2.get_all_tags("1.0")
+        my.assertEqual([(url,)], impl2.client.get_calls("ls"))
+
+        # a commit may create branches or tags
+        impl2.client.calls = []
+        impl2.commit([], "commit")
+        my.assertEqual({}, cls.LIST_CACHE)
+        impl2.get_all_branches()
+        my.assertEqual([(url,)], impl2.client.get_calls("ls"))
+
+        # and the listings of other repositories are kept
+        cls.LIST_CACHE["file:///other/branches"] = cached
+        impl2.commit([], "commit")
+        my.assertEqual(["file:///other/branches"], list(cls.LIST_CACHE.keys()))
+
+
+    def _test_deliver(my, cls):
+        impl = my._get_impl(cls, {'chr': None, 'chr/chr001.ma': "old"})
+        result = impl.deliver_files([
+            ("%s/chr001.ma" % my.src_dir, "chr/chr001.ma"),
+            ("%s/prop001.ma" % my.src_dir, "prop/new/prop001.ma"),
+        ], "delivery")
+
+        new_path = "%s/prop/new/prop001.ma" % my.sync_dir
+        my.assertEqual(["%s/chr/chr001.ma" % my.sync_dir], result.get("updated"))
+        my.assertEqual([new_path], result.get("added"))
+        my.assertEqual("prop001.ma", open(new_path).read())
+
+        # the new directories are added, parents first, without their
+        # contents, and are committed with the files
+        new_dirs = ["%s/prop" % my.sync_dir, "%s/prop/new" % my.sync_dir]
+        my.assertEqual([
+            (new_dirs, "empty"),
+            ([new_path], None),
+        ], impl.client.get_calls("add"))
+        my.assertEqual([
+            (new_dirs + [new_path, "%s/chr/chr001.ma" % my.sync_dir], "delivery"),
+        ], impl.client.get_calls("checkin"))
+
+        # a directory which is in the repository is not added again
+        impl.client.calls = []
+        impl.deliver_files([("%s/prop001.ma" % my.src_dir, "chr/prop001.ma")])
+        my.assertEqual([(["%s/chr/prop001.ma" % my.sync_dir], None)], impl.client.get_calls("add"))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys
+import six
+import xml.etree.ElementTree as ElementTree
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.transaction_builder import TransactionBuilder
+
+
+class FakeServer(object):
+    def __init__(my):
+        my.transactions = []
+    def execute_transaction(my, ticket, transaction_xml, file_mode):
+        my.transactions.append(transaction_xml)
+        return "OK"
+
+
+class FakeStub(object):
+    def __init__(my):
+        my.server = FakeServer()
+        my.ticket = 'ticket'
+        my.changed = []
+    def get_project(my):
+        return "sample3d"
+    def _changed(my, search_types=[], search_keys=[], all=False):
+        my.changed.extend(search_types)
+
+
+class TransactionBuilderTest(unittest.TestCase):
+
+    def setUp(my):
+        my.stub = FakeStub()
+        my.builder = TransactionBuilder(my.stub)
+
+
+    def test_all(my):
+        my._test_merge()
+        my._test_xml()
+        my._test_execute()
+
+
+    def _get_sobjects(my):
+        xml = my.builder.get_xml()
+        my.assertEqual(True, isinstance(xml, six.text_type))
+        root = ElementTree.fromstring(xml.encode("UTF-8"))
+        my.assertEqual("transaction", root.tag)
+        sobjects = []
+        for node in root.findall("sobject"):
+            columns = dict([(x.get("name"), x.get("to")) for x in node.findall("column")])
+            sobjects.append( (node.get("action"), node.get("search_type"), node.get("search_code"), columns) )
+        return sobjects
+
+
+    def _test_merge(my):
+        builder = my.builder
+        builder.insert("prod/shot", {'code': 'SH001', 'status': 'new'})
+        builder.update("prod/shot?project=sample3d&code=SH001", {'status': 'ready'})
+        builder.update("prod/shot?project=sample3d&code=SH002", {'status': 'ready'})
+        builder.update("prod/shot?project=sample3d&code=SH002", {'status': 'final', 'frame_end': 100})
+        builder.update("prod/shot?project=sample3d&code=SH002", {})
+        builder.retire("prod/shot?project=sample3d&code=SH003")
+        builder.update("sthpw/task?code=TASK01", {'status': 'done'})
+        builder.insert("prod/asset", {'name': 'chr'})
+        my.assertEqual(5, len(builder))
+
+        my.assertRaises(ValueError, builder.update, "sthpw/task?id=1", {'status': 'done'})
+        my.assertRaises(ValueError, TransactionBuilder().insert, "prod/shot", {})
+
+
+    def _test_xml(my):
+        sobjects = my._get_sobjects()
+        my.assertEqual( [
+            ('insert', 'prod/shot?project=sample3d', 'SH001', {'code': 'SH001', 'status': 'ready'}),
+            ('update', 'prod/shot?project=sample3d', 'SH002', {'status': 'final', 'frame_end': '100'}),
+            ('update', 'prod/shot?project=sample3d', 'SH003', {'s_status': 'retired'}),
+            ('update', 'sthpw/task', 'TASK01', {'status': 'done'}),
+            ('insert', 'prod/asset?project=sample3d', None, {'name': 'chr'}),
+        ], sobjects)
+
+        builder = TransactionBuilder(project_code="sample3d")
+        builder.update("prod/shot?project=sample3d&code=SH001", {'description': u'<Big> "Money" & Shot \xe9', 'data': {'a': 1}, 'frame_start': None})
+        my.builder = builder
+        sobjects = my._get_sobjects()
+        my.assertEqual({'description': u'<Big> "Money" & Shot \xe9', 'data': '{"a": 1}', 'frame_start': None}, sobjects[0][3])
+
+
+    def _test_execute(my):
+        builder = TransactionBuilder(my.stub)
+        my.assertEqual(None, builder.execute())
+        builder.update("prod/shot?project=sample3d&code=SH001", {'status': 'ready'})
+        builder.retire("sthpw/task?code=TASK01")
+        my.assertEqual("OK", builder.execute())
+
+        my.assertEqual(1, len(my.stub.server.transactions))
+        my.assertEqual(['prod/shot?project=sample3d', 'sthpw/task'], my.stub.changed)
+        my.assertEqual(0, len(builder))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
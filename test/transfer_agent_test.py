@@ -0,0 +1,178 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, os, shutil, tempfile
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.transfer_agent import TransferAgent
+from tactic_client_lib.common import TacticUploadException
+
+
+class FakeStub(object):
+    def get_server_name(my):
+        return "localhost"
+    def get_project(my):
+        return "sample3d"
+    def get_site(my):
+        return None
+    def get_login_ticket(my):
+        return "ticket"
+    def get_transaction_ticket(my):
+        return "ticket"
+
+
+class FakeAgent(TransferAgent):
+    '''uploads to a list, failing the first "failures" tries'''
+    def __init__(my, journal_path, failures=0):
+        super(FakeAgent, my).__init__(journal_path, workers=2, max_tries=3, backoff=0)
+        my.failures = failures
+        my.uploaded = []
+        my.calls = []
+
+    def get_stub(my, job):
+        return FakeStub()
+
+    def _upload(my, stub, path):
+        if my.failures:
+            my.failures -= 1
+            raise Exception("connection reset")
+        my.uploaded.append(os.path.basename(path))
+
+    def _complete(my, stub, method, args):
+        my.calls.append(method)
+        return {'code': 'SNAPSHOT00001', 'args': args}
+
+
+class TransferAgentTest(unittest.TestCase):
+
+    def setUp(my):
+        my.tmp_dir = tempfile.mkdtemp()
+        my.path = "%s/chr001_model.ma" % my.tmp_dir
+        f = open(my.path, "w")
+        f.write("model")
+        f.close()
+
+    def tearDown(my):
+        shutil.rmtree(my.tmp_dir)
+
+
+    def test_all(my):
+        my._test_upload()
+        my._test_retry()
+        my._test_failed()
+        my._test_restart()
+        my._test_security()
+
+
+    def _test_upload(my):
+        agent = FakeAgent("%s/upload.db" % my.tmp_dir)
+        try:
+            handle = agent.upload(FakeStub(), my.path, method='simple_checkin', args=['prod/asset?project=sample3d&code=chr001', 'model'])
+            result = handle.wait(timeout=10)
+            my.assertEqual('SNAPSHOT00001', result.get('code'))
+            my.assertEqual(['prod/asset?project=sample3d&code=chr001', 'model'], result.get('args'))
+            my.assertEqual('done', handle.get_state())
+            my.assertEqual(['chr001_model.ma'], agent.uploaded)
+            my.assertEqual(['simple_checkin'], agent.calls)
+
+            agent.clear()
+            my.assertEqual([], agent.get_jobs())
+        finally:
+            agent.stop()
+
+
+    def _test_retry(my):
+        agent = FakeAgent("%s/retry.db" % my.tmp_dir, failures=2)
+        try:
+            handle = agent.upload(FakeStub(), my.path)
+            my.assertEqual(None, handle.wait(timeout=10))
+            my.assertEqual(2, agent.get_job(handle.get_id()).get('tries'))
+            my.assertEqual(['chr001_model.ma'], agent.uploaded)
+        finally:
+            agent.stop()
+
+
+    def _test_failed(my):
+        agent = FakeAgent("%s/failed.db" % my.tmp_dir, failures=10)
+        try:
+            handle = agent.upload(FakeStub(), my.path, method='add_file')
+            try:
+                handle.wait(timeout=10)
+            except TacticUploadException:
+                pass
+            else:
+                my.fail("failed upload not reported")
+            my.assertEqual('failed', handle.get_state())
+            my.assertEqual('connection reset', handle.get_error())
+            my.assertEqual([], agent.calls)
+        finally:
+            agent.stop()
+
+
+    def _test_restart(my):
+        journal_path = "%s/restart.db" % my.tmp_dir
+
+        # a job left behind by a process which died during the upload
+        agent = FakeAgent(journal_path)
+        agent.start = lambda: None
+        handle = agent.upload(FakeStub(), my.path, method='simple_checkin')
+        agent._update(handle.get_id(), state='uploading', pid=2**22 + 1)
+
+        agent = FakeAgent(journal_path)
+        try:
+            agent.start()
+            result = agent.get_handle(handle.get_id()).wait(timeout=10)
+            my.assertEqual('SNAPSHOT00001', result.get('code'))
+            my.assertEqual(['chr001_model.ma'], agent.uploaded)
+        finally:
+            agent.stop()
+
+
+    def _test_security(my):
+        journal_path = "%s/security.db" % my.tmp_dir
+        agent = FakeAgent(journal_path)
+        agent.start = lambda: None
+        my.assertRaises(TacticUploadException, agent.upload, FakeStub(), my.path, method='delete_sobject')
+
+        # a job with another method, ie: written by someone else, is
+        # failed without calling it
+        handle = agent.upload(FakeStub(), my.path, method='simple_checkin')
+        agent._update(handle.get_id(), method='delete_sobject')
+        agent.execute(agent._claim())
+        my.assertEqual('failed', handle.get_state())
+        my.assertEqual([], agent.uploaded)
+        my.assertEqual([], agent.calls)
+
+        if not hasattr(os, "getuid"):
+            return
+        # a journal which other users can read is refused
+        os.chmod(journal_path, int("644", 8))
+        my.assertRaises(TacticUploadException, FakeAgent, journal_path)
+
+        # and so is a default directory which other users can write to
+        dir = "%s/shared" % my.tmp_dir
+        os.mkdir(dir)
+        os.chmod(dir, int("777", 8))
+        default_path = "%s/journal.db" % dir
+        agent = FakeAgent("%s/default.db" % my.tmp_dir)
+        agent.get_default_path = lambda: default_path
+        my.assertRaises(TacticUploadException, TransferAgent.__init__, agent, default_path)
+        my.assertEqual(False, os.path.exists(default_path))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+###########################################################
+#
+# Copyright (c) 2005, Southpaw Technology
+#                     All Rights Reserved
+#
+# PROPRIETARY INFORMATION.  This software is proprietary to
+# Southpaw Technology, and is not to be reproduced, transmitted,
+# or disclosed in any way without written permission.
+#
+#
+#
+
+import unittest, sys, time, threading
+
+# import the client lib
+sys.path.insert( 0, ".." )
+from tactic_client_lib.common.transfer_scheduler import TransferScheduler
+
+
+class TransferSchedulerTest(unittest.TestCase):
+
+    def test_all(my):
+        my._test_concurrency()
+        my._test_priority()
+        my._test_rate()
+        my._test_fair()
+        my._test_stats()
+
+
+    def _test_concurrency(my):
+        scheduler = TransferScheduler(max_per_host=2, rate=0, host_rate=0)
+        a = scheduler.acquire("server1")
+        b = scheduler.acquire("server1")
+        # other hosts are not affected
+        c = scheduler.acquire("server2")
+
+        acquired = []
+        def run():
+            acquired.append( scheduler.acquire("server1") )
+        thread = threading.Thread(target=run)
+        thread.start()
+        time.sleep(0.2)
+        my.assertEqual([], acquired)
+        my.assertEqual(1, scheduler.get_stats()['waiting'])
+
+        a.release()
+        thread.join(5)
+        my.assertEqual(1, len(acquired))
+
+        for transfer in [b, c, acquired[0]]:
+            transfer.release()
+        my.assertEqual([], scheduler.get_stats()['active'])
+
+
+    def _test_priority(my):
+        scheduler = TransferScheduler(max_per_host=1, rate=0, host_rate=0)
+        first = scheduler.acquire("server1")
+
+        order = []
+        def run(priority):
+            transfer = scheduler.acquire("server1", priority=priority)
+            order.append(priority)
+            transfer.release()
+
+        threads = []
+        for priority in ['bulk', 'normal', 'urgent']:
+            thread = threading.Thread(target=run, args=[priority])
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.1)
+
+        first.release()
+        for thread in threads:
+            thread.join(5)
+        my.assertEqual(['urgent', 'normal', 'bulk'], order)
+
+
+    def _test_rate(my):
+        # 1MB/s with a burst of 1 second
+        scheduler = TransferScheduler(max_per_host=0, rate=1024*1024, host_rate=0)
+        transfer = scheduler.acquire("server1")
+        start = time.time()
+        transfer.throttle(1024*1024)
+        transfer.throttle(512*1024)
+        elapsed = time.time() - start
+        transfer.release()
+        my.assertTrue(elapsed > 0.4 and elapsed < 2.0, elapsed)
+
+
+    def _test_fair(my):
+        scheduler = TransferScheduler(max_per_host=0, rate=0, host_rate=0)
+        scheduler.set_host_limits("server1", rate=1024*1024)
+
+        transfers = [scheduler.acquire("server1") for i in range(2)]
+        def run(transfer):
+            for i in range(8):
+                transfer.throttle(128*1024)
+
+        threads = [threading.Thread(target=run, args=[x]) for x in transfers]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        # both transfers make progress at the same time
+        stats = scheduler.get_stats()
+        for data in stats['active']:
+            my.assertTrue(data['bytes'] > 0)
+        for thread in threads:
+            thread.join(5)
+        my.assertEqual([1024*1024, 1024*1024], [x.bytes for x in transfers])
+        for transfer in transfers:
+            transfer.release()
+
+
+    def _test_stats(my):
+        scheduler = TransferScheduler(max_per_host=0, rate=0, host_rate=0)
+        transfer = scheduler.acquire("server1", kind='download', priority='high', size=1000)
+        transfer.throttle(1000)
+
+        stats = scheduler.get_stats()
+        my.assertEqual(1, len(stats['active']))
+        data = stats['active'][0]
+        my.assertEqual('download', data['kind'])
+        my.assertEqual('high', data['priority'])
+        my.assertEqual(1000, data['bytes'])
+        my.assertEqual(1000, stats['hosts']['server1']['bytes'])
+        my.assertTrue(stats['throughput'] > 0)
+
+        transfer.release()
+        # releasing twice is harmless
+        transfer.release()
+        stats = scheduler.get_stats()
+        my.assertEqual(1, stats['completed'])
+        my.assertEqual(0, stats['hosts']['server1']['active'])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+